@@ -0,0 +1,262 @@
+"""Local stand-ins for the Telegram Bot API and the sixtieslife news API."""
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+
+# Calls the bot answers a click with
+REPLY_METHODS = frozenset(['sendMessage', 'editMessageText'])
+
+# Calls that are not caused by clicks
+SETUP_METHODS = frozenset(['getMe', 'getUpdates', 'setWebhook', 'deleteWebhook'])
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class _Server:
+    """Runs a ThreadingHTTPServer on a free local port in the background."""
+
+    def __init__(self, handler) -> None:
+        self._server = _HTTPServer(('127.0.0.1', 0), handler)
+        self._server.owner = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FakeTelegram(_Server):
+    """Fake Bot API that records every call and answers it successfully.
+
+    Calls are attributed to chats, so a load generator can wait for the
+    reply to its click. Callback query IDs are expected to look like
+    '{chat_id}:{n}', answerCallbackQuery has no chat otherwise.
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        """Starts the server.
+
+        Args:
+            latency (float, optional): Seconds every call takes.
+        """
+        self.latency = latency
+        self.calls = Counter()
+        self._replies = defaultdict(list)
+        self._chat_calls = Counter()
+        self._message_id = 0
+        self._cond = threading.Condition()
+        super().__init__(_TelegramHandler)
+
+    @property
+    def api_url(self) -> str:
+        """Value for TELEGRAM_API_URL."""
+        return f'http://127.0.0.1:{self.port}/bot{{0}}/{{1}}'
+
+    def snapshot(self) -> Counter:
+        """Returns a copy of the calls made so far by method."""
+        with self._cond:
+            return Counter(self.calls)
+
+    def replies(self, chat_id: int) -> int:
+        """Returns the number of replies sent to a chat so far."""
+        with self._cond:
+            return len(self._replies[chat_id])
+
+    def chat_calls(self, chat_id: int) -> int:
+        """Returns the number of API calls made for a chat so far."""
+        with self._cond:
+            return self._chat_calls[chat_id]
+
+    def wait_reply(
+            self,
+            chat_id: int,
+            after: int,
+            timeout: float) -> Optional[float]:
+        """Waits for a chat's reply number `after + 1`.
+
+        Returns:
+            Optional[float]: time.monotonic() the reply arrived at, None on
+                timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while len(self._replies[chat_id]) <= after:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return None
+                self._cond.wait(left)
+            return self._replies[chat_id][after]
+
+    def _record(self, method: str, params: dict) -> dict:
+        chat_id = params.get('chat_id')
+        if chat_id is None and method == 'answerCallbackQuery':
+            chat_id = params.get('callback_query_id', '').split(':')[0]
+        chat_id = int(chat_id) if chat_id not in (None, '') else None
+        with self._cond:
+            self.calls[method] += 1
+            if chat_id is not None:
+                self._chat_calls[chat_id] += 1
+                if method in REPLY_METHODS:
+                    self._replies[chat_id].append(time.monotonic())
+                    self._cond.notify_all()
+            self._message_id += 1
+            message_id = self._message_id
+        if method in ('sendMessage', 'editMessageText'):
+            return {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': params.get('text', ''),
+            }
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'bench'}
+        return True
+
+
+class _TelegramHandler(BaseHTTPRequestHandler):
+    def do_POST(self) -> None:
+        fake = self.server.owner
+        url = urlsplit(self.path)
+        method = url.path.rsplit('/', 1)[-1]
+        params = dict(parse_qsl(url.query))
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        content_type = self.headers.get('Content-Type', '')
+        if body and 'json' in content_type:
+            params.update(json.loads(body))
+        elif body and 'form-data' not in content_type:
+            params.update(parse_qsl(body.decode()))
+        if fake.latency:
+            time.sleep(fake.latency)
+        result = fake._record(method, params)
+        data = json.dumps({'ok': True, 'result': result}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class FakeNews(_Server):
+    """Fake news API serving synthetic feeds of a fixed size.
+
+    Like the real API behind its CDN, responses carry an ETag, a request
+    whose If-None-Match matches it is answered 304 without a body, and
+    bodies are gzipped for clients that accept it.
+    """
+
+    def __init__(self, feed_size: int = 50, latency: float = 0.0) -> None:
+        """Starts the server.
+
+        Args:
+            feed_size (int, optional): Items in every feed.
+            latency (float, optional): Seconds every request takes.
+        """
+        self.feed_size = feed_size
+        self.latency = latency
+        # Served with status 200 instead of every feed when set
+        self.broken_body: Optional[bytes] = None
+        self.requests = 0
+        self.not_modified = 0
+        self.gzipped = 0
+        self._lock = threading.Lock()
+        self._feeds: Dict[str, bytes] = {}
+        self._compressed: Dict[str, bytes] = {}
+        self._etags: Dict[str, str] = {}
+        super().__init__(_NewsHandler)
+
+    @property
+    def base_url(self) -> str:
+        """Value for NEWS_API_URL."""
+        return f'http://127.0.0.1:{self.port}'
+
+    def feed(self, source: str, category: str) -> bytes:
+        key = f'{source}/{category}'
+        with self._lock:
+            self.requests += 1
+            if key not in self._feeds:
+                items: List[List[str]] = [
+                    [
+                        f'{i % 28 + 1:02d}.01.2024',
+                        f'{category} news number {i} about the city',
+                        f'https://example.com/{source}/{category}/{i}',
+                    ]
+                    for i in range(self.feed_size)
+                ]
+                data = json.dumps({category: items}).encode()
+                self._feeds[key] = data
+                self._compressed[key] = gzip.compress(data)
+                self._etags[key] = f'"{hashlib.sha1(data).hexdigest()[:16]}"'
+            return self._feeds[key]
+
+    def etag(self, source: str, category: str) -> str:
+        """Returns the ETag of a feed served before."""
+        with self._lock:
+            return self._etags[f'{source}/{category}']
+
+    def compressed(self, source: str, category: str) -> bytes:
+        """Returns the gzipped body of a feed served before."""
+        with self._lock:
+            return self._compressed[f'{source}/{category}']
+
+
+class _NewsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        fake = self.server.owner
+        parts = urlsplit(self.path).path.strip('/').split('/')
+        if fake.latency:
+            time.sleep(fake.latency)
+        if len(parts) != 2:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        data = fake.feed(*parts)
+        if fake.broken_body is not None:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(fake.broken_body)))
+            self.end_headers()
+            self.wfile.write(fake.broken_body)
+            return
+        etag = fake.etag(*parts)
+        if self.headers.get('If-None-Match') == etag:
+            with fake._lock:
+                fake.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', etag)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            data = fake.compressed(*parts)
+            with fake._lock:
+                fake.gzipped += 1
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
@@ -0,0 +1,371 @@
+"""Benchmarks the bot against local fakes of Telegram and the news API.
+
+Starts src/main.py in webhook mode in a temporary directory, posts
+/start and callback updates from many simulated users and reports
+clicks per second, click-to-reply latency and API calls per click.
+
+    python bench/run.py --users 50 --rounds 5
+    python bench/run.py --script clicks.txt --feed-size 200 --upstream-latency 0.2
+
+A script file has one action per line: '/start' or any other command,
+callback data such as 'today' or 'p#2#5#today', or a recorded update
+as JSON whose chat and user IDs are replaced by the simulated user's.
+Set SEND_CHAT_RATE and other bot settings in the environment as usual.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from fakes import SETUP_METHODS, FakeNews, FakeTelegram
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_SCRIPT = [
+    '/start',
+    'settings',
+    'pagination_on',
+    'pln',
+    'today',
+    'p#2#5#today',
+    'p#3#5#today',
+    'back',
+    'cdi',
+    'news',
+    'p#2#5#news',
+    'back',
+]
+
+
+class BotProcess:
+    """src/main.py running in webhook mode against the fakes."""
+
+    def __init__(
+            self,
+            telegram: FakeTelegram,
+            news: FakeNews,
+            workdir: str) -> None:
+        self.port = _free_port()
+        self.url = f'http://127.0.0.1:{self.port}/telegram'
+        env = dict(os.environ)
+        env.update({
+            'BOT_TOKEN': '123:bench',
+            'BOT_MODE': 'webhook',
+            'WEBHOOK_URL': '',
+            'WEBHOOK_HOST': '127.0.0.1',
+            'WEBHOOK_PORT': str(self.port),
+            'WEBHOOK_PATH': '/telegram',
+            'WEBHOOK_SECRET': '',
+            'NEWS_API_URL': news.base_url,
+            'TELEGRAM_API_URL': telegram.api_url,
+        })
+        self.log = open(os.path.join(workdir, 'bot.log'), 'w')
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, 'src', 'main.py')],
+            cwd=workdir,
+            env=env,
+            stdout=self.log,
+            stderr=subprocess.STDOUT)
+
+    def wait_ready(self, timeout: float = 30.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'bot exited, see {self.log.name}')
+            try:
+                socket.create_connection(('127.0.0.1', self.port), 0.2).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError('bot did not start listening in time')
+
+    def post(self, update: dict) -> None:
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(update).encode(),
+            headers={'Content-Type': 'application/json'})
+        urllib.request.urlopen(request).read()
+
+    def stop(self) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+
+
+class User(threading.Thread):
+    """Simulated user clicking through a script and waiting for replies."""
+
+    _update_ids = iter(range(1, 10 ** 12))
+    _lock = threading.Lock()
+
+    def __init__(
+            self,
+            chat_id: int,
+            bot: BotProcess,
+            telegram: FakeTelegram,
+            script: List[str],
+            rounds: int,
+            think: float,
+            timeout: float) -> None:
+        super().__init__(daemon=True)
+        self.chat_id = chat_id
+        self.bot = bot
+        self.telegram = telegram
+        self.script = script
+        self.rounds = rounds
+        self.think = think
+        self.timeout = timeout
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.timeouts = 0
+        self.errors = 0
+        self.clicks = 0
+
+    def run(self) -> None:
+        for _ in range(self.rounds):
+            for action in self.script:
+                self.click(action)
+                if self.think:
+                    time.sleep(self.think)
+
+    def click(self, action: str) -> None:
+        replies = self.telegram.replies(self.chat_id)
+        started = time.monotonic()
+        try:
+            self.bot.post(self.update(action))
+        except OSError:
+            # Refused, reset or answered 503 by the webhook server
+            self.errors += 1
+            return
+        self.clicks += 1
+        replied = self.telegram.wait_reply(self.chat_id, replies, self.timeout)
+        if replied is None:
+            self.timeouts += 1
+            return
+        self.latencies[_kind(action)].append(replied - started)
+
+    def update(self, action: str) -> dict:
+        with User._lock:
+            update_id = next(User._update_ids)
+        user = {'id': self.chat_id, 'is_bot': False, 'first_name': 'Bench'}
+        chat = {'id': self.chat_id, 'type': 'private'}
+        if action.startswith('{'):
+            update = json.loads(action)
+            update['update_id'] = update_id
+            for key in ('message', 'callback_query'):
+                if key in update:
+                    _replace_ids(update[key], user, chat)
+            return update
+        if action.startswith('/'):
+            command = action.split()[0]
+            return {
+                'update_id': update_id,
+                'message': {
+                    'message_id': update_id,
+                    'date': int(time.time()),
+                    'chat': chat,
+                    'from': user,
+                    'text': action,
+                    'entities': [{
+                        'type': 'bot_command',
+                        'offset': 0,
+                        'length': len(command),
+                    }],
+                },
+            }
+        return {
+            'update_id': update_id,
+            'callback_query': {
+                'id': f'{self.chat_id}:{update_id}',
+                'from': user,
+                'chat_instance': str(self.chat_id),
+                'data': action,
+                'message': {
+                    'message_id': update_id,
+                    'date': int(time.time()),
+                    'chat': chat,
+                    'text': '',
+                },
+            },
+        }
+
+
+def _replace_ids(payload: dict, user: dict, chat: dict) -> None:
+    payload['from'] = dict(payload.get('from') or {}, **user)
+    message = payload if 'chat' in payload else payload.get('message')
+    if message is not None:
+        message['chat'] = dict(message.get('chat') or {}, **chat)
+
+
+def _kind(action: str) -> str:
+    """Groups actions for the report: commands, page turns, buttons."""
+    if action.startswith('{'):
+        return 'recorded'
+    if action.startswith('/'):
+        return action.split()[0]
+    if action.startswith(('p#', 'number#', 'search#')):
+        return action.split('#')[0] + '#'
+    return 'button'
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Returns the q-th percentile (0..100) by the nearest-rank method."""
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    rank = max(1, round(q / 100 * len(ordered) + 0.5))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def run(args: argparse.Namespace) -> dict:
+    script = _load_script(args.script)
+    telegram = FakeTelegram(latency=args.api_latency)
+    news = FakeNews(feed_size=args.feed_size, latency=args.upstream_latency)
+    with tempfile.TemporaryDirectory() as workdir:
+        bot = BotProcess(telegram, news, workdir)
+        try:
+            bot.wait_ready()
+            if args.warmup:
+                warmup = User(
+                    args.first_chat_id - 1, bot, telegram, script,
+                    1, 0, args.timeout)
+                warmup.run()
+            calls_before = telegram.snapshot()
+            upstream_before = news.requests
+            users = [
+                User(
+                    args.first_chat_id + i, bot, telegram, script,
+                    args.rounds, args.think, args.timeout)
+                for i in range(args.users)
+            ]
+            started = time.monotonic()
+            for user in users:
+                user.start()
+            for user in users:
+                user.join()
+            elapsed = time.monotonic() - started
+            # Deletes and sends queued after the last reply still count
+            time.sleep(args.settle)
+            # Only the calls of the measured run, without the warmup's
+            calls = telegram.snapshot() - calls_before
+            methods = {
+                method: count for method, count in calls.items()
+                if method not in SETUP_METHODS
+            }
+            api_calls = sum(methods.values())
+            upstream = news.requests - upstream_before
+        finally:
+            bot.stop()
+            telegram.stop()
+            news.stop()
+    return _report(users, elapsed, api_calls, upstream, methods)
+
+
+def _report(
+        users: List[User],
+        elapsed: float,
+        api_calls: int,
+        upstream: int,
+        methods: Dict[str, int]) -> dict:
+    clicks = sum(user.clicks for user in users)
+    latencies = defaultdict(list)
+    for user in users:
+        for kind, values in user.latencies.items():
+            latencies[kind].extend(values)
+    everything = [value for values in latencies.values() for value in values]
+    return {
+        'users': len(users),
+        'clicks': clicks,
+        'timeouts': sum(user.timeouts for user in users),
+        'errors': sum(user.errors for user in users),
+        'seconds': round(elapsed, 3),
+        'clicks_per_second': round(clicks / elapsed, 1) if elapsed else 0,
+        'latency_ms': {
+            kind: {
+                'p50': round(percentile(values, 50) * 1000, 1),
+                'p99': round(percentile(values, 99) * 1000, 1),
+            }
+            for kind, values in sorted(
+                dict(latencies, all=everything).items())
+        },
+        'api_calls_per_click': round(api_calls / clicks, 2) if clicks else 0,
+        'upstream_requests': upstream,
+        'api_calls_by_method': dict(sorted(methods.items())),
+    }
+
+
+def _load_script(path: Optional[str]) -> List[str]:
+    if path is None:
+        return DEFAULT_SCRIPT
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def _print(report: dict) -> None:
+    print(
+        f"{report['users']} users, {report['clicks']} clicks in "
+        f"{report['seconds']} s: {report['clicks_per_second']} clicks/s, "
+        f"{report['timeouts']} without reply, {report['errors']} not delivered")
+    print(f"{'action':<12}{'p50 ms':>10}{'p99 ms':>10}")
+    for kind, values in report['latency_ms'].items():
+        print(f"{kind:<12}{values['p50']:>10}{values['p99']:>10}")
+    print(
+        f"Telegram API calls per click: {report['api_calls_per_click']}, "
+        f"upstream requests: {report['upstream_requests']}")
+    for method, count in report['api_calls_by_method'].items():
+        print(f"  {method}: {count}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20,
+                        help='simulated users clicking at the same time')
+    parser.add_argument('--rounds', type=int, default=3,
+                        help='times every user runs through the script')
+    parser.add_argument('--script',
+                        help='file with one action per line, see above')
+    parser.add_argument('--think', type=float, default=0.0,
+                        help='seconds a user waits between clicks')
+    parser.add_argument('--feed-size', type=int, default=50,
+                        help='items in every fake news feed')
+    parser.add_argument('--upstream-latency', type=float, default=0.05,
+                        help='seconds every fake news request takes')
+    parser.add_argument('--api-latency', type=float, default=0.01,
+                        help='seconds every fake Telegram call takes')
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='seconds to wait for the reply to a click')
+    parser.add_argument('--settle', type=float, default=1.0,
+                        help='seconds to wait for late calls before counting')
+    parser.add_argument('--first-chat-id', type=int, default=1000,
+                        help='chat ID of the first simulated user')
+    parser.add_argument('--no-warmup', dest='warmup', action='store_false',
+                        help='do not run the script once before measuring')
+    parser.add_argument('--json', action='store_true',
+                        help='print the report as JSON')
+    args = parser.parse_args()
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,536 @@
+import asyncio
+import telebot as tb
+import async_services as asvc
+import keyboards as kb
+import inline
+import messages as msgs
+import metrics
+import render
+import services as svc
+from history import MessageHistory, SearchHistory
+from outbox import OutboundQueue
+from router import CallbackData, CallbackRouter
+from subscriptions import SubscriptionStore
+from settings import (
+    BOT_TOKEN,
+    INLINE_CACHE_TIME,
+    NEWS_PAGE_SIZE,
+    PAGE_JUMP,
+    SEARCH_PAGE_SIZE,
+)
+from telebot.async_telebot import AsyncTeleBot
+from telebot.asyncio_helper import ApiTelegramException
+from user_settings import SettingsStore
+
+
+bot = AsyncTeleBot(BOT_TOKEN)
+
+searches = SearchHistory()
+
+# Shared with main.py and set by run(): messages are sent by its outbox,
+# which records them in its history, and the stores use its migrated
+# database
+outbox: OutboundQueue = None
+history: MessageHistory = None
+settings_store: SettingsStore = None
+subscriptions: SubscriptionStore = None
+
+
+async def get_pagination_status(user_id: int):
+    """Returns user's pagination status, querying the database off the loop.
+
+    Args:
+        user_id (int): Telegram user ID.
+    Returns:
+        Optional[str]: Pagination status.
+    """
+    if settings_store.is_cached(user_id):
+        return settings_store.get_pagination_status(user_id)
+    return await asyncio.to_thread(
+        settings_store.get_pagination_status,
+        user_id)
+
+async def bot_pln_msg(bot: AsyncTeleBot, call: tb.types.CallbackQuery) -> None:
+    """Sends PLN news message to user.
+
+    Args:
+        bot (AsyncTeleBot): Bot instance.
+        call (tb.types.CallbackQuery): CallbackQuery instance.
+    Returns: None
+    """
+    await send_message(
+        call.message.chat.id,
+        msgs.PLN_MENU_TEXT,
+        parse_mode='MarkdownV2',
+        reply_markup=kb.PLN_MARKUP,
+    )
+
+async def bot_cdi_msg(bot: AsyncTeleBot, call: tb.types.CallbackQuery) -> None:
+    """Sends CDI news message to user.
+
+    Args:
+        bot (AsyncTeleBot): Bot instance.
+        call (tb.types.CallbackQuery): CallbackQuery instance.
+    Returns: None
+    """
+    await send_message(
+        call.message.chat.id,
+        msgs.CDI_MENU_TEXT,
+        parse_mode='MarkdownV2',
+        reply_markup=kb.CDI_MARKUP,
+    )
+
+async def bot_ipsk_msg(bot: AsyncTeleBot, call: tb.types.CallbackQuery) -> None:
+    """Sends IPSK news message to user.
+
+    Args:
+        bot (AsyncTeleBot): Bot instance.
+        call (tb.types.CallbackQuery): CallbackQuery instance.
+    Returns: None
+    """
+    await send_message(
+        call.message.chat.id,
+        msgs.IPSK_MENU_TEXT,
+        parse_mode='MarkdownV2',
+        reply_markup=kb.IPSK_MARKUP,
+    )
+
+async def bot_back_msg(bot: AsyncTeleBot, call: tb.types.CallbackQuery) -> None:
+    """Sends main menu message to user.
+
+    Args:
+        bot (AsyncTeleBot): Bot instance.
+        call (tb.types.CallbackQuery): CallbackQuery instance.
+    Returns: None
+    """
+    await send_message(
+        call.message.chat.id,
+        msgs.MAIN_MENU_TEXT,
+        parse_mode='MarkdownV2',
+        reply_markup=kb.MAIN_MARKUP,
+    )
+
+async def bot_settings_msg(
+        bot: AsyncTeleBot,
+        call: tb.types.CallbackQuery) -> None:
+    """Sends settings message to user.
+
+    Args:
+        bot (AsyncTeleBot): Bot instance.
+        call (tb.types.CallbackQuery): CallbackQuery instance.
+    Returns: None
+    """
+    await send_message(
+        call.message.chat.id,
+        msgs.SETTINGS_MENU_TEXT,
+        parse_mode='MarkdownV2',
+        reply_markup=kb.SETTINGS_MARKUP,
+    )
+
+async def send_message(chat_id: int, *args, **kwargs) -> tb.types.Message:
+    """Sends a message through the outbox, which records its ID.
+
+    Args:
+        chat_id (int): Chat to send the message to.
+        *args, **kwargs: Arguments passed to TeleBot.send_message.
+    Returns:
+        tb.types.Message: Sent message.
+    """
+    return await asyncio.wrap_future(
+        outbox.send_message(chat_id, *args, **kwargs))
+
+def pop_sent_messages(call: tb.types.CallbackQuery) -> list:
+    """Takes the IDs of the messages the bot has sent to the chat.
+
+    Args:
+        call (tb.types.CallbackQuery): CallbackQuery instance.
+    Returns:
+        list: IDs of the messages to delete, the pressed one included.
+    """
+    message_ids = history.pop_all(call.message.chat.id)
+    if call.message.message_id not in message_ids:
+        message_ids.append(call.message.message_id)
+    return message_ids
+
+async def send_news_page(
+        bot: AsyncTeleBot,
+        msg: tb.types.Message,
+        source: str,
+        category: str,
+        page: int=1,
+        page_size: int=NEWS_PAGE_SIZE,
+        edit: bool=False) -> None:
+    """Sends news page to user and adds pagination buttons to it.
+
+    Args:
+        bot (AsyncTeleBot): Bot instance.
+        msg (tb.types.Message): Message instance.
+        source (str): News source.
+        category (str): News category.
+        page (int, optional): Page number. Defaults to 1.
+        page_size (int, optional): News items per page. Defaults to
+            NEWS_PAGE_SIZE.
+        edit (bool, optional): Show the page in msg instead of sending
+            a new message. Defaults to False.
+    Returns: None
+    """
+    # Fetch a missing feed on the loop rather than in the render thread
+    info = await asyncio.to_thread(svc.news_store.feed_info, source, category)
+    if info is None:
+        await asvc.get_news(source, category)
+    rendered = await asyncio.to_thread(
+        render.render_news_page, source, category, page, page_size)
+    if not edit:
+        await send_message(
+            msg.chat.id,
+            rendered.text,
+            reply_markup=rendered.markup,
+            parse_mode='Markdown'
+        )
+    elif not msgs.is_message_unchanged(msg, rendered.text, rendered.markup):
+        try:
+            await asyncio.wrap_future(outbox.edit_message_text(
+                rendered.text,
+                msg.chat.id,
+                message_id=msg.message_id,
+                reply_markup=rendered.markup,
+                parse_mode='Markdown'
+            ))
+        except tb.apihelper.ApiTelegramException as e:
+            # Markdown may hide that the rendered text is the same
+            if 'message is not modified' not in e.description:
+                raise
+
+async def send_all_news(
+        bot: AsyncTeleBot,
+        call: tb.types.CallbackQuery,
+        news: list,
+        digest: bool = False) -> None:
+    if digest:
+        for text in msgs.get_digest_texts(news[::-1]):
+            await send_message(
+                call.message.chat.id,
+                text,
+                parse_mode='html',
+                disable_web_page_preview=True)
+        return
+    for item in news[::-1]:
+        await send_message(
+            call.message.chat.id,
+            item.text,
+            parse_mode='html'
+            )
+
+async def send_search_page(
+        msg: tb.types.Message,
+        query: str,
+        query_id: int,
+        page: int=1,
+        edit: bool=False) -> None:
+    """Sends a page of search results to user.
+
+    Args:
+        msg (tb.types.Message): Message instance.
+        query (str): Words to search for.
+        query_id (int): ID of the query in searches.
+        page (int, optional): Page number. Defaults to 1.
+        edit (bool, optional): Show the page in msg instead of sending
+            a new message. Defaults to False.
+    Returns: None
+    """
+    news, total = await asyncio.to_thread(
+        svc.search_news, query, page, SEARCH_PAGE_SIZE)
+    if not total:
+        await send_message(msg.chat.id, msgs.NO_RESULTS_TEXT)
+        return
+    pagination = kb.InlineKeyboardPaginator(
+        -(-total // SEARCH_PAGE_SIZE),
+        current_page=page,
+        data_pattern='search#{page}#' + str(query_id),
+        jump=PAGE_JUMP)
+    text = '\n\n'.join(msgs.get_formatted_news(news))
+    if not edit:
+        await send_message(
+            msg.chat.id,
+            text,
+            reply_markup=pagination.markup)
+    elif not msgs.is_message_unchanged(msg, text, pagination.markup):
+        await asyncio.wrap_future(outbox.edit_message_text(
+            text,
+            msg.chat.id,
+            message_id=msg.message_id,
+            reply_markup=pagination.markup))
+
+async def handle_search_pagination(
+        call: tb.types.CallbackQuery,
+        data: CallbackData) -> None:
+    """Handles search results pagination callback query.
+
+    Args:
+        call (tb.types.CallbackQuery): Callback query instance.
+        data (CallbackData): Parsed callback data.
+    Returns: None
+    """
+    query = searches.get(call.message.chat.id, data.query_id)
+    if query is None:
+        await send_message(call.message.chat.id, msgs.SEARCH_EXPIRED_TEXT)
+        return
+    await send_search_page(
+        call.message, query, data.query_id, data.page, edit=True)
+
+MENU_MESSAGES = {
+    'pln': bot_pln_msg,
+    'cdi': bot_cdi_msg,
+    'ipsk': bot_ipsk_msg,
+    'settings': bot_settings_msg,
+    'back': bot_back_msg,
+}
+
+async def handle_main_callback_query(
+        call: tb.types.CallbackQuery,
+        data: CallbackData) -> None:
+    """Handles main menu callback query.
+
+    Args:
+        call (tb.types.CallbackQuery): Callback query instance.
+        data (CallbackData): Parsed callback data.
+    Returns: None
+    """
+    await MENU_MESSAGES[data.action](bot, call)
+
+async def handle_settings(
+        call: tb.types.CallbackQuery,
+        data: CallbackData) -> None:
+    """Handles settings callback query.
+
+    Args:
+        call (tb.types.CallbackQuery): CallbackQuery instance.
+        data (CallbackData): Parsed callback data.
+    Returns: None
+    """
+    settings_store.set_pagination_status(call.from_user.id, data.action)
+    await bot_back_msg(bot, call)
+
+async def handle_category(
+        call: tb.types.CallbackQuery,
+        data: CallbackData) -> None:
+    """Sends news of the pressed category as a page or as a full list.
+
+    Args:
+        call (tb.types.CallbackQuery): Callback query instance.
+        data (CallbackData): Parsed callback data.
+    Returns: None
+    """
+    try:
+        pagination_status = await get_pagination_status(call.from_user.id)
+
+        news = (await asvc.get_news(data.source, data.category))[data.category]
+        if pagination_status == 'pagination_on':
+            await send_news_page(bot, call.message, data.source, data.category)
+        else:
+            await send_all_news(
+                bot, call, news, digest=pagination_status == 'digest')
+            await bot_pln_msg(bot, call)
+    except Exception as e:
+        await send_message(
+            call.message.chat.id,
+            f"Error: {e}"
+            )
+
+async def handle_page(
+        call: tb.types.CallbackQuery,
+        data: CallbackData) -> None:
+    """Sends the requested page of a category.
+
+    Args:
+        call (tb.types.CallbackQuery): Callback query instance.
+        data (CallbackData): Parsed callback data.
+    Returns: None
+    """
+    try:
+        await send_news_page(
+            bot,
+            call.message,
+            data.source,
+            data.category,
+            data.page,
+            data.page_size or 1,
+            edit=True)
+    except Exception as e:
+        await send_message(
+            call.message.chat.id,
+            f"Error: {e}"
+            )
+
+# Compiled once, see main.router
+router = CallbackRouter(svc.CATEGORY_SOURCES)
+router.add_exact(MENU_MESSAGES, handle_main_callback_query)
+router.add_exact(
+    ['pagination_on', 'pagination_off', 'digest'], handle_settings)
+router.add_exact(svc.CATEGORY_SOURCES, handle_category)
+router.add_prefix('number', ('page', 'category'), handle_page)
+router.add_prefix('p', ('page', 'page_size', 'category'), handle_page)
+router.add_prefix(
+    'search', ('page', 'query_id'), handle_search_pagination)
+
+@bot.message_handler(commands=["start"])
+@metrics.timed
+async def handle_start(msg: tb.types.Message) -> None:
+    """Handles start command.
+
+    Args:
+        msg (tb.types.Message): Message instance.
+    Returns: None
+    """
+    await send_message(
+        chat_id=msg.chat.id,
+        text=msgs.get_start_text(msg.from_user.first_name),
+        parse_mode='MarkdownV2',
+        reply_markup=kb.MAIN_MARKUP
+    )
+    settings_store.set_pagination_status(msg.from_user.id, 'pagination_off')
+
+@bot.message_handler(commands=["search"])
+@metrics.timed
+async def handle_search(msg: tb.types.Message) -> None:
+    """Handles search command.
+
+    Args:
+        msg (tb.types.Message): Message instance.
+    Returns: None
+    """
+    query = tb.util.extract_arguments(msg.text).strip()
+    if not query:
+        await send_message(msg.chat.id, msgs.SEARCH_USAGE_TEXT)
+        return
+    query_id = searches.set(msg.chat.id, query)
+    await send_search_page(msg, query, query_id)
+
+@bot.inline_handler(func=lambda query: True)
+@metrics.timed
+async def handle_inline_query(query: tb.types.InlineQuery) -> None:
+    """Answers an inline query with news from local data.
+
+    Args:
+        query (tb.types.InlineQuery): Inline query instance.
+    Returns: None
+    """
+    results, next_offset = await asyncio.to_thread(
+        inline.get_inline_results, query.query, query.offset)
+    try:
+        await bot.answer_inline_query(
+            query.id,
+            results,
+            cache_time=INLINE_CACHE_TIME,
+            next_offset=next_offset)
+    except ApiTelegramException as e:
+        print(f"Failed to answer inline query: {e}")
+
+async def parse_category(msg: tb.types.Message):
+    """Returns the category after a command, or None after sending usage."""
+    category = tb.util.extract_arguments(msg.text).strip().lower()
+    if category not in svc.CATEGORY_SOURCES:
+        await send_message(
+            msg.chat.id,
+            msgs.SUBSCRIBE_USAGE_TEXT.format(
+                categories=', '.join(svc.CATEGORY_SOURCES)))
+        return None
+    return category
+
+@bot.message_handler(commands=["subscribe"])
+@metrics.timed
+async def handle_subscribe(msg: tb.types.Message) -> None:
+    """Handles subscribe command.
+
+    Args:
+        msg (tb.types.Message): Message instance.
+    Returns: None
+    """
+    category = await parse_category(msg)
+    if category is not None:
+        added = await asyncio.to_thread(
+            subscriptions.subscribe, msg.chat.id, category)
+        await send_message(
+            msg.chat.id, msgs.get_subscribed_text(category, added))
+
+@bot.message_handler(commands=["unsubscribe"])
+@metrics.timed
+async def handle_unsubscribe(msg: tb.types.Message) -> None:
+    """Handles unsubscribe command.
+
+    Args:
+        msg (tb.types.Message): Message instance.
+    Returns: None
+    """
+    category = await parse_category(msg)
+    if category is not None:
+        removed = await asyncio.to_thread(
+            subscriptions.unsubscribe, msg.chat.id, category)
+        await send_message(
+            msg.chat.id, msgs.get_unsubscribed_text(category, removed))
+
+@bot.message_handler(commands=["subscriptions"])
+@metrics.timed
+async def handle_subscriptions(msg: tb.types.Message) -> None:
+    """Handles subscriptions command.
+
+    Args:
+        msg (tb.types.Message): Message instance.
+    Returns: None
+    """
+    categories = await asyncio.to_thread(
+        subscriptions.categories, msg.chat.id)
+    await send_message(
+        msg.chat.id,
+        msgs.get_subscriptions_text(categories) if categories
+        else msgs.NO_SUBSCRIPTIONS_TEXT)
+
+@bot.callback_query_handler(func=lambda call: True)
+async def handle_callback_query(call: tb.types.CallbackQuery) -> None:
+    """Handles callback query.
+
+    Args:
+        call (tb.types.CallbackQuery): Callback query instance.
+    Returns: None
+    """
+    try:
+        await bot.answer_callback_query(call.id)
+    except ApiTelegramException:
+        # The query is too old to answer, handle it anyway
+        pass
+    resolved = router.resolve(call.data or '')
+    if resolved is None:
+        return
+    route, data = resolved
+    # Queued before the handler sends anything new, the outbox keeps a
+    # chat's calls in order
+    if route.delete_history:
+        outbox.delete_messages(call.message.chat.id, pop_sent_messages(call))
+    with metrics.HANDLER_SECONDS.labels(route.handler.__name__).time():
+        await route.handler(call, data)
+
+async def main() -> None:
+    try:
+        await bot.infinity_polling()
+    finally:
+        await asvc.client.close()
+        await bot.close_session()
+
+def run(
+        queue: OutboundQueue,
+        store: SettingsStore,
+        subscription_store: SubscriptionStore) -> None:
+    """Runs the bot on an asyncio event loop.
+
+    Args:
+        queue (OutboundQueue): Started outbox that sends, edits and
+            deletes messages under the same rate limits as the sync bot.
+        store (SettingsStore): Started store of user settings.
+        subscription_store (SubscriptionStore): Store of subscriptions.
+    Returns: None
+    """
+    global outbox, history, settings_store, subscriptions
+    outbox, history = queue, queue.history
+    settings_store, subscriptions = store, subscription_store
+    metrics.instrument_async_telebot()
+    asyncio.run(main())
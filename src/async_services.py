@@ -0,0 +1,190 @@
+import asyncio
+import time
+from typing import Tuple
+
+import aiohttp
+import feed
+import metrics
+import services as svc
+from http_client import CircuitBreaker, CircuitOpenError
+from settings import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_POOL_SIZE,
+    HTTP_READ_TIMEOUT,
+    HTTP_RETRIES,
+)
+
+
+class AsyncNewsClient:
+    """Asyncio counterpart of http_client.NewsClient.
+
+    Shares its circuit breakers and cache validators with the threaded
+    client, so an upstream that is down is skipped by both execution paths
+    and a feed fetched by one is not downloaded again by the other.
+    """
+
+    def __init__(
+            self,
+            base_url: str,
+            connect_timeout: float = 3.05,
+            read_timeout: float = 10.0,
+            retries: int = 3,
+            backoff_factor: float = 0.5,
+            pool_size: int = 10) -> None:
+        self.base_url = base_url.rstrip('/')
+        self.timeout = aiohttp.ClientTimeout(
+            connect=connect_timeout,
+            sock_read=read_timeout)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.pool_size = pool_size
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # The session must be created inside the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=self.timeout)
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+    def breaker(self, source: str) -> CircuitBreaker:
+        return svc.client.breaker(source)
+
+    async def get_json(self, source: str, category: str) -> dict:
+        """Fetches news of a category, see fetch."""
+        return (await self.fetch(source, category))[0]
+
+    async def fetch(self, source: str, category: str) -> Tuple[dict, bool]:
+        """Fetches news of a category.
+
+        Args:
+            source (str): News source, e.g. 'pln'.
+            category (str): News category, e.g. 'today'.
+        Returns:
+            Tuple[dict, bool]: Parsed response body and False if upstream
+                answered 304 and the body of the last response is reused.
+        Raises:
+            CircuitOpenError: If the source's circuit is open.
+            aiohttp.ClientError: If the request failed.
+        """
+        breaker = self.breaker(source)
+        if not breaker.allow():
+            metrics.UPSTREAM_RESPONSES.labels(
+                source, category, 'circuit_open').inc()
+            raise CircuitOpenError(f"{source} is unavailable, try again later")
+        url = f'{self.base_url}/{source}/{category}'
+        headers = svc.client.conditional_headers(source, category)
+        status = 'error'
+        started = time.perf_counter()
+        try:
+            for attempt in range(self.retries + 1):
+                status = 'error'
+                try:
+                    async with self.session.get(url, headers=headers) as response:
+                        status = str(response.status)
+                        if response.status >= 500 and attempt < self.retries:
+                            await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+                            continue
+                        if response.status == 304:
+                            breaker.record_success()
+                            return svc.client.not_modified(source, category), False
+                        response.raise_for_status()
+                        parser = feed.FeedParser(category)
+                        async for chunk in response.content.iter_chunked(
+                                feed.CHUNK_SIZE):
+                            parser.feed(chunk)
+                        data = parser.close()
+                        response_headers = response.headers
+                    break
+                except aiohttp.ClientResponseError as e:
+                    if e.status >= 500:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                    raise
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    if attempt < self.retries:
+                        await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+                        continue
+                    breaker.record_failure()
+                    raise
+                except Exception:
+                    # FeedError from the parser, or anything unexpected,
+                    # must not leave a trial call running
+                    breaker.record_failure()
+                    raise
+        except asyncio.CancelledError:
+            # Shutdown or an abandoned task says nothing about upstream
+            breaker.release_trial()
+            raise
+        finally:
+            metrics.UPSTREAM_SECONDS.labels(source, category).observe(
+                time.perf_counter() - started)
+            metrics.UPSTREAM_RESPONSES.labels(source, category, status).inc()
+        breaker.record_success()
+        svc.client.save_validators(source, category, response_headers, data)
+        return data, True
+
+
+# Errors after which news is served from the local store
+UPSTREAM_ERRORS = (
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+    CircuitOpenError,
+    feed.FeedError,
+)
+
+client = AsyncNewsClient(
+    svc.BASE_URL,
+    connect_timeout=HTTP_CONNECT_TIMEOUT,
+    read_timeout=HTTP_READ_TIMEOUT,
+    retries=HTTP_RETRIES,
+    pool_size=HTTP_POOL_SIZE)
+
+
+async def fetch_news(source: str, category: str) -> dict:
+    """Downloads a feed and saves it to the local news store if changed.
+
+    Shares downloads in flight with svc.fetch_news, see svc.fetches.
+    """
+    return await svc.fetches.ado(
+        (source, category),
+        lambda: _fetch_news(source, category))
+
+async def _fetch_news(source: str, category: str) -> dict:
+    news, modified = await client.fetch(source, category)
+    if modified:
+        await asyncio.to_thread(
+            svc.ingest_news, source, category, news.get(category, []))
+    return news
+
+async def get_news(source: str, category: str) -> dict:
+    """Returns a feed from the cache, upstream or the local news store."""
+    try:
+        return await svc.news_cache.aget(
+            (source, category),
+            lambda: fetch_news(source, category))
+    except UPSTREAM_ERRORS:
+        if await asyncio.to_thread(
+                svc.news_store.feed_info, source, category) is None:
+            raise
+        return {category: await asyncio.to_thread(
+            svc.news_store.get_feed, source, category)}
+
+async def get_pln_news(category: str) -> dict:
+    return await get_news('pln', category)
+
+async def get_cdi_news(category: str) -> dict:
+    return await get_news('cdi', category)
+
+async def get_pg_news(category: str) -> dict:
+    return await get_news('pg', category)
+
+async def get_ipsk_news(category: str) -> dict:
+    return await get_news('ipsk', category)
@@ -0,0 +1,276 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, List, Optional, Tuple
+
+
+# Entry states returned by NewsCache._lookup
+FRESH = 'fresh'
+STALE = 'stale'
+REFRESHING = 'refreshing'
+MISSING = 'missing'
+
+
+class _Entry:
+    __slots__ = ('value', 'fetched_at')
+
+    def __init__(self, value: Any, fetched_at: float) -> None:
+        self.value = value
+        self.fetched_at = fetched_at
+
+
+class _RestoredEntry:
+    """Entry restored from a snapshot, decoded when it is first used."""
+
+    __slots__ = ('_value', '_data', '_decode', 'fetched_at')
+
+    def __init__(
+            self,
+            data: bytes,
+            decode: Callable[[bytes], Any],
+            fetched_at: float) -> None:
+        self._value = None
+        self._data = data
+        self._decode = decode
+        self.fetched_at = fetched_at
+
+    @property
+    def value(self) -> Any:
+        data = self._data
+        if data is None:
+            return self._value
+        # Two threads may both decode, they get equal values
+        value = self._decode(data)
+        self._value = value
+        self._data = None
+        return value
+
+    def raw(self) -> Optional[bytes]:
+        """Returns the encoded value while it has not been decoded yet.
+
+        The data is copied, so the entry no longer refers to the buffer
+        it was restored from.
+        """
+        data = self._data
+        if data is None:
+            return None
+        data = bytes(data)
+        self._data = data
+        return data
+
+
+class NewsCache:
+    """Thread-safe LRU cache with per-key TTL and stale-while-revalidate.
+
+    Fresh entries are returned as is. Expired entries are still returned
+    right away while a single background refresh replaces them, unless
+    they are older than `ttl + stale_ttl`, in which case the caller waits
+    for a new value. When the cache is full the least recently used entry
+    is evicted.
+    """
+
+    def __init__(
+            self,
+            maxsize: int = 128,
+            ttl: Callable[[Hashable], float] = lambda key: 60.0,
+            stale_ttl: float = 3600.0) -> None:
+        """Creates a cache.
+
+        Args:
+            maxsize (int, optional): Maximum number of entries. Defaults to 128.
+            ttl (Callable, optional): Returns the TTL in seconds for a key.
+                Defaults to 60 seconds for every key.
+            stale_ttl (float, optional): How long after expiry an entry may
+                still be served while it is refreshed. Defaults to 3600.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Returns cached value for key, loading it if needed.
+
+        Args:
+            key (Hashable): Cache key.
+            loader (Callable): Function that fetches a new value.
+        Returns:
+            Any: Cached or freshly loaded value.
+        """
+        entry, state = self._lookup(key)
+        if state == STALE:
+            threading.Thread(
+                target=self._refresh,
+                args=(key, loader),
+                daemon=True).start()
+        if entry is not None:
+            return entry.value
+        value = loader()
+        self.set(key, value)
+        return value
+
+    async def aget(
+            self,
+            key: Hashable,
+            loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Returns cached value for key, awaiting loader if needed.
+
+        Same as `get`, but for use on an event loop: loader is a coroutine
+        function and background refreshes run as tasks.
+
+        Args:
+            key (Hashable): Cache key.
+            loader (Callable): Coroutine function that fetches a new value.
+        Returns:
+            Any: Cached or freshly loaded value.
+        """
+        entry, state = self._lookup(key)
+        if state == STALE:
+            asyncio.get_running_loop().create_task(self._arefresh(key, loader))
+        if entry is not None:
+            return entry.value
+        value = await loader()
+        self.set(key, value)
+        return value
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Returns cached value for key without loading or refreshing it.
+
+        Args:
+            key (Hashable): Cache key.
+        Returns:
+            Optional[Any]: Cached value or None.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            return entry.value if entry is not None else None
+
+    def set(self, key: Hashable, value: Any, fetched_at: float = None) -> None:
+        """Stores value for key and evicts the oldest entries if needed.
+
+        Args:
+            key (Hashable): Cache key.
+            value (Any): Value to store.
+            fetched_at (float, optional): When the value was fetched.
+                Defaults to now.
+        """
+        if fetched_at is None:
+            fetched_at = time.time()
+        with self._lock:
+            self._data[key] = _Entry(value, fetched_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def restore(
+            self,
+            key: Hashable,
+            data: bytes,
+            decode: Callable[[bytes], Any],
+            fetched_at: float) -> bool:
+        """Adds an encoded entry, e.g. from a snapshot taken before a restart.
+
+        The value is decoded on first use. Its age counts from fetched_at,
+        so an expired entry is served stale and refreshed like any other.
+        Restoring entries least recently used first keeps their order.
+
+        Args:
+            key (Hashable): Cache key.
+            data (bytes): Encoded value.
+            decode (Callable): Turns data into the value.
+            fetched_at (float): When the value was fetched.
+        Returns:
+            bool: False if key was already cached, which is kept as newer.
+        """
+        with self._lock:
+            if key in self._data:
+                return False
+            self._data[key] = _RestoredEntry(data, decode, fetched_at)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return True
+
+    def dump(
+            self,
+            encode: Callable[[Any], bytes]) -> List[Tuple[Hashable, float, bytes]]:
+        """Returns all entries encoded, least recently used first.
+
+        Restored entries that were never used are not decoded, their
+        encoded data is returned as is.
+
+        Args:
+            encode (Callable): Turns a value into bytes.
+        Returns:
+            List[Tuple[Hashable, float, bytes]]: (key, fetched_at, data).
+        """
+        with self._lock:
+            entries = list(self._data.items())
+        dumped = []
+        for key, entry in entries:
+            data = entry.raw() if isinstance(entry, _RestoredEntry) else None
+            if data is None:
+                data = encode(entry.value)
+            dumped.append((key, entry.fetched_at, data))
+        return dumped
+
+    def invalidate(self, key: Hashable) -> None:
+        """Removes key from the cache.
+
+        Args:
+            key (Hashable): Cache key.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def _lookup(self, key: Hashable) -> Tuple[Optional[_Entry], str]:
+        """Finds entry for key and claims its refresh if it has expired.
+
+        Returns the entry (None if it is missing or too old to serve) and
+        STALE only to the one caller that must start the refresh.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None, MISSING
+            self._data.move_to_end(key)
+            age = now - entry.fetched_at
+            ttl = self.ttl(key)
+            if age < ttl:
+                return entry, FRESH
+            if age >= ttl + self.stale_ttl:
+                return None, MISSING
+            if key in self._refreshing:
+                return entry, REFRESHING
+            self._refreshing.add(key)
+            return entry, STALE
+
+    def _refresh(self, key: Hashable, loader: Callable[[], Any]) -> None:
+        try:
+            self.set(key, loader())
+        except Exception as e:
+            print(f"Failed to refresh {key}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    async def _arefresh(
+            self,
+            key: Hashable,
+            loader: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            self.set(key, await loader())
+        except Exception as e:
+            print(f"Failed to refresh {key}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
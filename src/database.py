@@ -2,6 +2,33 @@ import sqlite3
 from typing import List, Union, Tuple
 
 
+# Schema changes, applied in order. The number of applied migrations is
+# kept in the database's user_version.
+MIGRATIONS = [
+    # 1: one settings row per user, looked up through a unique index
+    [
+        """CREATE TABLE IF NOT EXISTS settings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INT,
+            pagination_status TEXT
+        )""",
+        """DELETE FROM settings WHERE id NOT IN (
+            SELECT MAX(id) FROM settings GROUP BY user_id
+        )""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS settings_user_id ON settings (user_id)",
+    ],
+    # 2: chats subscribed to new items of a category, read per category
+    [
+        """CREATE TABLE IF NOT EXISTS subscriptions (
+            category TEXT NOT NULL,
+            chat_id INTEGER NOT NULL,
+            PRIMARY KEY (category, chat_id)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS subscriptions_chat_id ON subscriptions (chat_id)",
+    ],
+]
+
+
 def create_connection(database: str) -> Union[sqlite3.Connection, None]:
     """Create a connection to database.
 
@@ -13,6 +40,10 @@ def create_connection(database: str) -> Union[sqlite3.Connection, None]:
     """
     try:
         conn = sqlite3.connect(database, check_same_thread=False)
+        # WAL lets readers run during writes; NORMAL is durable in WAL mode
+        # except for the last transactions on power loss
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
         print(f"Successfully connected to {database}")
         return conn
     except sqlite3.Error as e:
@@ -35,6 +66,38 @@ def create_cursor(conn: sqlite3.Connection) -> Union[sqlite3.Cursor, None]:
         print(e)
 
 
+def migrate(
+        conn: sqlite3.Connection,
+        migrations: List[List[str]] = MIGRATIONS
+        ) -> int:
+    """Apply pending migrations to database.
+
+    Each migration runs in its own transaction together with the update of
+    user_version, so an interrupted upgrade can simply be run again.
+
+    params:
+    - conn (sqlite3.Connection): the connection object
+    - migrations (list of list of str): statements of each migration,
+    defaults to the settings database migrations
+
+    returns:
+    - version (int): the schema version after migrating
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, statements in enumerate(migrations[version:], version + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        version = number
+    return version
+
+
 def create_table(
         cursor: sqlite3.Cursor, 
         table_name: str, 
@@ -76,20 +139,38 @@ def insert_data(
     returns:
     - None
     """
-    user_id, pagination_status = item
     cursor.execute(
-        f"SELECT * FROM {table_name} WHERE user_id = ?", 
-        (user_id,))
-    if cursor.fetchone():
-        cursor.execute(
-            f"UPDATE {table_name} SET pagination_status = ? WHERE user_id = ?", 
-            (pagination_status, user_id))
-    else:
-        cursor.execute(
-            f"INSERT INTO {table_name} (user_id, pagination_status) VALUES (?, ?)", 
-            (user_id, pagination_status))
+        f"INSERT INTO {table_name} (user_id, pagination_status) VALUES (?, ?) "
+        "ON CONFLICT (user_id) DO UPDATE SET pagination_status = excluded.pagination_status",
+        item)
     conn.commit()
 
+def insert_many(
+        conn: sqlite3.Connection,
+        cursor: sqlite3.Cursor,
+        table_name: str,
+        items: List[Tuple[int, str]]
+        ) -> None:
+    """Insert or update many rows in a single transaction.
+
+    params:
+    - conn (sqlite3.Connection): the connection object
+    - cursor (sqlite3.Cursor): the cursor object
+    - table_name (str): the name of the table to insert data into
+    - items (list of tuple): (user_id, pagination_status) pairs
+
+    returns:
+    - None
+    """
+    try:
+        cursor.executemany(
+            f"INSERT INTO {table_name} (user_id, pagination_status) VALUES (?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET pagination_status = excluded.pagination_status",
+            items)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
 
 def select_pagination_status(
         cursor: sqlite3.Cursor,
@@ -112,3 +193,97 @@ def select_pagination_status(
         "SELECT pagination_status FROM settings WHERE user_id = ?", 
         (condition,))
     return cursor.fetchall()
+
+def insert_subscription(
+        conn: sqlite3.Connection,
+        cursor: sqlite3.Cursor,
+        chat_id: int,
+        category: str
+        ) -> bool:
+    """Subscribe a chat to a category.
+
+    params:
+    - conn (sqlite3.Connection): the connection object
+    - cursor (sqlite3.Cursor): the cursor object
+    - chat_id (int): the chat to subscribe
+    - category (str): the news category
+
+    returns:
+    - added (bool): False if the chat was already subscribed
+    """
+    cursor.execute(
+        "INSERT INTO subscriptions (category, chat_id) VALUES (?, ?) "
+        "ON CONFLICT DO NOTHING",
+        (category, chat_id))
+    conn.commit()
+    return cursor.rowcount > 0
+
+def delete_subscriptions(
+        conn: sqlite3.Connection,
+        cursor: sqlite3.Cursor,
+        chat_id: int,
+        category: str = None
+        ) -> int:
+    """Unsubscribe a chat from a category or from all categories.
+
+    params:
+    - conn (sqlite3.Connection): the connection object
+    - cursor (sqlite3.Cursor): the cursor object
+    - chat_id (int): the chat to unsubscribe
+    - category (str): the news category, None for all categories
+
+    returns:
+    - count (int): the number of removed subscriptions
+    """
+    if category is None:
+        cursor.execute("DELETE FROM subscriptions WHERE chat_id = ?", (chat_id,))
+    else:
+        cursor.execute(
+            "DELETE FROM subscriptions WHERE category = ? AND chat_id = ?",
+            (category, chat_id))
+    conn.commit()
+    return cursor.rowcount
+
+def select_subscriptions(
+        cursor: sqlite3.Cursor,
+        chat_id: int
+        ) -> List[Tuple[str]]:
+    """Select categories a chat is subscribed to.
+
+    params:
+    - cursor (sqlite3.Cursor): the cursor object
+    - chat_id (int): the chat
+
+    returns:
+    - data (list of tuple of str): a list of (category,) tuples
+    """
+    cursor.execute(
+        "SELECT category FROM subscriptions WHERE chat_id = ? ORDER BY category",
+        (chat_id,))
+    return cursor.fetchall()
+
+def select_subscribers(
+        cursor: sqlite3.Cursor,
+        category: str,
+        after: int,
+        limit: int
+        ) -> List[Tuple[int]]:
+    """Select a batch of chats subscribed to a category.
+
+    Batches are read in chat_id order starting after the last chat of
+    the previous batch, so each one is a range scan of the primary key.
+
+    params:
+    - cursor (sqlite3.Cursor): the cursor object
+    - category (str): the news category
+    - after (int): the last chat_id of the previous batch
+    - limit (int): the most chats to return
+
+    returns:
+    - data (list of tuple of int): a list of (chat_id,) tuples
+    """
+    cursor.execute(
+        "SELECT chat_id FROM subscriptions WHERE category = ? AND chat_id > ? "
+        "ORDER BY chat_id LIMIT ?",
+        (category, after, limit))
+    return cursor.fetchall()
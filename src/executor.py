@@ -0,0 +1,97 @@
+import threading
+from collections import deque
+from typing import Callable, Dict, Hashable
+
+
+class ChatExecutor:
+    """Thread pool that runs the tasks of each chat in order.
+
+    Tasks are queued per chat. A worker takes the oldest task of a chat
+    that has no task running, so tasks of one chat never run at the same
+    time or out of order, while different chats are handled in parallel
+    by up to `workers` threads. When `max_pending` tasks are waiting,
+    `submit` blocks, which pushes back on whoever receives the updates.
+    """
+
+    def __init__(self, workers: int = 8, max_pending: int = 10000) -> None:
+        """Creates an executor.
+
+        Args:
+            workers (int, optional): Threads running tasks.
+            max_pending (int, optional): Waiting tasks before submit blocks.
+        """
+        self.workers = workers
+        self.max_pending = max_pending
+        self._queues: Dict[Hashable, deque] = {}
+        # Chats with waiting tasks and no running task, oldest first
+        self._ready = deque()
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._threads = []
+
+    def start(self) -> None:
+        """Starts the worker threads."""
+        self._stopped = False
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._run,
+                name=f'updates-{i}',
+                daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        """Runs the waiting tasks, then stops the worker threads."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(
+            self,
+            chat_id: Hashable,
+            task: Callable,
+            *args,
+            **kwargs) -> None:
+        """Queues a task after the other tasks of a chat.
+
+        Args:
+            chat_id (Hashable): Chat the task belongs to.
+            task (Callable): Function to run.
+            *args, **kwargs: Arguments passed to task.
+        """
+        with self._cond:
+            while self._pending >= self.max_pending and not self._stopped:
+                self._cond.wait()
+            queue = self._queues.get(chat_id)
+            if queue is None:
+                queue = self._queues[chat_id] = deque()
+                self._ready.append(chat_id)
+            queue.append((task, args, kwargs))
+            self._pending += 1
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._ready and not self._stopped:
+                    self._cond.wait()
+                if not self._ready:
+                    return
+                chat_id = self._ready.popleft()
+                task, args, kwargs = self._queues[chat_id].popleft()
+                self._pending -= 1
+                self._cond.notify_all()
+            try:
+                task(*args, **kwargs)
+            except Exception as e:
+                print(f"Failed to handle update: {e}")
+            with self._cond:
+                if self._queues[chat_id]:
+                    self._ready.append(chat_id)
+                    self._cond.notify_all()
+                else:
+                    del self._queues[chat_id]
@@ -0,0 +1,283 @@
+import codecs
+import json
+import sys
+from typing import Any, Iterable, List, NamedTuple
+
+
+# Bytes read from a response at a time while parsing it
+CHUNK_SIZE = 16 * 1024
+
+_WHITESPACE = ' \t\n\r'
+
+# Characters that may continue a JSON number
+_NUMBER_CHARS = '0123456789+-.eE'
+
+# Returned by FeedParser._value when the buffer ends inside the value
+_MISSING = object()
+
+
+class FeedError(ValueError):
+    """Raised when a news API response is not a valid feed."""
+
+
+class NewsItem(NamedTuple):
+    """News item, unpacks as (date, title, link) like the API's lists.
+
+    A tuple has no per-instance dict and takes less memory than the
+    three-item list the JSON decoder makes.
+    """
+    date: str
+    title: str
+    link: str
+
+    @property
+    def text(self) -> str:
+        """Item formatted as a plain text message."""
+        return f"Date: {self.date}\nTitle: {self.title}\nLink: {self.link}"
+
+
+def make_item(date: str, title: str, link: str) -> NewsItem:
+    """Creates a news item, sharing the date string with other items.
+
+    Feeds repeat the same few dates, interning keeps one copy of each.
+    """
+    return NewsItem(sys.intern(date) if date else date, title, link)
+
+
+class FeedParser:
+    """Incremental parser of a news API response.
+
+    Takes the body in chunks as it arrives and turns the items of the
+    category into NewsItems one by one, so neither the whole body nor a
+    list per item is kept while the feed is parsed. Other keys of the
+    response are parsed as plain JSON.
+    """
+
+    def __init__(self, category: str) -> None:
+        """Creates a parser.
+
+        Args:
+            category (str): Category whose items are parsed into NewsItems.
+        """
+        self.category = category
+        self.data = {}
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._state = self._start
+        self._key = None
+        self._items = None
+
+    def feed(self, chunk: bytes) -> None:
+        """Parses the next chunk of the body.
+
+        Raises:
+            FeedError: If the body is not a JSON object.
+        """
+        self._buffer = self._buffer[self._pos:] + self._decode(chunk)
+        self._pos = 0
+        self._parse(final=False)
+
+    def close(self) -> dict:
+        """Finishes parsing.
+
+        Returns:
+            dict: Parsed body, the category's items as NewsItems.
+        Raises:
+            FeedError: If the body is incomplete or not a JSON object.
+        """
+        self.feed(b'')
+        self._buffer += self._decode(b'', final=True)
+        self._parse(final=True)
+        if self._state != self._done:
+            raise FeedError('Incomplete news feed')
+        return self.data
+
+    def _decode(self, chunk: bytes, final: bool = False) -> str:
+        try:
+            return self._decoder.decode(chunk, final)
+        except UnicodeDecodeError as e:
+            raise FeedError(f"Invalid UTF-8: {e}") from e
+
+    def _parse(self, final: bool) -> None:
+        # Each state consumes a token and returns False if it needs more data
+        while self._state(final):
+            pass
+
+    def _skip_whitespace(self) -> bool:
+        buffer = self._buffer
+        while self._pos < len(buffer) and buffer[self._pos] in _WHITESPACE:
+            self._pos += 1
+        return self._pos < len(buffer)
+
+    def _expect(self, chars: str) -> str:
+        char = self._buffer[self._pos]
+        if char not in chars:
+            raise FeedError(
+                f"Expected {' or '.join(chars)} at {self._pos}, got {char!r}")
+        self._pos += 1
+        return char
+
+    def _value(self, final: bool) -> Any:
+        """Decodes the value at the position, _MISSING if it is incomplete."""
+        try:
+            value, end = self._json.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError as e:
+            if final:
+                raise FeedError(str(e)) from e
+            return _MISSING
+        # A number at the end of the buffer may go on in the next chunk,
+        # also when the buffer ends in its fraction or exponent like '12.'
+        if not final and self._number_runs_to_end(end):
+            return _MISSING
+        self._pos = end
+        return value
+
+    def _number_runs_to_end(self, pos: int) -> bool:
+        buffer = self._buffer
+        while pos < len(buffer) and buffer[pos] in _NUMBER_CHARS:
+            pos += 1
+        return pos >= len(buffer)
+
+    def _start(self, final: bool) -> bool:
+        if not self._skip_whitespace():
+            return False
+        self._expect('{')
+        self._state = self._first_key
+        return True
+
+    def _first_key(self, final: bool) -> bool:
+        if not self._skip_whitespace():
+            return False
+        if self._buffer[self._pos] == '}':
+            self._pos += 1
+            self._state = self._done
+            return True
+        self._state = self._key_state
+        return True
+
+    def _key_state(self, final: bool) -> bool:
+        if not self._skip_whitespace():
+            return False
+        if self._buffer[self._pos] != '"':
+            raise FeedError(f"Expected a key at {self._pos}")
+        key = self._value(final)
+        if key is _MISSING:
+            return False
+        self._key = key
+        self._state = self._colon
+        return True
+
+    def _colon(self, final: bool) -> bool:
+        if not self._skip_whitespace():
+            return False
+        self._expect(':')
+        self._state = self._value_state
+        return True
+
+    def _value_state(self, final: bool) -> bool:
+        if not self._skip_whitespace():
+            return False
+        if self._key == self.category and self._buffer[self._pos] == '[':
+            self._pos += 1
+            self._items = self.data[self._key] = []
+            self._state = self._first_item
+            return True
+        value = self._value(final)
+        if value is _MISSING:
+            return False
+        self.data[self._key] = value
+        self._state = self._next_key
+        return True
+
+    def _first_item(self, final: bool) -> bool:
+        if not self._skip_whitespace():
+            return False
+        if self._buffer[self._pos] == ']':
+            self._pos += 1
+            self._state = self._next_key
+            return True
+        self._state = self._item
+        return True
+
+    def _item(self, final: bool) -> bool:
+        if not self._skip_whitespace():
+            return False
+        value = self._value(final)
+        if value is _MISSING:
+            return False
+        if not _is_item(value):
+            raise FeedError(f"Expected a [date, title, link] item, got {value!r}")
+        self._items.append(make_item(*value))
+        self._state = self._next_item
+        return True
+
+    def _next_item(self, final: bool) -> bool:
+        if not self._skip_whitespace():
+            return False
+        if self._expect(',]') == ',':
+            self._state = self._item
+        else:
+            self._state = self._next_key
+        return True
+
+    def _next_key(self, final: bool) -> bool:
+        if not self._skip_whitespace():
+            return False
+        if self._expect(',}') == ',':
+            self._state = self._key_state
+        else:
+            self._state = self._done
+        return True
+
+    def _done(self, final: bool) -> bool:
+        if self._skip_whitespace():
+            raise FeedError(f"Extra data at {self._pos}")
+        return False
+
+
+def _is_item(value: Any) -> bool:
+    """Returns whether a decoded value is a [date, title, link] list."""
+    if not isinstance(value, list) or len(value) != 3:
+        return False
+    date, title, link = value
+    # make_item interns the date and keeps a missing one as is
+    return (
+        (date is None or isinstance(date, str))
+        and isinstance(title, str)
+        and isinstance(link, str))
+
+
+def parse_feed(chunks: Iterable[bytes], category: str) -> dict:
+    """Parses a news API response from its body chunks.
+
+    Args:
+        chunks (Iterable[bytes]): Body, e.g. response.iter_content().
+        category (str): Category whose items are parsed into NewsItems.
+    Returns:
+        dict: Parsed body.
+    Raises:
+        FeedError: If the body is not a valid feed.
+    """
+    parser = FeedParser(category)
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.close()
+
+
+def from_json(data: dict) -> dict:
+    """Turns a feed saved as plain JSON back into NewsItems."""
+    return {
+        key: to_items(value) if isinstance(value, list) else value
+        for key, value in data.items()
+    }
+
+
+def to_items(rows: Iterable[Any]) -> List[NewsItem]:
+    """Turns (date, title, link) rows, e.g. database rows, into NewsItems."""
+    return [
+        make_item(*row)
+        if isinstance(row, (list, tuple)) and len(row) == 3 else row
+        for row in rows
+    ]
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Hashable, List, Optional
+
+
+class MessageHistory:
+    """Remembers IDs of the messages the bot has sent to each chat.
+
+    Keeps at most `per_chat` IDs per chat and `max_chats` chats, dropping
+    the oldest IDs and the least recently active chats first.
+    """
+
+    def __init__(self, per_chat: int = 100, max_chats: int = 10000) -> None:
+        self.per_chat = per_chat
+        self.max_chats = max_chats
+        self._chats = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, chat_id: Hashable, message_id: int) -> None:
+        """Records a sent message.
+
+        Args:
+            chat_id (Hashable): Chat the message was sent to.
+            message_id (int): ID of the message.
+        """
+        with self._lock:
+            ids = self._chats.get(chat_id)
+            if ids is None:
+                ids = self._chats[chat_id] = deque(maxlen=self.per_chat)
+                if len(self._chats) > self.max_chats:
+                    self._chats.popitem(last=False)
+            else:
+                self._chats.move_to_end(chat_id)
+            ids.append(message_id)
+
+    def pop_all(self, chat_id: Hashable) -> List[int]:
+        """Forgets and returns all recorded messages of a chat.
+
+        Args:
+            chat_id (Hashable): Chat to clear.
+        Returns:
+            List[int]: Message IDs, oldest first.
+        """
+        with self._lock:
+            return list(self._chats.pop(chat_id, ()))
+
+
+class SearchHistory:
+    """Remembers the recent search queries of each chat.
+
+    Every query gets an ID that search result pages carry in their
+    callback data, so each result message keeps paging through its own
+    query. At most `per_chat` queries of `max_chats` chats are kept.
+    """
+
+    def __init__(self, per_chat: int = 20, max_chats: int = 10000) -> None:
+        self.per_chat = per_chat
+        self.max_chats = max_chats
+        self._chats = OrderedDict()
+        # Starting from the time keeps IDs from repeating across restarts
+        # unless queries came faster than one per second on average
+        self._next_id = int(time.time())
+        self._lock = threading.Lock()
+
+    def set(self, chat_id: Hashable, query: str) -> int:
+        """Records a query and returns its ID."""
+        with self._lock:
+            self._next_id += 1
+            queries = self._chats.get(chat_id)
+            if queries is None:
+                queries = self._chats[chat_id] = OrderedDict()
+            queries[self._next_id] = query
+            while len(queries) > self.per_chat:
+                queries.popitem(last=False)
+            self._chats.move_to_end(chat_id)
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+            return self._next_id
+
+    def get(self, chat_id: Hashable, query_id: int) -> Optional[str]:
+        """Returns a query of the chat, None if it was forgotten."""
+        with self._lock:
+            return self._chats.get(chat_id, {}).get(query_id)
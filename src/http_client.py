@@ -0,0 +1,269 @@
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import feed
+import metrics
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class CircuitOpenError(Exception):
+    """Raised when a request is rejected because its circuit is open."""
+
+
+class Validators(NamedTuple):
+    """Cache validators of a feed and the body they belong to."""
+    etag: Optional[str]
+    last_modified: Optional[str]
+    data: dict
+
+
+class CircuitBreaker:
+    """Stops calling an upstream after repeated failures.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    rejects calls for `reset_timeout` seconds. Then a single trial call is
+    let through: success closes the breaker, failure opens it again.
+    """
+
+    def __init__(
+            self,
+            failure_threshold: int = 5,
+            reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        """Returns whether a call may go through now."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial_running:
+                return False
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+    def release_trial(self) -> None:
+        """Ends a call that neither succeeded nor failed, e.g. cancelled.
+
+        A running trial is given up, so the next call may try again.
+        """
+        with self._lock:
+            self._trial_running = False
+
+
+class NewsClient:
+    """Shared HTTP client for the news upstreams.
+
+    Uses one pooled keep-alive session for all requests, applies connect
+    and read timeouts, retries 5xx responses and connection errors with
+    exponential backoff and keeps a circuit breaker per source.
+
+    Requests are conditional: the ETag and Last-Modified of the last
+    response of each feed are sent back, and a 304 response reuses the
+    body parsed the last time. Responses are requested compressed and
+    parsed while they are downloaded.
+    """
+
+    def __init__(
+            self,
+            base_url: str,
+            connect_timeout: float = 3.05,
+            read_timeout: float = 10.0,
+            retries: int = 3,
+            backoff_factor: float = 0.5,
+            pool_size: int = 10,
+            failure_threshold: int = 5,
+            reset_timeout: float = 30.0) -> None:
+        """Creates a client.
+
+        Args:
+            base_url (str): Base URL of the news API.
+            connect_timeout (float, optional): Connect timeout in seconds.
+            read_timeout (float, optional): Read timeout in seconds.
+            retries (int, optional): Retries for 5xx and connection errors.
+            backoff_factor (float, optional): Backoff factor between retries.
+            pool_size (int, optional): Max keep-alive connections per host.
+            failure_threshold (int, optional): Failures that open a circuit.
+            reset_timeout (float, optional): Seconds a circuit stays open.
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = {}
+        self._validators: Dict[Tuple[str, str], Validators] = {}
+        self._lock = threading.Lock()
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']))
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def breaker(self, source: str) -> CircuitBreaker:
+        """Returns the circuit breaker of a source.
+
+        Args:
+            source (str): News source, e.g. 'pln'.
+        Returns:
+            CircuitBreaker: Breaker of the source.
+        """
+        with self._lock:
+            breaker = self._breakers.get(source)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    self.failure_threshold,
+                    self.reset_timeout)
+                self._breakers[source] = breaker
+            return breaker
+
+    def conditional_headers(self, source: str, category: str) -> dict:
+        """Returns headers making a feed request conditional.
+
+        Args:
+            source (str): News source.
+            category (str): News category.
+        Returns:
+            dict: If-None-Match and If-Modified-Since, if known.
+        """
+        with self._lock:
+            validators = self._validators.get((source, category))
+        headers = {}
+        if validators is not None:
+            if validators.etag:
+                headers['If-None-Match'] = validators.etag
+            if validators.last_modified:
+                headers['If-Modified-Since'] = validators.last_modified
+        return headers
+
+    def not_modified(self, source: str, category: str) -> dict:
+        """Returns the body a 304 response of a feed stands for."""
+        with self._lock:
+            return self._validators[(source, category)].data
+
+    def save_validators(
+            self,
+            source: str,
+            category: str,
+            headers,
+            data: dict) -> None:
+        """Remembers validators of a feed response.
+
+        Args:
+            source (str): News source.
+            category (str): News category.
+            headers: Response headers.
+            data (dict): Parsed response body.
+        """
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        with self._lock:
+            if etag or last_modified:
+                self._validators[(source, category)] = Validators(
+                    etag, last_modified, data)
+            else:
+                self._validators.pop((source, category), None)
+
+    def get_json(self, source: str, category: str) -> dict:
+        """Fetches news of a category.
+
+        Args:
+            source (str): News source, e.g. 'pln'.
+            category (str): News category, e.g. 'today'.
+        Returns:
+            dict: Parsed response body.
+        Raises:
+            CircuitOpenError: If the source's circuit is open.
+            requests.RequestException: If the request failed.
+        """
+        return self.fetch(source, category)[0]
+
+    def fetch(self, source: str, category: str) -> Tuple[dict, bool]:
+        """Fetches news of a category unless it has not changed.
+
+        Args:
+            source (str): News source, e.g. 'pln'.
+            category (str): News category, e.g. 'today'.
+        Returns:
+            Tuple[dict, bool]: Parsed response body and False if upstream
+                answered 304 and the body of the last response is reused.
+        Raises:
+            CircuitOpenError: If the source's circuit is open.
+            requests.RequestException: If the request failed.
+        """
+        breaker = self.breaker(source)
+        if not breaker.allow():
+            metrics.UPSTREAM_RESPONSES.labels(
+                source, category, 'circuit_open').inc()
+            raise CircuitOpenError(f"{source} is unavailable, try again later")
+        status = 'error'
+        started = time.perf_counter()
+        try:
+            response = self.session.get(
+                f'{self.base_url}/{source}/{category}',
+                headers=self.conditional_headers(source, category),
+                timeout=self.timeout,
+                stream=True)
+            with response:
+                status = str(response.status_code)
+                if response.status_code == 304:
+                    breaker.record_success()
+                    return self.not_modified(source, category), False
+                response.raise_for_status()
+                data = feed.parse_feed(
+                    response.iter_content(feed.CHUNK_SIZE),
+                    category)
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            raise
+        except (requests.RequestException, feed.FeedError):
+            breaker.record_failure()
+            raise
+        except Exception:
+            # Anything unexpected must not leave a trial call running
+            breaker.record_failure()
+            raise
+        finally:
+            metrics.UPSTREAM_SECONDS.labels(source, category).observe(
+                time.perf_counter() - started)
+            metrics.UPSTREAM_RESPONSES.labels(source, category, status).inc()
+        breaker.record_success()
+        self.save_validators(source, category, response.headers, data)
+        return data, True
@@ -0,0 +1,90 @@
+import hashlib
+from typing import List, Tuple
+
+import services as svc
+from cache import NewsCache
+from feed import NewsItem
+from settings import (
+    INLINE_CACHE_SIZE,
+    INLINE_CACHE_TIME,
+    INLINE_MAX_RESULTS,
+    INLINE_PAGE_SIZE,
+)
+from telebot.types import InlineQueryResultArticle, InputTextMessageContent
+
+
+# Telegram shows at most 50 results per answer
+MAX_PAGE_SIZE = 50
+
+# Results of recent queries, shared by all users; pages of the same
+# query are sliced from one entry
+result_cache = NewsCache(
+    maxsize=INLINE_CACHE_SIZE,
+    ttl=lambda key: INLINE_CACHE_TIME)
+
+
+def get_inline_results(
+        query: str,
+        offset: str = '') -> Tuple[List[InlineQueryResultArticle], str]:
+    """Returns a page of inline query results and the offset of the next.
+
+    Only the local news store and the feeds already in the cache are
+    read, never upstream, so answers are quick enough for Telegram's
+    inline query deadline.
+
+    Args:
+        query (str): Text typed after the bot's username.
+        offset (str, optional): Offset Telegram got from the previous page.
+    Returns:
+        Tuple[List[InlineQueryResultArticle], str]: Results of the page and
+            the next offset, empty on the last page.
+    """
+    key = ' '.join(query.lower().split())
+    results = result_cache.get(key, lambda: _build_results(key))
+    try:
+        start = max(int(offset), 0)
+    except ValueError:
+        start = 0
+    end = start + min(INLINE_PAGE_SIZE, MAX_PAGE_SIZE)
+    next_offset = str(end) if end < len(results) else ''
+    return results[start:end], next_offset
+
+def find_news(query: str) -> List[NewsItem]:
+    """Finds news for an inline query in local data.
+
+    Args:
+        query (str): Words to search for, empty for the latest news.
+    Returns:
+        List[NewsItem]: At most INLINE_MAX_RESULTS items, best first.
+    """
+    if query:
+        return svc.news_store.search(query, limit=INLINE_MAX_RESULTS)[0]
+    # The newest items of every cached feed, in turn
+    feeds = []
+    for source, categories in svc.NEWS_CATEGORIES.items():
+        for category in categories:
+            news = svc.news_cache.peek((source, category))
+            if news:
+                feeds.append(news.get(category) or [])
+    items = []
+    links = set()
+    for position in range(max(map(len, feeds), default=0)):
+        for feed in feeds:
+            if position < len(feed) and feed[position].link not in links:
+                links.add(feed[position].link)
+                items.append(feed[position])
+                if len(items) == INLINE_MAX_RESULTS:
+                    return items
+    return items
+
+def _build_results(query: str) -> List[InlineQueryResultArticle]:
+    return [
+        InlineQueryResultArticle(
+            # Result IDs may be at most 64 bytes long
+            id=hashlib.md5(item.link.encode()).hexdigest(),
+            title=item.title,
+            input_message_content=InputTextMessageContent(item.text),
+            url=item.link,
+            description=item.date)
+        for item in find_news(query)
+    ]
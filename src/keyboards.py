@@ -20,6 +20,8 @@ def get_settings_inline_markup():
     inline_keyboard.add(
         tb.types.InlineKeyboardButton('Pagination Off', callback_data='pagination_off'),
         tb.types.InlineKeyboardButton('Pagination On', callback_data='pagination_on'),
+    ).row(
+        tb.types.InlineKeyboardButton('Digest', callback_data='digest'),
     ).row(
         tb.types.InlineKeyboardButton('Back', callback_data='back')
     )
@@ -78,4 +80,12 @@ def get_pagination_inline_markup():
 class Pagination(InlineKeyboardPaginator):
     previous_page_label = '<'
     current_page_label = '-{}-'
-    next_page_label = '>'
\ No newline at end of file
+    next_page_label = '>'
+
+# Static menus are built and serialized once, telebot sends a str
+# reply_markup as is
+MAIN_MARKUP = get_main_inline_markup().to_json()
+SETTINGS_MARKUP = get_settings_inline_markup().to_json()
+PLN_MARKUP = get_pln_inline_markup().to_json()
+CDI_MARKUP = get_cdi_inline_markup().to_json()
+IPSK_MARKUP = get_ipsk_inline_markup().to_json()
@@ -1,29 +1,117 @@
+import functools
 import os
+import signal
+import sys
+import threading
 import telebot as tb
 import services as svc
 import keyboards as kb
 import database as db
-from typing import List
-from settings import BOT_TOKEN
-from telebot.types import InlineKeyboardButton
-
-
+import feed
+import inline
+import messages as msgs
+import metrics
+import render
+from executor import ChatExecutor
+from history import MessageHistory, SearchHistory
+from outbox import OutboundQueue
+from prefetch import PrefetchScheduler
+from router import CallbackData, CallbackRouter
+from snapshot import CacheSnapshot, SnapshotCache
+from subscriptions import SubscriptionStore, fan_out
+from telebot import apihelper, asyncio_helper
+from settings import (
+    BOT_MODE,
+    BOT_TOKEN,
+    INLINE_CACHE_TIME,
+    METRICS_HOST,
+    METRICS_PORT,
+    NEWS_PAGE_SIZE,
+    PAGE_JUMP,
+    PREFETCH_INTERVAL,
+    PREFETCH_JITTER,
+    PREFETCH_WORKERS,
+    SEND_BROADCAST_RATE,
+    SEND_CHAT_BURST,
+    SEND_CHAT_RATE,
+    SEND_GLOBAL_RATE,
+    SEARCH_PAGE_SIZE,
+    SEND_WORKERS,
+    SETTINGS_CACHE_SIZE,
+    SETTINGS_FLUSH_INTERVAL,
+    SNAPSHOT_INTERVAL,
+    SNAPSHOT_PATH,
+    TELEGRAM_API_URL,
+    UPDATE_QUEUE_SIZE,
+    UPDATE_WORKERS,
+    WEBHOOK_HOST,
+    WEBHOOK_PATH,
+    WEBHOOK_PORT,
+    WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_SECRET,
+    WEBHOOK_URL,
+    WEBHOOK_WORKERS,
+)
+from typing import Callable
+from user_settings import SettingsStore
+from webhook import WebhookServer
+
+
+if TELEGRAM_API_URL:
+    apihelper.API_URL = TELEGRAM_API_URL
+    asyncio_helper.API_URL = TELEGRAM_API_URL
+metrics.instrument_telebot()
 bot = tb.telebot.TeleBot(BOT_TOKEN)
+history = MessageHistory()
+searches = SearchHistory()
+updates = ChatExecutor(workers=UPDATE_WORKERS, max_pending=UPDATE_QUEUE_SIZE)
+outbox = OutboundQueue(
+    bot,
+    history=history,
+    global_rate=SEND_GLOBAL_RATE,
+    chat_rate=SEND_CHAT_RATE,
+    chat_burst=SEND_CHAT_BURST,
+    workers=SEND_WORKERS,
+    broadcast_rate=SEND_BROADCAST_RATE)
 
 if not os.path.exists('./data'):
     os.mkdir('./data')
 
 conn = db.create_connection('./data/settings.db')
-cursor = db.create_cursor(conn)
-db.create_table(
-            cursor, 
-            'settings', 
-            [
-            'id INTEGER PRIMARY KEY AUTOINCREMENT', 
-            'user_id INT', 
-            'pagination_status TEXT'
-            ]
-        )
+db.migrate(conn)
+# One transaction at a time on the shared connection, a commit by one
+# store must not land in the middle of the other's
+conn_lock = threading.Lock()
+settings_store = SettingsStore(
+    conn,
+    maxsize=SETTINGS_CACHE_SIZE,
+    flush_interval=SETTINGS_FLUSH_INTERVAL,
+    lock=conn_lock)
+subscriptions = SubscriptionStore(conn, lock=conn_lock)
+
+prefetcher = PrefetchScheduler(
+    svc.news_cache,
+    svc.NEWS_CATEGORIES,
+    svc.fetch_news,
+    interval=PREFETCH_INTERVAL,
+    # Refresh hot categories a bit before their cache entries expire
+    intervals={
+        category: ttl * 0.8
+        for category, ttl in svc.CATEGORY_TTL.items()
+    },
+    jitter=PREFETCH_JITTER,
+    workers=PREFETCH_WORKERS)
+
+snapshot = CacheSnapshot(
+    SNAPSHOT_PATH,
+    {
+        'news': SnapshotCache(svc.news_cache, from_json=feed.from_json),
+        'pages': SnapshotCache(
+            render.page_cache,
+            to_json=list,
+            from_json=lambda data: render.RenderedPage(*data)),
+    },
+    interval=SNAPSHOT_INTERVAL)
 
 def bot_pln_msg(bot: tb.TeleBot, call: tb.types.CallbackQuery) -> None:
         """Sends PLN news message to user.
@@ -33,18 +121,11 @@ def bot_pln_msg(bot: tb.TeleBot, call: tb.types.CallbackQuery) -> None:
             call (tb.types.CallbackQuery): CallbackQuery instance.
         Returns: None
         """
-        bot.send_message(
+        outbox.send_message(
             call.message.chat.id,
-            """
-Press *'Today'* to get today's news
-Press *'Accidents'* to get news about accidents
-Press *'Automir'* to get news about automir
-Press *'Culture'* to get news about culture
-Press *'Society'* to get news about society
-Press *'Back'* to get back to main menu
-            """,
+            msgs.PLN_MENU_TEXT,
             parse_mode='MarkdownV2',
-            reply_markup=kb.get_pln_inline_markup(),
+            reply_markup=kb.PLN_MARKUP,
         )
 
 def bot_cdi_msg(bot: tb.TeleBot, call: tb.types.CallbackQuery) -> None:
@@ -55,17 +136,11 @@ def bot_cdi_msg(bot: tb.TeleBot, call: tb.types.CallbackQuery) -> None:
             call (tb.types.CallbackQuery): CallbackQuery instance.
         Returns: None
         """
-        bot.send_message(
+        outbox.send_message(
             call.message.chat.id,
-            """
-Press *'News'* to get latest news
-Press *'Market'* to get regional market news
-Press *'Business'* to get regional business news
-Press *'Rabota'* to get info about vacancies
-Press *'Back'* to get back to main menu
-            """,
+            msgs.CDI_MENU_TEXT,
             parse_mode='MarkdownV2',
-            reply_markup=kb.get_cdi_inline_markup(),
+            reply_markup=kb.CDI_MARKUP,
         )
 
 def bot_ipsk_msg(bot: tb.TeleBot, call: tb.types.CallbackQuery) -> None:
@@ -76,14 +151,11 @@ def bot_ipsk_msg(bot: tb.TeleBot, call: tb.types.CallbackQuery) -> None:
             call (tb.types.CallbackQuery): CallbackQuery instance.
         Returns: None
         """
-        bot.send_message(
+        outbox.send_message(
             call.message.chat.id,
-            """
-Press *'News'* to get latest news
-Press *'Back'* to get back to main menu
-            """,
+            msgs.IPSK_MENU_TEXT,
             parse_mode='MarkdownV2',
-            reply_markup=kb.get_ipsk_inline_markup(),
+            reply_markup=kb.IPSK_MARKUP,
         )
 
 def bot_back_msg(bot: tb.TeleBot, call: tb.types.CallbackQuery) -> None:
@@ -94,11 +166,11 @@ def bot_back_msg(bot: tb.TeleBot, call: tb.types.CallbackQuery) -> None:
             call (tb.types.CallbackQuery): CallbackQuery instance.
         Returns: None
         """
-        bot.send_message(
+        outbox.send_message(
             call.message.chat.id,
-            "Please choose an option:",
+            msgs.MAIN_MENU_TEXT,
             parse_mode='MarkdownV2',
-            reply_markup=kb.get_main_inline_markup(),
+            reply_markup=kb.MAIN_MARKUP,
         )
 
 def bot_settings_msg(bot: tb.TeleBot, call: tb.types.CallbackQuery) -> None:
@@ -109,295 +181,375 @@ def bot_settings_msg(bot: tb.TeleBot, call: tb.types.CallbackQuery) -> None:
             call (tb.types.CallbackQuery): CallbackQuery instance.
         Returns: None
         """
-        bot.send_message(
+        outbox.send_message(
             call.message.chat.id,
-            """
-Press *'Show all list'* to get all news list
-Press *'Use Pagination'* to use pagination
-Press *'Back'* to get back to main menu
-            """,
+            msgs.SETTINGS_MENU_TEXT,
             parse_mode='MarkdownV2',
-            reply_markup=kb.get_settings_inline_markup(),
+            reply_markup=kb.SETTINGS_MARKUP,
         )
 
-def delete_past_messages(
-        bot: tb.TeleBot, 
-        call: tb.types.CallbackQuery, 
-        quantity: int = 10) -> None:
-    """Deletes past messages.
+def delete_sent_messages(call: tb.types.CallbackQuery) -> None:
+    """Deletes the messages the bot has sent to the chat in the background.
 
     Args:
-        bot (tb.TeleBot): Bot instance.
         call (tb.types.CallbackQuery): CallbackQuery instance.
-        quantity (int, optional): Quantity of messages to delete. Defaults to 10.
     Returns: None
     """
-    for i in range(quantity):
-        try:
-            bot.delete_message(
-                call.message.chat.id, 
-                call.message.message_id - i)
-        except tb.apihelper.ApiTelegramException:
-            break
-
-def get_formatted_news(news: List[List[str]]) -> List[str]:
-    """Formats news list to be sent to user.
-
-    Args:
-        news (List[List[str]]): List of news.
-    Returns:
-        List[str]: Formatted news list.
-    """
-    return [
-            f"Date: {item[0]}\nTitle: {item[1]}\nLink: {item[2]}" 
-            for item in news
-        ]
+    chat_id = call.message.chat.id
+    message_ids = history.pop_all(chat_id)
+    if call.message.message_id not in message_ids:
+        message_ids.append(call.message.message_id)
+    outbox.delete_messages(chat_id, message_ids)
 
 def send_news_page(
         bot: tb.TeleBot,
         msg: tb.types.Message, 
-        news: List[str], 
+        source: str,
+        category: str,
         page: int=1, 
-        _type: str=None) -> None:
+        page_size: int=NEWS_PAGE_SIZE,
+        edit: bool=False) -> None:
     """Sends news page to user and adds pagination buttons to it.
 
     Args:
         bot (tb.TeleBot): Bot instance.
         msg (tb.types.Message): Message instance.
-        news (List[str]): List of news.
+        source (str): News source.
+        category (str): News category.
+        page (int, optional): Page number. Defaults to 1.
+        page_size (int, optional): News items per page. Defaults to
+            NEWS_PAGE_SIZE.
+        edit (bool, optional): Show the page in msg instead of sending 
+            a new message. Defaults to False.
+    Returns: None
+    """
+    rendered = render.render_news_page(source, category, page, page_size)
+    if not edit:
+        outbox.send_message(
+            msg.chat.id,
+            rendered.text,
+            reply_markup=rendered.markup,
+            parse_mode='Markdown'
+        )
+    elif not msgs.is_message_unchanged(msg, rendered.text, rendered.markup):
+        outbox.edit_message_text(
+            rendered.text,
+            msg.chat.id,
+            message_id=msg.message_id,
+            reply_markup=rendered.markup,
+            parse_mode='Markdown'
+        )
+
+def send_search_page(
+        msg: tb.types.Message,
+        query: str,
+        query_id: int,
+        page: int=1,
+        edit: bool=False) -> None:
+    """Sends a page of search results to user.
+
+    Args:
+        msg (tb.types.Message): Message instance.
+        query (str): Words to search for.
+        query_id (int): ID of the query in searches.
         page (int, optional): Page number. Defaults to 1.
-        _type (str, optional): Type of news. Defaults to None.
+        edit (bool, optional): Show the page in msg instead of sending 
+            a new message. Defaults to False.
     Returns: None
     """
+    news, total = svc.search_news(query, page, SEARCH_PAGE_SIZE)
+    if not total:
+        outbox.send_message(msg.chat.id, msgs.NO_RESULTS_TEXT)
+        return
     pagination = kb.InlineKeyboardPaginator(
-        len(news),
+        -(-total // SEARCH_PAGE_SIZE),
         current_page=page,
-        data_pattern='number#{page}'+f'#{_type}')
-    pagination.add_after(InlineKeyboardButton('Back', callback_data='back'))
-    bot.send_message(
-        msg.chat.id,
-        news[page-1],
-        reply_markup=pagination.markup,
-        parse_mode='Markdown'
-    )
+        data_pattern='search#{page}#' + str(query_id),
+        jump=PAGE_JUMP)
+    text = '\n\n'.join(msgs.get_formatted_news(news))
+    if not edit:
+        outbox.send_message(
+            msg.chat.id,
+            text,
+            reply_markup=pagination.markup)
+    elif not msgs.is_message_unchanged(msg, text, pagination.markup):
+        outbox.edit_message_text(
+            text,
+            msg.chat.id,
+            message_id=msg.message_id,
+            reply_markup=pagination.markup)
+
+def handle_search_pagination(
+        call: tb.types.CallbackQuery,
+        data: CallbackData) -> None:
+    """Handles search results pagination callback query.
+
+    Args:
+        call (tb.types.CallbackQuery): Callback query instance.
+        data (CallbackData): Parsed callback data.
+    Returns: None
+    """
+    query = searches.get(call.message.chat.id, data.query_id)
+    if query is None:
+        outbox.send_message(call.message.chat.id, msgs.SEARCH_EXPIRED_TEXT)
+        return
+    send_search_page(
+        call.message, query, data.query_id, data.page, edit=True)
+
+MENU_MESSAGES = {
+    'pln': bot_pln_msg,
+    'cdi': bot_cdi_msg,
+    'ipsk': bot_ipsk_msg,
+    'settings': bot_settings_msg,
+    'back': bot_back_msg,
+}
 
 def handle_main_callback_query(
-        bot: tb.TeleBot, 
-        call: tb.types.CallbackQuery) -> None:
+        call: tb.types.CallbackQuery,
+        data: CallbackData) -> None:
     """Handles main menu callback query.
 
     Args:
-        bot (tb.TeleBot): Bot instance.
         call (tb.types.CallbackQuery): Callback query instance.
+        data (CallbackData): Parsed callback data.
     Returns: None
     """
-    if call.data == "pln":
-        bot_pln_msg(bot, call)
-        return
-    if call.data == "cdi":
-        bot_cdi_msg(bot, call)
-        return
-    if call.data == "ipsk":
-        bot_ipsk_msg(bot, call)
-        return
-    if call.data == "settings":
-        bot_settings_msg(bot, call)
-        return
-    if call.data == "back":
-        bot_back_msg(bot, call)
-        return
+    MENU_MESSAGES[data.action](bot, call)
 
-def handle_settings(bot: tb.TeleBot, call: tb.types.CallbackQuery) -> None:
+def handle_settings(
+        call: tb.types.CallbackQuery,
+        data: CallbackData) -> None:
     """Handles settings callback query.
 
     Args:
-        bot (tb.TeleBot): Bot instance.
         call (tb.types.CallbackQuery): CallbackQuery instance.
+        data (CallbackData): Parsed callback data.
     Returns: None
     """
-    if call.data in ['pagination_on', 'pagination_off']:
-        db.insert_data(
-            conn, 
-            cursor, 
-            'settings', 
-            (call.from_user.id, call.data))
-        bot_back_msg(bot, call)
+    settings_store.set_pagination_status(call.from_user.id, data.action)
+    bot_back_msg(bot, call)
 
 def send_all_news(
           bot: tb.TeleBot, 
           call: tb.types.CallbackQuery, 
-          news: list) -> None:
-    for date, title, link in news[::-1]:
-        bot.send_message(
+          news: list,
+          digest: bool=False) -> None:
+    if digest:
+        for text in msgs.get_digest_texts(news[::-1]):
+            outbox.send_message(
+                call.message.chat.id,
+                text,
+                parse_mode='html',
+                disable_web_page_preview=True)
+        return
+    for item in news[::-1]:
+        outbox.send_message(
             call.message.chat.id, 
-            f"Date: {date}\nTitle: {title}\nLink: {link}",
+            item.text,
             parse_mode='html'
             )
 
-def handle_pln_callback_query(call: tb.types.CallbackQuery) -> None:
+def handle_pln_callback_query(
+        call: tb.types.CallbackQuery,
+        data: CallbackData) -> None:
     """Handles PLN callback query.
 
     Args:
         call (tb.types.CallbackQuery): Callback query instance.
+        data (CallbackData): Parsed callback data.
     Returns: None
     """
     try:
-        pagination_status = db.select_pagination_status(
-            cursor, 
-            call.from_user.id)[0][0]
+        pagination_status = settings_store.get_pagination_status(
+            call.from_user.id)
 
+        news = svc.get_pln_news(data.category)[data.category]
         if pagination_status == 'pagination_on':
-            news = get_formatted_news(svc.get_pln_news(call.data)[call.data])
-            send_news_page(bot, call.message, news, _type=call.data)
+            send_news_page(bot, call.message, 'pln', data.category)
         else: 
-            send_all_news(bot, call, svc.get_pln_news(call.data)[call.data])
+            send_all_news(
+                bot, call, news, digest=pagination_status == 'digest')
             bot_pln_msg(bot, call)
     except Exception as e:
-        bot.send_message(
+        outbox.send_message(
             call.message.chat.id, 
             f"Error: {e}"
             )
 
-def handle_cdi_callback_query(call: tb.types.CallbackQuery) -> None:
+def handle_cdi_callback_query(
+        call: tb.types.CallbackQuery,
+        data: CallbackData) -> None:
     """Handles CDI callback query.
 
     Args:
         call (tb.types.CallbackQuery): Callback query instance.
+        data (CallbackData): Parsed callback data.
     Returns: None
     """
     try:
-        pagination_status = db.select_pagination_status(
-            cursor, 
-            call.from_user.id)[0][0]
+        pagination_status = settings_store.get_pagination_status(
+            call.from_user.id)
 
-        if  pagination_status == 'pagination_on':
-            news = get_formatted_news(svc.get_cdi_news(call.data)[call.data])
-            send_news_page(bot, call.message, news, _type=call.data)
+        news = svc.get_cdi_news(data.category)[data.category]
+        if pagination_status == 'pagination_on':
+            send_news_page(bot, call.message, 'cdi', data.category)
         else: 
-            send_all_news(bot, call, svc.get_cdi_news(call.data)[call.data])
+            send_all_news(
+                bot, call, news, digest=pagination_status == 'digest')
             bot_pln_msg(bot, call)
     except Exception as e:
-        bot.send_message(
+        outbox.send_message(
             call.message.chat.id, 
             f"Error: {e}"
             )
 
-def handle_ipsk_callback_query(call: tb.types.CallbackQuery) -> None:
+def handle_ipsk_callback_query(
+        call: tb.types.CallbackQuery,
+        data: CallbackData) -> None:
     """Handles IPSK callback query.
 
     Args:
         call (tb.types.CallbackQuery): Callback query instance.
+        data (CallbackData): Parsed callback data.
     Returns: None
     """
     try:
-        pagination_status = db.select_pagination_status(
-            cursor, 
-            call.from_user.id)[0][0]
+        pagination_status = settings_store.get_pagination_status(
+            call.from_user.id)
 
+        news = svc.get_ipsk_news(data.category)[data.category]
         if pagination_status == 'pagination_on':
-            news = get_formatted_news(svc.get_ipsk_news(call.data)[call.data])
-            send_news_page(bot, call.message, news, _type=call.data)
+            send_news_page(bot, call.message, 'ipsk', data.category)
         else: 
-            send_all_news(bot, call, svc.get_ipsk_news(call.data)[call.data])
+            send_all_news(
+                bot, call, news, digest=pagination_status == 'digest')
             bot_pln_msg(bot, call)
     except Exception as e:
-        bot.send_message(
+        outbox.send_message(
             call.message.chat.id, 
             f"Error: {e}"
             )
 
-def handle_pln_pagination(call: tb.types.CallbackQuery) -> None:
+def handle_pln_pagination(
+        call: tb.types.CallbackQuery,
+        data: CallbackData) -> None:
     """Handles PLN pagination callback query.
 
     Args:
         call (tb.types.CallbackQuery): Callback query instance.
+        data (CallbackData): Parsed callback data.
     Returns: None
     """
     try:
-        category = call.data.split('#')[2]
-        page = int(call.data.split('#')[1])
-        news = get_formatted_news(svc.get_pln_news(category)[category])
-        send_news_page(bot, call.message, news, page, _type=category)
+        send_news_page(
+            bot,
+            call.message,
+            'pln',
+            data.category,
+            data.page,
+            data.page_size or 1,
+            edit=True)
     except Exception as e:
-        bot.send_message(
+        outbox.send_message(
             call.message.chat.id, 
             f"Error: {e}"
             )
 
-def handle_cdi_pagination(call: tb.types.CallbackQuery) -> None:
+def handle_cdi_pagination(
+        call: tb.types.CallbackQuery,
+        data: CallbackData) -> None:
     """Handles CDI pagination callback query.
 
     Args:
         call (tb.types.CallbackQuery): Callback query instance.
+        data (CallbackData): Parsed callback data.
     Returns: None
     """
     try:
-        category = call.data.split('#')[2]
-        page = int(call.data.split('#')[1])
-        news = get_formatted_news(svc.get_cdi_news(category)[category])
-        send_news_page(bot, call.message, news, page, _type=category)
+        send_news_page(
+            bot,
+            call.message,
+            'cdi',
+            data.category,
+            data.page,
+            data.page_size or 1,
+            edit=True)
     except Exception as e:
-        bot.send_message(
+        outbox.send_message(
             call.message.chat.id, 
             f"Error: {e}"
             )
 
-def handle_ipsk_pagination(call: tb.types.CallbackQuery) -> None:
+def handle_ipsk_pagination(
+        call: tb.types.CallbackQuery,
+        data: CallbackData) -> None:
     """Handles IPSK pagination callback query.
 
     Args:
         call (tb.types.CallbackQuery): Callback query instance.
+        data (CallbackData): Parsed callback data.
     Returns: None
     """
     try:
-        category = call.data.split('#')[2]
-        page = int(call.data.split('#')[1])
-        news = get_formatted_news(svc.get_ipsk_news(category)[category])
-        send_news_page(bot, call.message, news, page, _type=category)
+        send_news_page(
+            bot,
+            call.message,
+            'ipsk',
+            data.category,
+            data.page,
+            data.page_size or 1,
+            edit=True)
     except Exception as e:
-        bot.send_message(
+        outbox.send_message(
             call.message.chat.id, 
             f"Error: {e}"
             )
 
-def handle_pagination(
-        call: tb.types.CallbackQuery, 
-        news_categories: dict) -> None:
-    """Handles pagination.
+# Routes are compiled once; each callback runs exactly one handler. Only
+# menu, category and settings buttons replace the chat's old messages,
+# page turns edit the clicked message in place.
+router = CallbackRouter(svc.CATEGORY_SOURCES)
+router.add_exact(MENU_MESSAGES, handle_main_callback_query)
+router.add_exact(
+    ['pagination_on', 'pagination_off', 'digest'], handle_settings)
+router.add_exact(svc.NEWS_CATEGORIES['pln'], handle_pln_callback_query)
+router.add_exact(svc.NEWS_CATEGORIES['cdi'], handle_cdi_callback_query)
+router.add_exact(svc.NEWS_CATEGORIES['ipsk'], handle_ipsk_callback_query)
+# 'number#{page}#{category}' buttons of messages sent before pages had
+# several items carry no page size, their pages have one item
+router.add_prefix(
+    'number', ('page', 'category'), handle_pln_pagination, source='pln')
+router.add_prefix(
+    'number', ('page', 'category'), handle_cdi_pagination, source='cdi')
+router.add_prefix(
+    'number', ('page', 'category'), handle_ipsk_pagination, source='ipsk')
+router.add_prefix(
+    'p', ('page', 'page_size', 'category'), handle_pln_pagination, source='pln')
+router.add_prefix(
+    'p', ('page', 'page_size', 'category'), handle_cdi_pagination, source='cdi')
+router.add_prefix(
+    'p', ('page', 'page_size', 'category'), handle_ipsk_pagination, source='ipsk')
+router.add_prefix(
+    'search', ('page', 'query_id'), handle_search_pagination)
+
+def in_chat_order(handler: Callable) -> Callable:
+    """Makes a message handler run on the update executor.
 
     Args:
-        call (tb.types.CallbackQuery): Callback query instance.
-        news_categories (dict): News categories.
-    Returns: None
+        handler (Callable): Message handler.
+    Returns:
+        Callable: Handler that queues the message after the chat's
+            previous updates and returns at once.
     """
-    number_str = call.data.split('#')[0]
-    if number_str=='number':
-        call_data = call.data.split('#')[2]
-        if call_data in news_categories['pln']:
-            handle_pln_pagination(call)
-        elif call_data in news_categories['cdi']:
-            handle_cdi_pagination(call)
-        elif call_data in news_categories['ipsk']:
-            handle_ipsk_pagination(call)
-
-def handle_news_categories(
-        call: tb.types.CallbackQuery, 
-        news_categories: dict) -> None:
-    """Handles news categories.
+    handler = metrics.timed(handler)
 
-    Args:
-        call (tb.types.CallbackQuery): Callback query instance.
-        news_categories (dict): News categories.
-    Returns: None
-    """
-    if call.data in news_categories['pln']:
-        handle_pln_callback_query(call)
-    elif call.data in news_categories['cdi']:
-        handle_cdi_callback_query(call)
-    elif call.data in news_categories['ipsk']:
-        handle_ipsk_callback_query(call)
+    @functools.wraps(handler)
+    def submit(msg: tb.types.Message) -> None:
+        updates.submit(msg.chat.id, handler, msg)
+    return submit
 
 @bot.message_handler(commands=["start"])
+@in_chat_order
 def handle_start(msg: tb.types.Message) -> None:
     """Handles start command.
 
@@ -405,38 +557,210 @@ def handle_start(msg: tb.types.Message) -> None:
         msg (tb.types.Message): Message instance.
     Returns: None
     """
-    bot.send_message(
+    outbox.send_message(
         chat_id=msg.chat.id,
-        text=f"""
-Hi, {msg.from_user.first_name}
-Here you can get the latest regional news
-        """,
+        text=msgs.get_start_text(msg.from_user.first_name),
         parse_mode='MarkdownV2',
-        reply_markup=kb.get_main_inline_markup()
+        reply_markup=kb.MAIN_MARKUP
     )
-    db.insert_data(
-        conn, 
-        cursor, 
-        'settings', 
-        (msg.from_user.id, 'pagination_off'))
+    settings_store.set_pagination_status(msg.from_user.id, 'pagination_off')
+
+@bot.message_handler(commands=["search"])
+@in_chat_order
+def handle_search(msg: tb.types.Message) -> None:
+    """Handles search command.
+
+    Args:
+        msg (tb.types.Message): Message instance.
+    Returns: None
+    """
+    query = tb.util.extract_arguments(msg.text).strip()
+    if not query:
+        outbox.send_message(msg.chat.id, msgs.SEARCH_USAGE_TEXT)
+        return
+    query_id = searches.set(msg.chat.id, query)
+    send_search_page(msg, query, query_id)
+
+@bot.inline_handler(func=lambda query: True)
+@metrics.timed
+def handle_inline_query(query: tb.types.InlineQuery) -> None:
+    """Answers an inline query with news from local data.
+
+    Inline queries have no chat, so they are answered right away instead
+    of waiting on the update executor; Telegram drops late answers.
+
+    Args:
+        query (tb.types.InlineQuery): Inline query instance.
+    Returns: None
+    """
+    results, next_offset = inline.get_inline_results(query.query, query.offset)
+    try:
+        bot.answer_inline_query(
+            query.id,
+            results,
+            cache_time=INLINE_CACHE_TIME,
+            next_offset=next_offset)
+    except tb.apihelper.ApiTelegramException as e:
+        print(f"Failed to answer inline query: {e}")
+
+def parse_category(msg: tb.types.Message):
+    """Returns the category after a command, or None after sending usage."""
+    category = tb.util.extract_arguments(msg.text).strip().lower()
+    if category not in svc.CATEGORY_SOURCES:
+        outbox.send_message(
+            msg.chat.id,
+            msgs.SUBSCRIBE_USAGE_TEXT.format(
+                categories=', '.join(svc.CATEGORY_SOURCES)))
+        return None
+    return category
+
+@bot.message_handler(commands=["subscribe"])
+@in_chat_order
+def handle_subscribe(msg: tb.types.Message) -> None:
+    """Handles subscribe command.
+
+    Args:
+        msg (tb.types.Message): Message instance.
+    Returns: None
+    """
+    category = parse_category(msg)
+    if category is not None:
+        added = subscriptions.subscribe(msg.chat.id, category)
+        outbox.send_message(
+            msg.chat.id, msgs.get_subscribed_text(category, added))
+
+@bot.message_handler(commands=["unsubscribe"])
+@in_chat_order
+def handle_unsubscribe(msg: tb.types.Message) -> None:
+    """Handles unsubscribe command.
+
+    Args:
+        msg (tb.types.Message): Message instance.
+    Returns: None
+    """
+    category = parse_category(msg)
+    if category is not None:
+        removed = subscriptions.unsubscribe(msg.chat.id, category)
+        outbox.send_message(
+            msg.chat.id, msgs.get_unsubscribed_text(category, removed))
+
+@bot.message_handler(commands=["subscriptions"])
+@in_chat_order
+def handle_subscriptions(msg: tb.types.Message) -> None:
+    """Handles subscriptions command.
+
+    Args:
+        msg (tb.types.Message): Message instance.
+    Returns: None
+    """
+    categories = subscriptions.categories(msg.chat.id)
+    outbox.send_message(
+        msg.chat.id,
+        msgs.get_subscriptions_text(categories) if categories
+        else msgs.NO_SUBSCRIPTIONS_TEXT)
+
+def notify_subscribers(source: str, category: str, news: list) -> None:
+    """Sends new items of a feed to its subscribers.
+
+    Runs once per feed update, in the thread that downloaded the feed.
+
+    Args:
+        source (str): News source.
+        category (str): News category.
+        news (list): New items, newest first.
+    Returns: None
+    """
+    fan_out(
+        subscriptions,
+        outbox,
+        category,
+        msgs.get_update_texts(category, news))
+
+svc.feed_listeners.append(notify_subscribers)
 
 @bot.callback_query_handler(func=lambda call: True)
 def handle_callback_query(call: tb.types.CallbackQuery) -> None:
         """Handles callback query.
 
+    The query is answered right away, so the button stops spinning, and
+    the rest runs on the update executor after the chat's earlier updates.
+
     Args:
         call (tb.types.CallbackQuery): Callback query instance.
     Returns: None
     """
-        news = {
-            'pln': ['today', 'accidents', 'automir', 'culture', 'society'],
-            'cdi': ['news', 'rbusiness', 'rmarket', 'rrabota'],
-            'ipsk': ['allnews']
-        }
-        delete_past_messages(bot, call, 100)
-        handle_settings(bot, call)
-        handle_pagination(call, news)
-        handle_news_categories(call, news)
-        handle_main_callback_query(bot, call)
-
-bot.polling(none_stop=True)
+        try:
+            bot.answer_callback_query(call.id)
+        except tb.apihelper.ApiTelegramException:
+            # The query is too old to answer, handle it anyway
+            pass
+        updates.submit(call.message.chat.id, process_callback_query, call)
+
+def process_callback_query(call: tb.types.CallbackQuery) -> None:
+        """Runs the handler of the callback query's route.
+
+    Args:
+        call (tb.types.CallbackQuery): Callback query instance.
+    Returns: None
+    """
+        resolved = router.resolve(call.data or '')
+        if resolved is None:
+            return
+        route, data = resolved
+        with metrics.HANDLER_SECONDS.labels(route.handler.__name__).time():
+            if route.delete_history:
+                delete_sent_messages(call)
+            route.handler(call, data)
+
+# Stop on SIGTERM the same way as on Ctrl+C, so queued work is saved
+signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+if METRICS_PORT:
+    metrics.MetricsServer(METRICS_HOST, METRICS_PORT).start()
+if SNAPSHOT_PATH:
+    # Serve the caches of the previous run while the prefetcher refreshes
+    snapshot.load()
+    snapshot.start()
+prefetcher.start()
+# The outbox also runs in async mode, subscribers are notified through it
+outbox.start()
+settings_store.start()
+try:
+    if BOT_MODE == 'async':
+        import async_main
+        async_main.run(outbox, settings_store, subscriptions)
+    else:
+        updates.start()
+        try:
+            if BOT_MODE == 'webhook':
+                try:
+                    server = WebhookServer(
+                        bot,
+                        host=WEBHOOK_HOST,
+                        port=WEBHOOK_PORT,
+                        path=WEBHOOK_PATH,
+                        secret_token=WEBHOOK_SECRET,
+                        workers=WEBHOOK_WORKERS,
+                        queue_size=WEBHOOK_QUEUE_SIZE)
+                except ValueError as e:
+                    print(f"Failed to start the webhook server: {e}")
+                    sys.exit(1)
+                if WEBHOOK_URL:
+                    bot.set_webhook(
+                        url=WEBHOOK_URL,
+                        secret_token=WEBHOOK_SECRET or None)
+                try:
+                    server.serve_forever()
+                finally:
+                    server.stop()
+            else:
+                bot.polling(none_stop=True)
+        finally:
+            updates.stop()
+finally:
+    # No fetch may be saving a feed or notifying subscribers below
+    prefetcher.stop()
+    settings_store.stop()
+    outbox.stop()
+    if SNAPSHOT_PATH:
+        snapshot.stop()
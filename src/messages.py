@@ -0,0 +1,236 @@
+import html
+import json
+from typing import List
+from feed import NewsItem
+from telebot.types import Message
+
+
+PLN_MENU_TEXT = """
+Press *'Today'* to get today's news
+Press *'Accidents'* to get news about accidents
+Press *'Automir'* to get news about automir
+Press *'Culture'* to get news about culture
+Press *'Society'* to get news about society
+Press *'Back'* to get back to main menu
+            """
+
+CDI_MENU_TEXT = """
+Press *'News'* to get latest news
+Press *'Market'* to get regional market news
+Press *'Business'* to get regional business news
+Press *'Rabota'* to get info about vacancies
+Press *'Back'* to get back to main menu
+            """
+
+IPSK_MENU_TEXT = """
+Press *'News'* to get latest news
+Press *'Back'* to get back to main menu
+            """
+
+SETTINGS_MENU_TEXT = """
+Press *'Show all list'* to get all news list
+Press *'Use Pagination'* to use pagination
+Press *'Digest'* to get the news list in a few long messages
+Press *'Back'* to get back to main menu
+            """
+
+MAIN_MENU_TEXT = "Please choose an option:"
+
+NO_NEWS_TEXT = "There is no news in this category yet"
+
+SEARCH_USAGE_TEXT = "Send /search followed by the words to look for"
+
+SEARCH_EXPIRED_TEXT = "This search has expired, please send /search again"
+
+NO_RESULTS_TEXT = "Nothing found"
+
+SUBSCRIBE_USAGE_TEXT = (
+    "Send /subscribe or /unsubscribe followed by a category: {categories}")
+
+NO_SUBSCRIPTIONS_TEXT = "You have no subscriptions, see /subscribe"
+
+# Longest text of a single Telegram message
+MAX_MESSAGE_LENGTH = 4096
+
+def get_start_text(first_name: str) -> str:
+    """Returns greeting sent on /start.
+
+    Args:
+        first_name (str): User's first name.
+    Returns:
+        str: Greeting text.
+    """
+    return f"""
+Hi, {first_name}
+Here you can get the latest regional news
+        """
+
+def get_formatted_news(news: List[NewsItem]) -> List[str]:
+    """Formats news list to be sent to user.
+
+    Args:
+        news (List[NewsItem]): List of news.
+    Returns:
+        List[str]: Formatted news list.
+    """
+    return [item.text for item in news]
+
+def get_page_text(
+        news: List[NewsItem],
+        separator: str = '\n\n',
+        limit: int = MAX_MESSAGE_LENGTH) -> str:
+    """Formats a page of news as one message of at most limit characters.
+
+    When the items do not fit, the titles of the longest ones are cut, so
+    every item keeps its date and link.
+
+    Args:
+        news (List[NewsItem]): News of the page.
+        separator (str, optional): Put between items.
+        limit (int, optional): Longest message.
+    Returns:
+        str: Message text.
+    """
+    texts = get_formatted_news(news)
+    if len(separator.join(texts)) > limit:
+        room = (limit - len(separator) * (len(news) - 1)) // len(news)
+        texts = [_cut_title(item, room) for item in news]
+    # Only links longer than a whole share are cut here
+    return separator.join(texts)[:limit]
+
+def _cut_title(item: NewsItem, length: int) -> str:
+    """Returns item.text, its title cut so it is at most length long."""
+    excess = len(item.text) - length
+    if excess <= 0:
+        return item.text
+    title = item.title[:max(len(item.title) - excess - 1, 0)] + '…'
+    return item._replace(title=title).text
+
+def get_subscribed_text(category: str, added: bool) -> str:
+    if added:
+        return f"You will get new '{category}' news as they appear"
+    return f"You are already subscribed to '{category}'"
+
+def get_unsubscribed_text(category: str, removed: bool) -> str:
+    if removed:
+        return f"You will no longer get new '{category}' news"
+    return f"You are not subscribed to '{category}'"
+
+def get_subscriptions_text(categories: List[str]) -> str:
+    return "Your subscriptions: " + ", ".join(categories)
+
+def pack_texts(
+        parts: List[str],
+        header: str = '',
+        separator: str = '\n\n',
+        limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """Joins parts into as few messages as possible.
+
+    Every message starts with header and is at most limit characters
+    long. A part that does not fit into an empty message is cut, so parts
+    with markup must be made short enough by the caller.
+
+    Args:
+        parts (List[str]): Texts to join, in order.
+        header (str, optional): First line of every message.
+        separator (str, optional): Put between parts and after header.
+        limit (int, optional): Longest message.
+    Returns:
+        List[str]: Messages.
+    """
+    first = header + separator if header else ''
+    texts = []
+    text = ''
+    for part in parts:
+        part = part[:limit - len(first)]
+        if text and len(text) + len(separator) + len(part) <= limit:
+            text += separator + part
+            continue
+        if text:
+            texts.append(text)
+        text = first + part
+    if text:
+        texts.append(text)
+    return texts
+
+def get_update_texts(category: str, news: List[NewsItem]) -> List[str]:
+    """Formats new items of a category for subscribers.
+
+    Args:
+        category (str): News category.
+        news (List[NewsItem]): New items, newest first.
+    Returns:
+        List[str]: Messages to send, oldest items first.
+    """
+    return pack_texts(
+        get_formatted_news(news[::-1]),
+        header=f"New in '{category}':")
+
+def get_digest_texts(news: List[NewsItem]) -> List[str]:
+    """Formats news list as few HTML messages as possible.
+
+    Args:
+        news (List[NewsItem]): List of news, in the order to send them.
+    Returns:
+        List[str]: Messages for parse_mode='html'.
+    """
+    return pack_texts([
+        get_digest_item(date or '', title, link) for date, title, link in news
+    ])
+
+def get_digest_item(
+        date: str,
+        title: str,
+        link: str,
+        limit: int = MAX_MESSAGE_LENGTH) -> str:
+    """Formats a news item as HTML of at most limit characters.
+
+    A title too long is cut before it is escaped, so no tag or entity is
+    left open. A link too long to fit is left out.
+
+    Args:
+        date (str): News date.
+        title (str): News title.
+        link (str): News link.
+        limit (int, optional): Longest text.
+    Returns:
+        str: Text for parse_mode='html'.
+    """
+    link = html.escape(link)
+    tail = f"</b>\n{html.escape(date)}\n<a href=\"{link}\">{link}</a>"
+    if len('<b>' + tail) >= limit:
+        tail = f"</b>\n{html.escape(date)}"
+    return f"<b>{_escape_cut(title, limit - len('<b>' + tail))}{tail}"
+
+def _escape_cut(text: str, room: int) -> str:
+    """Escapes text, cut with an ellipsis to at most room characters."""
+    escaped = html.escape(text)
+    if len(escaped) <= room:
+        return escaped
+    chars = []
+    used = 0
+    for char in text:
+        char = html.escape(char)
+        if used + len(char) > room - 1:
+            break
+        chars.append(char)
+        used += len(char)
+    return ''.join(chars) + '…' if room > 0 else ''
+
+def is_message_unchanged(
+        msg: Message,
+        text: str,
+        markup: str) -> bool:
+    """Checks whether message already shows text and markup.
+
+    Args:
+        msg (Message): Message instance.
+        text (str): New message text.
+        markup (str): New reply markup as JSON.
+    Returns:
+        bool: True if editing the message would change nothing.
+    """
+    if msg.text != text:
+        return False
+    current = msg.reply_markup.to_dict() if msg.reply_markup else None
+    return current == (json.loads(markup) if markup else None)
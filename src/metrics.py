@@ -0,0 +1,349 @@
+import bisect
+import functools
+import inspect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Sequence, Tuple
+
+from telebot import apihelper, asyncio_helper
+
+
+# Upper bounds in seconds, from a fast cache hit to a slow upstream
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Metric:
+    """Metric with a fixed set of label names and one child per value set.
+
+    Children are created once per label values and cached, so recording a
+    value is a dict lookup plus an update under the child's lock.
+    """
+
+    kind = ''
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def labels(self, *values):
+        """Returns the child of label values, in labelnames order."""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _label_text(self, values: Tuple[str, ...], extra: str = '') -> str:
+        pairs = [
+            f'{name}="{_escape(str(value))}"'
+            for name, value in zip(self.labelnames, values)
+        ]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def render(self) -> List[str]:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self) -> None:
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, e.g. of API calls."""
+
+    kind = 'counter'
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def _render_child(self, values, child: _CounterChild) -> List[str]:
+        return [f'{self.name}_total{self._label_text(values)} {child.value}']
+
+
+class _GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Gauge(_Metric):
+    """Value that is set rather than counted, e.g. a timestamp."""
+
+    kind = 'gauge'
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def _render_child(self, values, child: _GaugeChild) -> List[str]:
+        return [f'{self.name}{self._label_text(values)} {child.value}']
+
+
+class _Timer:
+    __slots__ = ('child', 'started')
+
+    def __init__(self, child) -> None:
+        self.child = child
+
+    def __enter__(self) -> '_Timer':
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.child.observe(time.perf_counter() - self.started)
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        # The last count is for values above every bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def time(self) -> _Timer:
+        """Returns a context manager observing the time spent in it."""
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    """Distribution of durations in seconds over fixed buckets."""
+
+    kind = 'histogram'
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def _render_child(self, values, child: _HistogramChild) -> List[str]:
+        with child._lock:
+            counts = list(child.counts)
+            total = child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            labels = self._label_text(values, f'le="{le}"')
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = self._label_text(values)
+        lines.append(f'{self.name}_sum{labels} {total}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+# Every metric created, in creation order
+REGISTRY: List[_Metric] = []
+
+
+def render() -> str:
+    """Returns all metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+HANDLER_SECONDS = Histogram(
+    'bot_handler_seconds',
+    'Time spent handling an update, per handler',
+    ['handler'])
+UPSTREAM_SECONDS = Histogram(
+    'bot_upstream_seconds',
+    'Time spent fetching a news feed',
+    ['source', 'category'])
+UPSTREAM_RESPONSES = Counter(
+    'bot_upstream_responses',
+    'News feed fetches by HTTP status, or error',
+    ['source', 'category', 'status'])
+UPSTREAM_FETCHES = Counter(
+    'bot_upstream_fetches',
+    'Feed fetch calls: leader made the request, coalesced waited for '
+    'an identical one in flight',
+    ['source', 'category', 'result'])
+TELEGRAM_SECONDS = Histogram(
+    'bot_telegram_seconds',
+    'Time spent in Telegram API calls',
+    ['method'])
+TELEGRAM_CALLS = Counter(
+    'bot_telegram_calls',
+    'Telegram API calls by result: ok, 429 or error',
+    ['method', 'result'])
+DB_SECONDS = Histogram(
+    'bot_db_seconds',
+    'Time spent in database queries',
+    ['query'])
+PREFETCH_LAST_REFRESH = Gauge(
+    'bot_prefetch_last_refresh_timestamp_seconds',
+    'Unix time the prefetcher last refreshed a feed',
+    ['source', 'category'])
+
+
+def instrument_telebot() -> None:
+    """Counts and times the Telegram API calls of every TeleBot.
+
+    Installs apihelper.CUSTOM_REQUEST_SENDER, which makes the same request
+    telebot would make itself.
+    """
+    def send(method: str, url: str, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        with TELEGRAM_SECONDS.labels(api_method).time():
+            try:
+                response = apihelper._get_req_session().request(
+                    method, url, **kwargs)
+            except Exception:
+                TELEGRAM_CALLS.labels(api_method, 'error').inc()
+                raise
+        TELEGRAM_CALLS.labels(api_method, _result(response.status_code)).inc()
+        return response
+
+    apihelper.CUSTOM_REQUEST_SENDER = send
+
+
+def instrument_async_telebot() -> None:
+    """Counts and times the Telegram API calls of every AsyncTeleBot.
+
+    asyncio_helper has no request hook, so the function all of its API
+    methods call is wrapped.
+    """
+    process_request = asyncio_helper._process_request
+
+    async def timed_process_request(token, url, *args, **kwargs):
+        with TELEGRAM_SECONDS.labels(url).time():
+            try:
+                result = await process_request(token, url, *args, **kwargs)
+            except asyncio_helper.ApiTelegramException as e:
+                TELEGRAM_CALLS.labels(url, _result(e.error_code)).inc()
+                raise
+            except Exception:
+                TELEGRAM_CALLS.labels(url, 'error').inc()
+                raise
+        TELEGRAM_CALLS.labels(url, 'ok').inc()
+        return result
+
+    asyncio_helper._process_request = timed_process_request
+
+
+def timed(handler: Callable) -> Callable:
+    """Records the run time of a handler in HANDLER_SECONDS.
+
+    Args:
+        handler (Callable): Function or coroutine function.
+    Returns:
+        Callable: Wrapped handler.
+    """
+    child = HANDLER_SECONDS.labels(handler.__name__)
+    if inspect.iscoroutinefunction(handler):
+        @functools.wraps(handler)
+        async def async_wrapper(*args, **kwargs):
+            with child.time():
+                return await handler(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        with child.time():
+            return handler(*args, **kwargs)
+    return wrapper
+
+
+def _result(status: int) -> str:
+    if status == 200:
+        return 'ok'
+    return '429' if status == 429 else 'error'
+
+
+class MetricsServer:
+    """Serves render() on GET /metrics from a background thread."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 9100) -> None:
+        self._server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split('?')[0] != '/metrics':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
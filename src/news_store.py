@@ -0,0 +1,253 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import database as db
+import metrics
+from feed import NewsItem, to_items
+
+
+# Schema of the news database, see database.migrate
+MIGRATIONS = [
+    # 1: news items deduplicated by link and the current item list of
+    # each source/category
+    [
+        """CREATE TABLE IF NOT EXISTS news (
+            id INTEGER PRIMARY KEY,
+            link TEXT NOT NULL UNIQUE,
+            date TEXT,
+            title TEXT,
+            ingested_at REAL NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS feeds (
+            source TEXT NOT NULL,
+            category TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            ingested_at REAL NOT NULL,
+            PRIMARY KEY (source, category)
+        )""",
+        """CREATE TABLE IF NOT EXISTS feed_items (
+            source TEXT NOT NULL,
+            category TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            news_id INTEGER NOT NULL REFERENCES news (id),
+            PRIMARY KEY (source, category, position)
+        ) WITHOUT ROWID""",
+    ],
+    # 2: full-text index of titles, kept up to date by triggers
+    [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5 (
+            title,
+            content = 'news',
+            content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS news_fts_insert AFTER INSERT ON news BEGIN
+            INSERT INTO news_fts (rowid, title) VALUES (new.id, new.title);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS news_fts_delete AFTER DELETE ON news BEGIN
+            INSERT INTO news_fts (news_fts, rowid, title)
+            VALUES ('delete', old.id, old.title);
+        END""",
+        "INSERT INTO news_fts (news_fts) VALUES ('rebuild')",
+    ],
+]
+
+
+class NewsStore:
+    """Local SQLite copy of the news feeds.
+
+    Items are stored once per link. For each source/category the store
+    keeps the item list of the last ingested feed, newest first, numbered
+    by position starting at 1, so page N is a primary key lookup. The
+    feed version is increased every time the item list changes.
+    """
+
+    def __init__(self, database: str) -> None:
+        """Opens the store, creating and migrating the database if needed.
+
+        Args:
+            database (str): Path to the database file.
+        """
+        directory = os.path.dirname(database)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = db.create_connection(database)
+        db.migrate(self.conn, MIGRATIONS)
+        self._lock = threading.Lock()
+        # (version, size) of each feed, so hot paths don't query for it
+        self._feeds = {}
+
+    def ingest(
+            self,
+            source: str,
+            category: str,
+            items: List[NewsItem]) -> List[NewsItem]:
+        """Saves the current item list of a feed.
+
+        Args:
+            source (str): News source, e.g. 'pln'.
+            category (str): News category, e.g. 'today'.
+            items (List[NewsItem]): (date, title, link) items, newest first.
+        Returns:
+            List[NewsItem]: Items that were not in the feed before.
+        """
+        now = time.time()
+        with self._lock, metrics.DB_SECONDS.labels('ingest').time():
+            cursor = self.conn.cursor()
+            try:
+                cursor.executemany(
+                    "INSERT INTO news (link, date, title, ingested_at) "
+                    "VALUES (?, ?, ?, ?) ON CONFLICT (link) DO NOTHING",
+                    [(link, date, title, now) for date, title, link in items])
+                ids = [
+                    cursor.execute(
+                        "SELECT id FROM news WHERE link = ?",
+                        (link,)).fetchone()[0]
+                    for _, _, link in items
+                ]
+                current = [
+                    row[0] for row in cursor.execute(
+                        "SELECT news_id FROM feed_items "
+                        "WHERE source = ? AND category = ? ORDER BY position",
+                        (source, category))
+                ]
+                if ids == current:
+                    self.conn.commit()
+                    return []
+                cursor.execute(
+                    "DELETE FROM feed_items WHERE source = ? AND category = ?",
+                    (source, category))
+                cursor.executemany(
+                    "INSERT INTO feed_items (source, category, position, news_id) "
+                    "VALUES (?, ?, ?, ?)",
+                    [
+                        (source, category, position, news_id)
+                        for position, news_id in enumerate(ids, 1)
+                    ])
+                cursor.execute(
+                    "INSERT INTO feeds (source, category, version, size, ingested_at) "
+                    "VALUES (?, ?, 1, ?, ?) ON CONFLICT (source, category) DO UPDATE "
+                    "SET version = version + 1, size = excluded.size, "
+                    "ingested_at = excluded.ingested_at",
+                    (source, category, len(ids), now))
+                self._feeds[(source, category)] = cursor.execute(
+                    "SELECT version, size FROM feeds WHERE source = ? AND category = ?",
+                    (source, category)).fetchone()
+                self.conn.commit()
+            except sqlite3.Error:
+                self.conn.rollback()
+                self._feeds.pop((source, category), None)
+                raise
+        known = set(current)
+        return [
+            item for item, news_id in zip(items, ids)
+            if news_id not in known
+        ]
+
+    def feed_info(self, source: str, category: str) -> Optional[Tuple[int, int]]:
+        """Returns version and size of a feed.
+
+        Args:
+            source (str): News source.
+            category (str): News category.
+        Returns:
+            Optional[Tuple[int, int]]: (version, size), None if never ingested.
+        """
+        with self._lock:
+            key = (source, category)
+            if key not in self._feeds:
+                with metrics.DB_SECONDS.labels('feed_info').time():
+                    self._feeds[key] = self.conn.execute(
+                        "SELECT version, size FROM feeds "
+                        "WHERE source = ? AND category = ?",
+                        key).fetchone()
+            return self._feeds[key]
+
+    def get_page(
+            self,
+            source: str,
+            category: str,
+            page: int,
+            page_size: int = 1) -> List[NewsItem]:
+        """Returns items of a feed page, newest first.
+
+        Args:
+            source (str): News source.
+            category (str): News category.
+            page (int): Page number starting at 1.
+            page_size (int, optional): Items per page. Defaults to 1.
+        Returns:
+            List[NewsItem]: (date, title, link) items of the page.
+        """
+        first = (page - 1) * page_size + 1
+        with self._lock, metrics.DB_SECONDS.labels('get_page').time():
+            return to_items(self.conn.execute(
+                "SELECT n.date, n.title, n.link FROM feed_items f "
+                "JOIN news n ON n.id = f.news_id "
+                "WHERE f.source = ? AND f.category = ? "
+                "AND f.position BETWEEN ? AND ? ORDER BY f.position",
+                (source, category, first, first + page_size - 1)))
+
+    def search(
+            self,
+            query: str,
+            limit: int = 10,
+            offset: int = 0) -> Tuple[List[NewsItem], int]:
+        """Finds news whose titles contain all words of query, best first.
+
+        Args:
+            query (str): Words to search for.
+            limit (int, optional): Most items to return. Defaults to 10.
+            offset (int, optional): Items to skip. Defaults to 0.
+        Returns:
+            Tuple[List[NewsItem], int]: Found items and their total number.
+        """
+        match = to_fts_query(query)
+        if not match:
+            return [], 0
+        with self._lock, metrics.DB_SECONDS.labels('search').time():
+            total = self.conn.execute(
+                "SELECT COUNT(*) FROM news_fts WHERE news_fts MATCH ?",
+                (match,)).fetchone()[0]
+            items = to_items(self.conn.execute(
+                "SELECT n.date, n.title, n.link FROM news_fts "
+                "JOIN news n ON n.id = news_fts.rowid "
+                "WHERE news_fts MATCH ? ORDER BY rank LIMIT ? OFFSET ?",
+                (match, limit, offset)))
+        return items, total
+
+    def get_feed(self, source: str, category: str) -> List[NewsItem]:
+        """Returns all items of a feed, newest first.
+
+        Args:
+            source (str): News source.
+            category (str): News category.
+        Returns:
+            List[NewsItem]: (date, title, link) items.
+        """
+        with self._lock, metrics.DB_SECONDS.labels('get_feed').time():
+            return to_items(self.conn.execute(
+                "SELECT n.date, n.title, n.link FROM feed_items f "
+                "JOIN news n ON n.id = f.news_id "
+                "WHERE f.source = ? AND f.category = ? ORDER BY f.position",
+                (source, category)))
+
+
+def to_fts_query(query: str) -> str:
+    """Turns user input into an FTS5 query matching all of its words.
+
+    Every word is quoted, so FTS5 operators in the input are searched for
+    literally instead of being interpreted, and matched as a prefix, so
+    'город' also finds 'города' and 'городе'.
+
+    Args:
+        query (str): User input.
+    Returns:
+        str: FTS5 query, empty if the input has no words.
+    """
+    words = query.split()
+    return ' '.join('"' + word.replace('"', '""') + '"*' for word in words)
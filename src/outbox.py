@@ -0,0 +1,344 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, List
+
+import telebot as tb
+from history import MessageHistory
+
+
+# Most messages a single deleteMessages call accepts
+DELETE_BATCH_SIZE = 100
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Returns seconds until a token is available."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _Job:
+    __slots__ = ('method', 'args', 'kwargs', 'broadcast', 'future', 'attempts')
+
+    def __init__(self, method, args, kwargs, broadcast=False) -> None:
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.broadcast = broadcast
+        self.future = Future()
+        self.attempts = 0
+
+
+class OutboundQueue:
+    """Central rate-limited queue for outgoing Telegram API calls.
+
+    Calls are queued per chat and executed in submission order within a
+    chat, one at a time. Chats are served round-robin, so a long list for
+    one user does not hold back everyone else. Each call takes a token
+    from the chat's bucket and from the global bucket, and a 429 response
+    pauses the chat for `retry_after` seconds before the call is retried.
+
+    Broadcasts, e.g. news pushed to subscribers, wait in a separate lane
+    that is only served when no interactive call can go, and may use at
+    most `broadcast_rate` of the global rate, so replies to users are
+    never held up behind them.
+    """
+
+    def __init__(
+            self,
+            bot: tb.TeleBot,
+            global_rate: float = 30.0,
+            chat_rate: float = 1.0,
+            chat_burst: float = 3.0,
+            workers: int = 4,
+            max_retries: int = 3,
+            max_chats: int = 10000,
+            history: MessageHistory = None,
+            broadcast_rate: float = 20.0) -> None:
+        """Creates a queue.
+
+        Args:
+            bot (tb.TeleBot): Bot used to make the calls.
+            global_rate (float, optional): Calls per second over all chats.
+            chat_rate (float, optional): Calls per second per chat.
+            chat_burst (float, optional): Calls a chat may make at once.
+            workers (int, optional): Threads executing calls.
+            max_retries (int, optional): Retries of a call after 429.
+            max_chats (int, optional): Idle chat buckets kept in memory.
+            history (MessageHistory, optional): Records sent messages.
+            broadcast_rate (float, optional): Broadcast calls per second,
+                taken from the global rate.
+        """
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.workers = workers
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self.history = history
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._broadcast_bucket = TokenBucket(broadcast_rate, broadcast_rate)
+        self._chat_buckets = OrderedDict()
+        self._queues: Dict[Hashable, deque] = {}
+        self._ready = deque()
+        self._broadcast_queues: Dict[Hashable, deque] = {}
+        self._broadcast_ready = deque()
+        self._busy = set()
+        self._paused_until = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+        self._pool = None
+
+    def start(self) -> None:
+        """Starts dispatching queued calls in a background thread."""
+        self._stopped = False
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix='outbox')
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Waits up to timeout seconds for queued calls, then stops."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while ((self._queues or self._broadcast_queues or self._busy)
+                   and time.monotonic() < deadline):
+                self._cond.wait(deadline - time.monotonic())
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+    def submit(
+            self,
+            chat_id: Hashable,
+            method: Callable,
+            *args,
+            **kwargs) -> Future:
+        """Queues an API call for a chat.
+
+        Args:
+            chat_id (Hashable): Chat the call belongs to.
+            method (Callable): Bot method to call.
+            *args, **kwargs: Arguments passed to method.
+        Returns:
+            Future: Resolves to the result of the call.
+        """
+        return self._enqueue(chat_id, _Job(method, args, kwargs))
+
+    def broadcast(
+            self,
+            chat_id: Hashable,
+            method: Callable,
+            *args,
+            **kwargs) -> Future:
+        """Queues an API call for a chat in the broadcast lane.
+
+        Args:
+            chat_id (Hashable): Chat the call belongs to.
+            method (Callable): Bot method to call.
+            *args, **kwargs: Arguments passed to method.
+        Returns:
+            Future: Resolves to the result of the call.
+        """
+        return self._enqueue(
+            chat_id, _Job(method, args, kwargs, broadcast=True))
+
+    def send_message(self, chat_id: Hashable, *args, **kwargs) -> Future:
+        future = self.submit(
+            chat_id, self.bot.send_message, chat_id, *args, **kwargs)
+        if self.history is not None:
+            future.add_done_callback(self._track)
+        return future
+
+    def edit_message_text(
+            self,
+            text: str,
+            chat_id: Hashable,
+            *args,
+            **kwargs) -> Future:
+        return self.submit(
+            chat_id, self.bot.edit_message_text, text, chat_id,
+            *args, **kwargs)
+
+    def delete_message(self, chat_id: Hashable, *args, **kwargs) -> Future:
+        return self.submit(
+            chat_id, self.bot.delete_message, chat_id, *args, **kwargs)
+
+    def delete_messages(
+            self,
+            chat_id: Hashable,
+            message_ids: List[int]) -> List[Future]:
+        """Deletes messages with as few API calls as possible.
+
+        Args:
+            chat_id (Hashable): Chat the messages belong to.
+            message_ids (List[int]): IDs of the messages.
+        Returns:
+            List[Future]: One future per deleteMessages call.
+        """
+        return [
+            self.submit(
+                chat_id, self.bot.delete_messages, chat_id,
+                message_ids[i:i + DELETE_BATCH_SIZE])
+            for i in range(0, len(message_ids), DELETE_BATCH_SIZE)
+        ]
+
+    def _enqueue(self, chat_id: Hashable, job: _Job) -> Future:
+        with self._cond:
+            queues, ready = self._lane(job.broadcast)
+            queue = queues.get(chat_id)
+            if queue is None:
+                queue = queues[chat_id] = deque()
+                ready.append(chat_id)
+            queue.append(job)
+            self._cond.notify_all()
+        return job.future
+
+    def _lane(self, broadcast: bool):
+        """Returns the queues and ready chats of a lane."""
+        if broadcast:
+            return self._broadcast_queues, self._broadcast_ready
+        return self._queues, self._ready
+
+    def _track(self, future: Future) -> None:
+        if future.exception() is None:
+            message = future.result()
+            self.history.add(message.chat.id, message.message_id)
+
+    def _chat_bucket(self, chat_id: Hashable) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+            if len(self._chat_buckets) > self.max_chats:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    def _next_job(self, now: float):
+        """Picks the next chat allowed to make a call, broadcasts last.
+
+        Returns (chat_id, job, None) or (None, None, seconds to wait).
+        """
+        global_delay = self._global_bucket.delay(now)
+        chat_id, job, wait = self._pick(
+            self._queues, self._ready, now, global_delay)
+        if job is not None or not self._broadcast_ready:
+            return chat_id, job, wait
+        chat_id, job, broadcast_wait = self._pick(
+            self._broadcast_queues,
+            self._broadcast_ready,
+            now,
+            max(global_delay, self._broadcast_bucket.delay(now)))
+        if job is not None:
+            self._broadcast_bucket.take(now)
+            return chat_id, job, None
+        waits = [delay for delay in (wait, broadcast_wait) if delay is not None]
+        return None, None, min(waits, default=None)
+
+    def _pick(
+            self,
+            queues: Dict[Hashable, deque],
+            ready: deque,
+            now: float,
+            lane_delay: float):
+        """Picks the next chat of a lane round-robin, see _next_job."""
+        wait = None
+        for _ in range(len(ready)):
+            chat_id = ready.popleft()
+            ready.append(chat_id)
+            if chat_id in self._busy:
+                continue
+            delay = max(
+                lane_delay,
+                self._paused_until.get(chat_id, 0) - now,
+                self._chat_bucket(chat_id).delay(now))
+            if delay > 0:
+                wait = delay if wait is None else min(wait, delay)
+                continue
+            self._paused_until.pop(chat_id, None)
+            self._global_bucket.take(now)
+            self._chat_bucket(chat_id).take(now)
+            return chat_id, queues[chat_id].popleft(), None
+        return None, None, wait
+
+    def _run(self) -> None:
+        with self._cond:
+            while not self._stopped:
+                chat_id, job, wait = self._next_job(time.monotonic())
+                if job is None:
+                    self._cond.wait(wait)
+                    continue
+                self._busy.add(chat_id)
+                self._pool.submit(self._execute, chat_id, job)
+
+    def _execute(self, chat_id: Hashable, job: _Job) -> None:
+        retry = False
+        try:
+            result = job.method(*job.args, **job.kwargs)
+        except tb.apihelper.ApiTelegramException as e:
+            retry_after = _retry_after(e)
+            if retry_after is not None and job.attempts < self.max_retries:
+                job.attempts += 1
+                retry = True
+                with self._cond:
+                    self._paused_until[chat_id] = (
+                        time.monotonic() + retry_after)
+            else:
+                self._fail(chat_id, job, e)
+        except Exception as e:
+            self._fail(chat_id, job, e)
+        else:
+            job.future.set_result(result)
+        with self._cond:
+            queues, ready = self._lane(job.broadcast)
+            queue = queues[chat_id]
+            if retry:
+                queue.appendleft(job)
+            if not queue:
+                del queues[chat_id]
+                ready.remove(chat_id)
+            self._busy.discard(chat_id)
+            self._cond.notify_all()
+
+    def _fail(self, chat_id: Hashable, job: _Job, error: Exception) -> None:
+        # Callers rarely wait for the future, so the failure is logged here
+        name = getattr(job.method, '__name__', 'send')
+        print(f"Failed to {name} in {chat_id}: {error}")
+        job.future.set_exception(error)
+
+
+def _retry_after(e: tb.apihelper.ApiTelegramException):
+    """Returns retry_after of a 429 error, or None for other errors."""
+    if e.error_code != 429:
+        return None
+    parameters = (e.result_json or {}).get('parameters') or {}
+    return parameters.get('retry_after', 1)
@@ -4,17 +4,31 @@ from collections import namedtuple
 
 InlineKeyboardButton = namedtuple('InlineKeyboardButton', ['text', 'callback_data'])
 
+# Telegram rejects buttons with longer callback data
+MAX_CALLBACK_DATA_LENGTH = 64
+
 
 class InlineKeyboardPaginator:
+    """Row of page buttons: first, jump back, previous, current, next,
+    jump forward and last page.
+
+    Up to 5 pages are all shown. With more pages a window of buttons
+    around the current page is shown like in the classic paginator, plus
+    buttons jumping `jump` pages back and forth when they fall outside it.
+    """
     _keyboard_before = None
     _keyboard = None
     _keyboard_after = None
 
-    previous_page_label = '‹'
-    next_page_label = '›'
+    first_page_label = '« {}'
+    jump_back_label = '‹‹ {}'
+    previous_page_label = '‹ {}'
     current_page_label = '·{}·'
+    next_page_label = '{} ›'
+    jump_forward_label = '{} ››'
+    last_page_label = '{} »'
 
-    def __init__(self, page_count, current_page=1, data_pattern='{page}'):
+    def __init__(self, page_count, current_page=1, data_pattern='{page}', jump=0):
         self._keyboard_before = []
         self._keyboard_after = []
 
@@ -27,31 +41,69 @@ class InlineKeyboardPaginator:
 
         self.data_pattern = data_pattern
 
+        self.jump = jump
+
     def __str__(self):
         if self._keyboard is None:
             self._build()
         return ' '.join([btn['text'] for btn in self._keyboard])
 
     def _build(self):
-        keyboard_dict = {}
-        
-        keyboard_dict = self._build_middle_keyboard()
+        if self.page_count <= 1:
+            self._keyboard = []
+            return
+
+        if self.page_count <= 5:
+            keyboard_dict = {
+                page: page for page in range(1, self.page_count + 1)
+            }
+        elif self.current_page <= 3:
+            keyboard_dict = self._build_start_keyboard()
+        elif self.current_page > self.page_count - 3:
+            keyboard_dict = self._build_finish_keyboard()
+        else:
+            keyboard_dict = self._build_middle_keyboard()
+        self._add_jumps(keyboard_dict)
 
         keyboard_dict[self.current_page] = self.current_page_label.format(self.current_page)
 
         self._keyboard = self._to_button_array(keyboard_dict)
 
+    def _build_start_keyboard(self):
+        keyboard_dict = {page: page for page in range(1, 4)}
+        keyboard_dict[4] = self.next_page_label.format(4)
+        keyboard_dict[self.page_count] = self.last_page_label.format(self.page_count)
+        return keyboard_dict
+
+    def _build_finish_keyboard(self):
+        keyboard_dict = {}
+        keyboard_dict[1] = self.first_page_label.format(1)
+        keyboard_dict[self.page_count-3] = self.previous_page_label.format(self.page_count-3)
+        for page in range(self.page_count-2, self.page_count+1):
+            keyboard_dict[page] = page
+        return keyboard_dict
+
     def _build_middle_keyboard(self):
         keyboard_dict = {}
-        if self.current_page > 1:
-            keyboard_dict[self.current_page-1] = self.previous_page_label.format(self.current_page-1)
+        keyboard_dict[1] = self.first_page_label.format(1)
+        keyboard_dict[self.current_page-1] = self.previous_page_label.format(self.current_page-1)
 
         keyboard_dict[self.current_page] = self.current_page
 
-        if self.current_page < self.page_count:
-            keyboard_dict[self.current_page+1] = self.next_page_label.format(self.current_page+1)
+        keyboard_dict[self.current_page+1] = self.next_page_label.format(self.current_page+1)
+        keyboard_dict[self.page_count] = self.last_page_label.format(self.page_count)
         return keyboard_dict
 
+    def _add_jumps(self, keyboard_dict):
+        if not self.jump:
+            return
+        back = self.current_page - self.jump
+        if back > 1 and back not in keyboard_dict:
+            keyboard_dict[back] = self.jump_back_label.format(back)
+        forward = self.current_page + self.jump
+        if forward < self.page_count and forward not in keyboard_dict:
+            keyboard_dict[forward] = self.jump_forward_label.format(forward)
+
     def _to_button_array(self, keyboard_dict):
         keys = sorted(keyboard_dict.keys())
         keyboard = [
@@ -61,6 +113,11 @@ class InlineKeyboardPaginator:
             )
             for key in keys
         ]
+        for button in keyboard:
+            if len(button.callback_data.encode()) > MAX_CALLBACK_DATA_LENGTH:
+                raise ValueError(
+                    f"Callback data {button.callback_data!r} is longer than "
+                    f"{MAX_CALLBACK_DATA_LENGTH} bytes")
         return _buttons_to_dict(keyboard)
 
     @property
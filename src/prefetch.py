@@ -0,0 +1,135 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import metrics
+from cache import NewsCache
+
+
+class PrefetchScheduler:
+    """Keeps every source/category feed in the cache warm.
+
+    Each (source, category) pair is refreshed on its own interval with
+    random jitter so that refreshes do not line up. Fetches run on a
+    bounded thread pool and a pair is never refreshed twice at once.
+    """
+
+    def __init__(
+            self,
+            cache: NewsCache,
+            categories: Dict[str, List[str]],
+            loader: Callable[[str, str], dict],
+            interval: float = 240.0,
+            intervals: Optional[Dict[str, float]] = None,
+            jitter: float = 0.1,
+            workers: int = 4) -> None:
+        """Creates a scheduler.
+
+        Args:
+            cache (NewsCache): Cache to keep warm.
+            categories (Dict[str, List[str]]): Categories per source.
+            loader (Callable): Fetches the feed for (source, category).
+            interval (float, optional): Default refresh interval in seconds.
+            intervals (Dict[str, float], optional): Interval per category.
+            jitter (float, optional): Relative jitter applied to intervals.
+            workers (int, optional): Size of the fetch thread pool.
+        """
+        self.cache = cache
+        self.loader = loader
+        self.interval = interval
+        self.intervals = intervals or {}
+        self.jitter = jitter
+        self.workers = workers
+        self._keys = [
+            (source, category)
+            for source, source_categories in categories.items()
+            for category in source_categories
+        ]
+        self._next_run = {}
+        self._last_refreshed = {}
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pool = None
+
+    def start(self) -> None:
+        """Starts refreshing in a background thread."""
+        now = time.time()
+        for key in self._keys:
+            # Spread the first round over the jitter window
+            self._next_run[key] = now + random.uniform(
+                0, self.jitter * self._interval_for(key))
+        self._stopped.clear()
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix='prefetch')
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the scheduler and waits for running fetches."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+    def last_refreshed(self) -> Dict[Tuple[str, str], float]:
+        """Returns when each category was last refreshed.
+
+        Also exported as metrics.PREFETCH_LAST_REFRESH.
+
+        Returns:
+            Dict[Tuple[str, str], float]: Unix time per (source, category).
+        """
+        with self._lock:
+            return dict(self._last_refreshed)
+
+    def _interval_for(self, key: Tuple[str, str]) -> float:
+        return self.intervals.get(key[1], self.interval)
+
+    def _schedule(self, key: Tuple[str, str]) -> None:
+        interval = self._interval_for(key)
+        delay = interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+        with self._lock:
+            self._next_run[key] = time.time() + delay
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            now = time.time()
+            with self._lock:
+                due = [
+                    key for key, at in self._next_run.items()
+                    if at <= now and key not in self._in_flight
+                ]
+                self._in_flight.update(due)
+            for key in due:
+                self._pool.submit(self._refresh, key)
+            with self._lock:
+                pending = [
+                    at for key, at in self._next_run.items()
+                    if key not in self._in_flight
+                ]
+            timeout = max(min(pending) - time.time(), 0) if pending else None
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def _refresh(self, key: Tuple[str, str]) -> None:
+        try:
+            self.cache.set(key, self.loader(*key))
+            refreshed = time.time()
+            with self._lock:
+                self._last_refreshed[key] = refreshed
+            metrics.PREFETCH_LAST_REFRESH.labels(*key).set(refreshed)
+        except Exception as e:
+            print(f"Failed to prefetch {key}: {e}")
+        finally:
+            self._schedule(key)
+            with self._lock:
+                self._in_flight.discard(key)
+            self._wakeup.set()
@@ -0,0 +1,73 @@
+import math
+from typing import NamedTuple
+
+import keyboards as kb
+import messages as msgs
+import services as svc
+from cache import NewsCache
+from settings import PAGE_JUMP, RENDER_CACHE_SIZE
+from telebot.types import InlineKeyboardButton
+
+
+class RenderedPage(NamedTuple):
+    """News page ready to be sent."""
+    text: str
+    markup: str
+    page: int
+
+
+# Most items per page, larger sizes in callback data are cut to it
+MAX_PAGE_SIZE = 20
+
+# Rendered pages never expire: the feed version is part of the key, so
+# a changed feed is rendered again and old pages are evicted as LRU
+page_cache = NewsCache(
+    maxsize=RENDER_CACHE_SIZE,
+    ttl=lambda key: math.inf)
+
+
+def render_news_page(
+        source: str,
+        category: str,
+        page: int = 1,
+        page_size: int = 1) -> RenderedPage:
+    """Returns text and serialized keyboard of a feed page.
+
+    Args:
+        source (str): News source.
+        category (str): News category.
+        page (int, optional): Page number. Defaults to 1.
+        page_size (int, optional): Items per page. Defaults to 1.
+    Returns:
+        RenderedPage: Text, reply markup as JSON and the page number after
+            clamping it to the feed size.
+    """
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    info = svc.news_store.feed_info(source, category)
+    if info is None:
+        svc.get_news(source, category)
+        info = svc.news_store.feed_info(source, category) or (0, 0)
+    version, size = info
+    page_count = -(-size // page_size)
+    page = max(1, min(page, page_count))
+    return page_cache.get(
+        (source, category, version, page, page_size),
+        lambda: _render(source, category, page, page_size, page_count))
+
+def _render(
+        source: str,
+        category: str,
+        page: int,
+        page_size: int,
+        page_count: int) -> RenderedPage:
+    news = svc.news_store.get_page(source, category, page, page_size)
+    # 'p#{page}#{page_size}#{category}', old 'number#{page}#{category}'
+    # buttons are still routed with a page size of 1
+    pagination = kb.InlineKeyboardPaginator(
+        page_count,
+        current_page=page,
+        data_pattern='p#{page}#'+f'{page_size}#{category}',
+        jump=PAGE_JUMP)
+    pagination.add_after(InlineKeyboardButton('Back', callback_data='back'))
+    text = msgs.get_page_text(news) or msgs.NO_NEWS_TEXT
+    return RenderedPage(text, pagination.markup, page)
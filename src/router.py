@@ -0,0 +1,127 @@
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+
+
+class CallbackData(NamedTuple):
+    """Parsed callback data of an inline button.
+
+    `action` is the whole data of a plain button ('pln', 'today', 'back')
+    or the part before the first '#' ('p' for 'p#2#5#today').
+    """
+    action: str
+    page: Optional[int] = None
+    category: Optional[str] = None
+    source: Optional[str] = None
+    page_size: Optional[int] = None
+    query_id: Optional[int] = None
+
+
+# CallbackData fields parsed as numbers
+_INT_FIELDS = ('page', 'page_size', 'query_id')
+
+
+class Route(NamedTuple):
+    handler: Callable
+    fields: Tuple[str, ...] = ()
+    delete_history: bool = True
+
+
+class CallbackRouter:
+    """Dispatches callback queries to exactly one handler.
+
+    Routes are compiled into dicts when they are added, so resolving
+    callback data takes at most three dict lookups and one split, whatever
+    the number of routes. Prefixed routes can be bound to a news source;
+    the source is found from the category in the data.
+    """
+
+    def __init__(self, category_sources: Dict[str, str]) -> None:
+        """Creates a router.
+
+        Args:
+            category_sources (Dict[str, str]): News source of each category.
+        """
+        self.category_sources = category_sources
+        self._exact: Dict[str, Route] = {}
+        self._prefixed: Dict[Tuple[str, Optional[str]], Route] = {}
+        # Fields of each prefixed action, the same for all of its sources
+        self._fields: Dict[str, Tuple[str, ...]] = {}
+
+    def add_exact(
+            self,
+            values: Iterable[str],
+            handler: Callable,
+            delete_history: bool = True) -> None:
+        """Routes callback data equal to one of values to handler.
+
+        Args:
+            values (Iterable[str]): Callback data values.
+            handler (Callable): Called with (call, CallbackData).
+            delete_history (bool, optional): Delete the chat's previous
+                messages before handling. Defaults to True.
+        """
+        route = Route(handler, delete_history=delete_history)
+        for value in values:
+            self._exact[value] = route
+
+    def add_prefix(
+            self,
+            action: str,
+            fields: Tuple[str, ...],
+            handler: Callable,
+            source: str = None,
+            delete_history: bool = False) -> None:
+        """Routes callback data like '{action}#{field}#...' to handler.
+
+        Args:
+            action (str): Part of the data before the first '#'.
+            fields (Tuple[str, ...]): CallbackData fields of the remaining
+                '#'-separated parts, e.g. ('page', 'page_size', 'category').
+            handler (Callable): Called with (call, CallbackData).
+            source (str, optional): Only route data whose category belongs
+                to this source. Defaults to any source.
+            delete_history (bool, optional): Delete the chat's previous
+                messages before handling. Defaults to False.
+        """
+        self._prefixed[(action, source)] = Route(
+            handler,
+            fields,
+            delete_history)
+        self._fields[action] = fields
+
+    def resolve(self, data: str) -> Optional[Tuple[Route, CallbackData]]:
+        """Finds the route of callback data and parses the data.
+
+        Args:
+            data (str): Callback data.
+        Returns:
+            Optional[Tuple[Route, CallbackData]]: Route and parsed data,
+                None if no route matches or the data is malformed.
+        """
+        route = self._exact.get(data)
+        if route is not None:
+            source = self.category_sources.get(data)
+            return route, CallbackData(
+                data,
+                category=data if source else None,
+                source=source)
+
+        action, _, rest = data.partition('#')
+        route = self._prefixed.get((action, None))
+        fields = route.fields if route is not None else self._fields.get(action)
+        if fields is None:
+            return None
+        values = dict(zip(fields, rest.split('#', len(fields) - 1)))
+        try:
+            for field in _INT_FIELDS:
+                if field in values:
+                    values[field] = int(values[field])
+        except ValueError:
+            return None
+        source = self.category_sources.get(values.get('category'))
+        if 'category' in values and source is None:
+            return None
+        if route is None:
+            route = self._prefixed.get((action, source))
+            if route is None:
+                return None
+        return route, CallbackData(action, source=source, **values)
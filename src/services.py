@@ -1,14 +1,142 @@
+import metrics
 import requests
+from cache import NewsCache
+from http_client import CircuitOpenError, NewsClient
+from feed import FeedError, NewsItem
+from news_store import NewsStore
+from singleflight import SingleFlight
+from settings import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_POOL_SIZE,
+    HTTP_READ_TIMEOUT,
+    HTTP_RETRIES,
+    NEWS_API_URL,
+    NEWS_DB_PATH,
+)
+from typing import Callable, List, Tuple
 
 
+BASE_URL = NEWS_API_URL
+
+NEWS_CATEGORIES = {
+    'pln': ['today', 'accidents', 'automir', 'culture', 'society'],
+    'cdi': ['news', 'rbusiness', 'rmarket', 'rrabota'],
+    'ipsk': ['allnews']
+}
+
+# Source of each category, categories are unique across sources
+CATEGORY_SOURCES = {
+    category: source
+    for source, categories in NEWS_CATEGORIES.items()
+    for category in categories
+}
+
+# Seconds a fetched feed is considered fresh, per category
+DEFAULT_TTL = 300
+CATEGORY_TTL = {
+    'today': 60,
+    'news': 60,
+    'allnews': 120,
+}
+
+client = NewsClient(
+    BASE_URL,
+    connect_timeout=HTTP_CONNECT_TIMEOUT,
+    read_timeout=HTTP_READ_TIMEOUT,
+    retries=HTTP_RETRIES,
+    pool_size=HTTP_POOL_SIZE)
+
+news_cache = NewsCache(
+    maxsize=64,
+    ttl=lambda key: CATEGORY_TTL.get(key[1], DEFAULT_TTL))
+
+news_store = NewsStore(NEWS_DB_PATH)
+
+# Fetches of the same feed running at once share one upstream request,
+# in threads and on the event loop alike
+fetches = SingleFlight(metrics.UPSTREAM_FETCHES)
+
+# Errors after which news is served from the local store
+UPSTREAM_ERRORS = (requests.RequestException, CircuitOpenError, FeedError)
+
+# Called with (source, category, new items) when a known feed gets new items
+feed_listeners: List[Callable[[str, str, List[NewsItem]], None]] = []
+
+
+def ingest_news(source: str, category: str, items: List[NewsItem]) -> None:
+    """Saves a downloaded feed and tells feed_listeners about new items.
+
+    The first download of a feed has nothing to compare with, so it is
+    saved without telling anyone.
+    """
+    known = news_store.feed_info(source, category) is not None
+    new_items = news_store.ingest(source, category, items)
+    if not known or not new_items:
+        return
+    for listener in feed_listeners:
+        try:
+            listener(source, category, new_items)
+        except Exception as e:
+            print(f"Failed to handle new {source}/{category} items: {e}")
+
+def fetch_news(source: str, category: str) -> dict:
+    """Downloads a feed and saves it to the local news store if changed.
+
+    A call made while the same feed is being downloaded waits for that
+    download and shares its result or error.
+    """
+    return fetches.do(
+        (source, category),
+        lambda: _fetch_news(source, category))
+
+def _fetch_news(source: str, category: str) -> dict:
+    news, modified = client.fetch(source, category)
+    if modified:
+        ingest_news(source, category, news.get(category, []))
+    return news
+
+def get_news(source: str, category: str) -> dict:
+    """Returns a feed from the cache, upstream or the local news store."""
+    try:
+        return news_cache.get(
+            (source, category),
+            lambda: fetch_news(source, category))
+    except UPSTREAM_ERRORS:
+        if news_store.feed_info(source, category) is None:
+            raise
+        return {category: news_store.get_feed(source, category)}
+
 def get_pln_news(category: str) -> dict:
-    return requests.get(f'https://e0x.dev/sixtieslife/pln/{category}').json()
+    return get_news('pln', category)
 
 def get_cdi_news(category: str) -> dict:
-    return requests.get(f'https://e0x.dev/sixtieslife/cdi/{category}').json()
+    return get_news('cdi', category)
 
 def get_pg_news(category: str) -> dict:
-    return requests.get(f'https://e0x.dev/sixtieslife/pg/{category}').json()
+    return get_news('pg', category)
 
 def get_ipsk_news(category: str) -> dict:
-    return requests.get(f'https://e0x.dev/sixtieslife/ipsk/{category}').json()
+    return get_news('ipsk', category)
+
+def search_news(
+        query: str,
+        page: int,
+        page_size: int) -> Tuple[List[NewsItem], int]:
+    """Searches news titles in the local news store, never upstream.
+
+    Args:
+        query (str): Words to search for.
+        page (int): Page number starting at 1.
+        page_size (int): Items per page.
+    Returns:
+        Tuple[List[NewsItem], int]: Items of the page and number of found
+            items.
+    """
+    items, total = news_store.search(
+        query,
+        limit=page_size,
+        offset=(page - 1) * page_size)
+    last_page = -(-total // page_size)
+    if not items and page > last_page > 0:
+        return search_news(query, last_page, page_size)
+    return items, total
@@ -8,3 +8,80 @@ env_path = path.join(path.dirname(__file__))
 load_dotenv(path.join(env_path, "..", ".env"))
 
 BOT_TOKEN = environ.get("BOT_TOKEN")
+
+# 'sync' runs the threaded TeleBot, 'async' runs AsyncTeleBot on asyncio,
+# 'webhook' runs the threaded TeleBot behind the built-in webhook server
+BOT_MODE = environ.get("BOT_MODE", "sync")
+
+# Update handling: updates of one chat run in order, different chats in
+# parallel on UPDATE_WORKERS threads
+UPDATE_WORKERS = int(environ.get("UPDATE_WORKERS", 8))
+UPDATE_QUEUE_SIZE = int(environ.get("UPDATE_QUEUE_SIZE", 10000))
+
+# Webhook server; WEBHOOK_URL is registered with Telegram if set
+WEBHOOK_URL = environ.get("WEBHOOK_URL", "")
+WEBHOOK_HOST = environ.get("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(environ.get("WEBHOOK_PORT", 8080))
+WEBHOOK_PATH = environ.get("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = environ.get("WEBHOOK_SECRET", "")
+WEBHOOK_WORKERS = int(environ.get("WEBHOOK_WORKERS", 8))
+WEBHOOK_QUEUE_SIZE = int(environ.get("WEBHOOK_QUEUE_SIZE", 1000))
+
+# Base URLs of the APIs, e.g. of local fakes in benchmarks; an empty
+# TELEGRAM_API_URL keeps telebot's default
+NEWS_API_URL = environ.get("NEWS_API_URL", "https://e0x.dev/sixtieslife")
+TELEGRAM_API_URL = environ.get("TELEGRAM_API_URL", "")
+
+# Local copy of the news feeds
+NEWS_DB_PATH = environ.get("NEWS_DB_PATH", "./data/news.db")
+
+# Background refresh of all news categories
+PREFETCH_INTERVAL = float(environ.get("PREFETCH_INTERVAL", 240))
+PREFETCH_JITTER = float(environ.get("PREFETCH_JITTER", 0.1))
+PREFETCH_WORKERS = int(environ.get("PREFETCH_WORKERS", 4))
+
+# Upstream news API client
+HTTP_CONNECT_TIMEOUT = float(environ.get("HTTP_CONNECT_TIMEOUT", 3.05))
+HTTP_READ_TIMEOUT = float(environ.get("HTTP_READ_TIMEOUT", 10))
+HTTP_RETRIES = int(environ.get("HTTP_RETRIES", 3))
+HTTP_POOL_SIZE = int(environ.get("HTTP_POOL_SIZE", 10))
+
+# Outgoing Telegram API calls, in calls per second
+SEND_GLOBAL_RATE = float(environ.get("SEND_GLOBAL_RATE", 30))
+SEND_CHAT_RATE = float(environ.get("SEND_CHAT_RATE", 1))
+SEND_CHAT_BURST = float(environ.get("SEND_CHAT_BURST", 3))
+SEND_WORKERS = int(environ.get("SEND_WORKERS", 4))
+SEND_BROADCAST_RATE = float(environ.get("SEND_BROADCAST_RATE", 20))
+
+# User settings cache; writes are saved at least every SETTINGS_FLUSH_INTERVAL seconds
+SETTINGS_CACHE_SIZE = int(environ.get("SETTINGS_CACHE_SIZE", 10000))
+SETTINGS_FLUSH_INTERVAL = float(environ.get("SETTINGS_FLUSH_INTERVAL", 5))
+
+# News items per page of /search results
+SEARCH_PAGE_SIZE = int(environ.get("SEARCH_PAGE_SIZE", 5))
+
+# Inline mode: results per answer, seconds Telegram and the bot cache
+# the results of a query, queries cached by the bot and results per query
+INLINE_PAGE_SIZE = int(environ.get("INLINE_PAGE_SIZE", 20))
+INLINE_CACHE_TIME = int(environ.get("INLINE_CACHE_TIME", 60))
+INLINE_CACHE_SIZE = int(environ.get("INLINE_CACHE_SIZE", 1000))
+INLINE_MAX_RESULTS = int(environ.get("INLINE_MAX_RESULTS", 100))
+
+# News items per page of a category with pagination on, and how many
+# pages the jump buttons skip; PAGE_JUMP 0 hides them
+NEWS_PAGE_SIZE = int(environ.get("NEWS_PAGE_SIZE", 5))
+PAGE_JUMP = int(environ.get("PAGE_JUMP", 5))
+
+# Prometheus metrics endpoint at http://METRICS_HOST:METRICS_PORT/metrics,
+# disabled when METRICS_PORT is 0
+METRICS_HOST = environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(environ.get("METRICS_PORT", 0))
+
+# Rendered news pages kept in memory
+RENDER_CACHE_SIZE = int(environ.get("RENDER_CACHE_SIZE", 2048))
+
+# Feed and rendered page caches are saved to SNAPSHOT_PATH every
+# SNAPSHOT_INTERVAL seconds and on shutdown, and restored on startup;
+# an empty SNAPSHOT_PATH disables snapshots
+SNAPSHOT_PATH = environ.get("SNAPSHOT_PATH", "./data/cache.snapshot")
+SNAPSHOT_INTERVAL = float(environ.get("SNAPSHOT_INTERVAL", 60))
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its outcome.
+
+    A call made while another one with the same key is in flight does
+    not run, it waits for the running one and gets its result or its
+    exception. Threads and coroutines share the calls in flight, so a
+    feed fetched by a prefetch thread is not fetched again by a handler
+    on the event loop at the same time.
+    """
+
+    def __init__(self, counter=None) -> None:
+        """Creates a group.
+
+        Args:
+            counter (metrics.Counter, optional): Counter labelled with
+                the key's values and 'leader' or 'coalesced', incremented
+                for every call.
+        """
+        self.counter = counter
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Calls fn unless a call for key is in flight, then waits for it.
+
+        Args:
+            key (Hashable): Identifies identical calls.
+            fn (Callable): Makes the call.
+        Returns:
+            Any: Result of the call that ran.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        self._run(key, future, fn)
+        return future.result()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Same as `do`, but awaits a coroutine function or the call in flight.
+
+        Args:
+            key (Hashable): Identifies identical calls.
+            fn (Callable): Coroutine function making the call.
+        Returns:
+            Any: Result of the call that ran.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def in_flight(self) -> int:
+        """Returns the number of calls running now."""
+        with self._lock:
+            return len(self._calls)
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        """Returns the future of the call for key and whether to run it."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if self.counter is not None:
+            labels = key if isinstance(key, tuple) else (key,)
+            self.counter.labels(
+                *labels, 'leader' if leader else 'coalesced').inc()
+        return future, leader
+
+    def _run(self, key: Hashable, future: Future, fn: Callable[[], Any]) -> None:
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            return
+        self._finish(key, future, result)
+
+    def _finish(
+            self,
+            key: Hashable,
+            future: Future,
+            result: Any = None,
+            error: Optional[BaseException] = None) -> None:
+        # Later calls start a new flight instead of getting this outcome
+        with self._lock:
+            del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
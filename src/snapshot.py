@@ -0,0 +1,193 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from cache import NewsCache
+
+
+# File signature and format version
+MAGIC = b'SLCACHE1'
+
+# Length of the JSON index that follows the signature
+_INDEX_LENGTH = struct.Struct('>I')
+
+
+class SnapshotCache(NamedTuple):
+    """Cache saved in a snapshot and how its values are stored."""
+    cache: NewsCache
+    # Turns a value into JSON-serializable data and back
+    to_json: Callable[[Any], Any] = lambda value: value
+    from_json: Callable[[Any], Any] = lambda data: data
+
+
+class CacheSnapshot:
+    """Saves caches to a file and restores them after a restart.
+
+    The file holds a small JSON index followed by every entry as
+    zlib-compressed JSON. Loading maps the file into memory and only
+    reads the index, an entry is decompressed the first time it is used.
+    Entries keep the time they were fetched at, so expired ones are
+    served stale and refreshed in the background by their cache.
+
+    Snapshots are written to a temporary file which then replaces the
+    previous one, so a crash while saving leaves the old snapshot intact.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            caches: Dict[str, SnapshotCache],
+            interval: float = 60.0) -> None:
+        """Creates a snapshot.
+
+        Args:
+            path (str): Snapshot file.
+            caches (Dict[str, SnapshotCache]): Caches by name, the name
+                identifies a cache's entries in the file.
+            interval (float, optional): Seconds between saves.
+        """
+        self.path = path
+        self.caches = caches
+        self.interval = interval
+        self._mmap: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def load(self) -> int:
+        """Restores the caches from the snapshot file, if there is one.
+
+        Entries too old to be served by their cache are skipped, and keys
+        already cached are kept.
+
+        Returns:
+            int: Number of entries restored.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Missing or empty file
+            return 0
+        try:
+            index, start = self._read_index(buffer)
+        except (ValueError, struct.error) as e:
+            print(f"Ignoring broken cache snapshot {self.path}: {e}")
+            buffer.close()
+            return 0
+        view = memoryview(buffer)
+        now = time.time()
+        restored = 0
+        for name, entries in index['caches'].items():
+            if name not in self.caches:
+                continue
+            cache, _, from_json = self.caches[name]
+            decode = _decoder(from_json)
+            for key, fetched_at, offset, length in entries:
+                key = _to_key(key)
+                offset += start
+                if now - fetched_at >= cache.ttl(key) + cache.stale_ttl:
+                    continue
+                if cache.restore(
+                        key, view[offset:offset + length], decode, fetched_at):
+                    restored += 1
+        view.release()
+        with self._lock:
+            self._mmap = buffer
+        return restored
+
+    def save(self) -> None:
+        """Writes all entries of the caches to the snapshot file."""
+        with self._lock:
+            index = {'saved_at': time.time(), 'caches': {}}
+            blobs = []
+            offset = 0
+            for name, (cache, to_json, _) in self.caches.items():
+                entries = index['caches'][name] = []
+                for key, fetched_at, data in cache.dump(_encoder(to_json)):
+                    entries.append([key, fetched_at, offset, len(data)])
+                    blobs.append(data)
+                    offset += len(data)
+            # Offsets are relative to the end of the index
+            header = json.dumps(index, separators=(',', ':')).encode()
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(MAGIC)
+                f.write(_INDEX_LENGTH.pack(len(header)))
+                f.write(header)
+                for data in blobs:
+                    f.write(data)
+            # Entries restored from the old file were copied by dump()
+            self._close_mmap()
+            os.replace(temp_path, self.path)
+
+    def start(self) -> None:
+        """Starts saving the snapshot every `interval` seconds."""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the save thread and saves the snapshot one last time."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            self.save()
+        except OSError as e:
+            print(f"Failed to save cache snapshot: {e}")
+
+    def _read_index(self, buffer: mmap.mmap) -> Tuple[dict, int]:
+        """Returns the index and the offset of the first entry."""
+        if buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError('unknown format')
+        (length,) = _INDEX_LENGTH.unpack_from(buffer, len(MAGIC))
+        start = len(MAGIC) + _INDEX_LENGTH.size
+        return json.loads(buffer[start:start + length]), start + length
+
+    def _close_mmap(self) -> None:
+        if self._mmap is None:
+            return
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Still referenced by an entry, closed when it is collected
+            pass
+        self._mmap = None
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.save()
+            except OSError as e:
+                print(f"Failed to save cache snapshot: {e}")
+
+
+def _encoder(to_json: Callable[[Any], Any]) -> Callable[[Any], bytes]:
+    def encode(value: Any) -> bytes:
+        data = json.dumps(
+            to_json(value),
+            ensure_ascii=False,
+            separators=(',', ':'))
+        return zlib.compress(data.encode(), 1)
+    return encode
+
+
+def _decoder(from_json: Callable[[Any], Any]) -> Callable[[bytes], Any]:
+    def decode(data: bytes) -> Any:
+        return from_json(json.loads(zlib.decompress(data)))
+    return decode
+
+
+def _to_key(key: Any) -> Any:
+    """Turns a key read from JSON back into the tuple it was saved as."""
+    return tuple(key) if isinstance(key, list) else key
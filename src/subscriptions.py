@@ -0,0 +1,131 @@
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Iterator, List
+
+import database as db
+import metrics
+import telebot as tb
+from outbox import OutboundQueue
+
+
+# Chat IDs read from the database per query during a fan-out
+FAN_OUT_BATCH_SIZE = 1000
+
+# Below every chat ID, group chats have negative IDs
+_FIRST_CHAT_ID = -2 ** 63
+
+
+class SubscriptionStore:
+    """Chats subscribed to new items of news categories.
+
+    Stored in the subscriptions table of the settings database.
+    """
+
+    def __init__(
+            self,
+            conn: sqlite3.Connection,
+            lock: threading.Lock = None) -> None:
+        """Creates a store.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the migrated settings
+                database.
+            lock (threading.Lock, optional): Serializes the use of conn,
+                must be shared with every other user of the connection.
+        """
+        self.conn = conn
+        self.cursor = db.create_cursor(conn)
+        self._lock = lock or threading.Lock()
+
+    def subscribe(self, chat_id: int, category: str) -> bool:
+        """Subscribes a chat to a category.
+
+        Returns:
+            bool: False if the chat was already subscribed.
+        """
+        with self._lock:
+            return db.insert_subscription(
+                self.conn, self.cursor, chat_id, category)
+
+    def unsubscribe(self, chat_id: int, category: str = None) -> bool:
+        """Unsubscribes a chat from a category, or from all if None.
+
+        Returns:
+            bool: False if the chat was not subscribed.
+        """
+        with self._lock:
+            return db.delete_subscriptions(
+                self.conn, self.cursor, chat_id, category) > 0
+
+    def categories(self, chat_id: int) -> List[str]:
+        """Returns the categories a chat is subscribed to."""
+        with self._lock:
+            rows = db.select_subscriptions(self.cursor, chat_id)
+        return [row[0] for row in rows]
+
+    def subscribers(
+            self,
+            category: str,
+            batch_size: int = FAN_OUT_BATCH_SIZE) -> Iterator[List[int]]:
+        """Yields the chats subscribed to a category in batches.
+
+        The lock is only held while a batch is read, so subscribing does
+        not wait for a fan-out to finish.
+
+        Args:
+            category (str): News category.
+            batch_size (int, optional): Chats per batch.
+        Yields:
+            List[int]: Chat IDs in ascending order.
+        """
+        after = _FIRST_CHAT_ID
+        while True:
+            with self._lock, metrics.DB_SECONDS.labels('subscribers').time():
+                rows = db.select_subscribers(
+                    self.cursor, category, after, batch_size)
+            if not rows:
+                return
+            chat_ids = [row[0] for row in rows]
+            yield chat_ids
+            after = chat_ids[-1]
+
+
+def fan_out(
+        store: SubscriptionStore,
+        outbox: OutboundQueue,
+        category: str,
+        texts: List[str]) -> int:
+    """Queues texts for every chat subscribed to a category.
+
+    The texts are built once for all chats, and the outbox spreads the
+    calls over its rate limits in its broadcast lane, behind replies to
+    users. Chats that have blocked the bot are
+    unsubscribed when their message fails.
+
+    Args:
+        store (SubscriptionStore): Subscriptions.
+        outbox (OutboundQueue): Queue sending the messages.
+        category (str): Category the texts are about.
+        texts (List[str]): Messages to send to each chat.
+    Returns:
+        int: Number of chats the texts were queued for.
+    """
+    def unsubscribe_blocked(chat_id: int, future: Future) -> None:
+        e = future.exception()
+        if isinstance(e, tb.apihelper.ApiTelegramException) and e.error_code == 403:
+            store.unsubscribe(chat_id)
+
+    count = 0
+    for chat_ids in store.subscribers(category):
+        for chat_id in chat_ids:
+            for text in texts:
+                # Not recorded in the message history, so a menu click
+                # does not delete pushed news
+                future = outbox.broadcast(
+                    chat_id, outbox.bot.send_message, chat_id, text)
+                future.add_done_callback(
+                    lambda future, chat_id=chat_id:
+                        unsubscribe_blocked(chat_id, future))
+        count += len(chat_ids)
+    return count
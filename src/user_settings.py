@@ -0,0 +1,132 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import database as db
+import metrics
+
+
+_MISSING = object()
+
+
+class SettingsStore:
+    """In-memory cache of user settings with write-behind persistence.
+
+    Reads are served from a bounded LRU map and only go to the database
+    on a miss. Writes update the map right away and are queued; queued
+    writes are saved in one transaction every `flush_interval` seconds
+    and on `stop()`. A write can therefore be lost if the process is
+    killed within `flush_interval` seconds after it was made.
+    """
+
+    def __init__(
+            self,
+            conn: sqlite3.Connection,
+            table_name: str = 'settings',
+            maxsize: int = 10000,
+            flush_interval: float = 5.0,
+            lock: threading.Lock = None) -> None:
+        """Creates a store.
+
+        Args:
+            conn (sqlite3.Connection): Connection to the settings database.
+            table_name (str, optional): Settings table. Defaults to 'settings'.
+            maxsize (int, optional): Users kept in memory. Defaults to 10000.
+            flush_interval (float, optional): Seconds between flushes.
+            lock (threading.Lock, optional): Serializes the use of conn,
+                must be shared with every other user of the connection.
+        """
+        self.conn = conn
+        self.cursor = db.create_cursor(conn)
+        self.table_name = table_name
+        self.maxsize = maxsize
+        self.flush_interval = flush_interval
+        self._cache = OrderedDict()
+        self._dirty: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._db_lock = lock or threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """Starts flushing queued writes in a background thread."""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the flush thread and saves all queued writes."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def is_cached(self, user_id: int) -> bool:
+        """Returns whether reading user's settings needs no database query."""
+        with self._lock:
+            return user_id in self._dirty or user_id in self._cache
+
+    def get_pagination_status(self, user_id: int) -> Optional[str]:
+        """Returns user's pagination status.
+
+        Args:
+            user_id (int): Telegram user ID.
+        Returns:
+            Optional[str]: 'pagination_on', 'pagination_off', 'digest' or
+                None if the user has no settings yet.
+        """
+        with self._lock:
+            if user_id in self._dirty:
+                return self._dirty[user_id]
+            value = self._cache.get(user_id, _MISSING)
+            if value is not _MISSING:
+                self._cache.move_to_end(user_id)
+                return value
+        with self._db_lock, metrics.DB_SECONDS.labels('get_settings').time():
+            rows = db.select_pagination_status(self.cursor, user_id)
+        value = rows[0][0] if rows else None
+        with self._lock:
+            # A write may have arrived while the database was queried
+            if user_id in self._dirty:
+                return self._dirty[user_id]
+            self._remember(user_id, value)
+        return value
+
+    def set_pagination_status(self, user_id: int, status: str) -> None:
+        """Updates user's pagination status and queues it for saving.
+
+        Args:
+            user_id (int): Telegram user ID.
+            status (str): 'pagination_on', 'pagination_off' or 'digest'.
+        """
+        with self._lock:
+            self._dirty[user_id] = status
+            self._remember(user_id, status)
+
+    def flush(self) -> None:
+        """Saves all queued writes in one transaction."""
+        with self._lock:
+            items = list(self._dirty.items())
+        if not items:
+            return
+        with self._db_lock, metrics.DB_SECONDS.labels('save_settings').time():
+            db.insert_many(self.conn, self.cursor, self.table_name, items)
+        with self._lock:
+            for user_id, status in items:
+                if self._dirty.get(user_id) == status:
+                    del self._dirty[user_id]
+
+    def _remember(self, user_id: int, value: Optional[str]) -> None:
+        self._cache[user_id] = value
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Failed to save settings: {e}")
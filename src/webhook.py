@@ -0,0 +1,180 @@
+import hmac
+import ipaddress
+import json
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import telebot as tb
+
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+# Largest request body accepted, updates are a few KB
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    # Telegram opens up to 100 connections at once, the default listen
+    # backlog of 5 would reset most of them
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class WebhookServer:
+    """Receives Telegram updates over HTTP and hands them to the bot.
+
+    A request is answered as soon as its body is queued, handlers run
+    later on `workers` threads. When `queue_size` updates are waiting the
+    server answers 503, so Telegram backs off and delivers the update
+    again later instead of the bot running out of memory.
+    """
+
+    def __init__(
+            self,
+            bot: tb.TeleBot,
+            host: str = '127.0.0.1',
+            port: int = 8080,
+            path: str = '/telegram',
+            secret_token: str = '',
+            workers: int = 8,
+            queue_size: int = 1000) -> None:
+        """Creates a server.
+
+        Args:
+            bot (tb.TeleBot): Bot whose handlers process the updates.
+            host (str, optional): Interface to listen on.
+            port (int, optional): Port to listen on, 0 picks a free one.
+            path (str, optional): URL path updates are posted to.
+            secret_token (str, optional): Expected value of the secret token
+                header, empty to accept any request. Required unless the
+                server only listens on a loopback interface.
+            workers (int, optional): Threads running handlers.
+            queue_size (int, optional): Updates waiting for a worker before
+                requests are refused.
+        Raises:
+            ValueError: If a public interface would accept any request.
+        """
+        if not secret_token and not _is_loopback(host):
+            raise ValueError(
+                f"A secret token is required to listen on {host}, "
+                "anyone could post forged updates")
+        self.bot = bot
+        self.path = path
+        self.secret_token = secret_token
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._server = _HTTPServer((host, port), self._make_handler())
+
+    @property
+    def port(self) -> int:
+        """Port the server listens on."""
+        return self._server.server_address[1]
+
+    def start(self) -> None:
+        """Starts the workers and serves requests in a background thread."""
+        self._start_workers()
+        thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def serve_forever(self) -> None:
+        """Starts the workers and serves requests until stop() is called."""
+        self._start_workers()
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        """Stops accepting requests and handles the updates already queued."""
+        self._server.shutdown()
+        self._server.server_close()
+        for _ in range(self.workers):
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _start_workers(self) -> None:
+        # Handlers run in the workers, not in TeleBot's own thread pool,
+        # so the queue bound applies to them
+        self.bot.threaded = False
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _authorized(self, headers) -> bool:
+        if not self.secret_token:
+            return True
+        # Bytes, compare_digest refuses non-ASCII strings
+        return hmac.compare_digest(
+            headers.get(SECRET_HEADER, '').encode(),
+            self.secret_token.encode())
+
+    def _accept(self, body: bytes) -> int:
+        try:
+            self._queue.put_nowait(body)
+        except queue.Full:
+            return 503
+        return 200
+
+    def _work(self) -> None:
+        while True:
+            body = self._queue.get()
+            if body is None:
+                return
+            try:
+                update = tb.types.Update.de_json(json.loads(body))
+                self.bot.process_new_updates([update])
+            except Exception as e:
+                print(f"Failed to handle update: {e}")
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                if self.path != server.path:
+                    self._reply(404)
+                    return
+                # Checked before the body is read, so nobody else can make
+                # the server buffer it
+                if not server._authorized(self.headers):
+                    self._reply(403)
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    self._reply(400)
+                elif length > MAX_BODY_SIZE:
+                    self._reply(413)
+                else:
+                    self._reply(server._accept(self.rfile.read(length)))
+
+            def _reply(self, status: int) -> None:
+                if status != 200:
+                    # The unread body must not be taken for a request
+                    self.close_connection = True
+                self.send_response(status)
+                if status == 503:
+                    self.send_header('Retry-After', '1')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format: str, *args) -> None:
+                # One line per update would flood the output
+                pass
+
+        return Handler
+
+
+def _is_loopback(host: str) -> bool:
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        # A host name may resolve to any interface
+        return False
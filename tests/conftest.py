@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+
+# The bot runs from src/ with its modules imported by name, and the
+# benchmark fakes live in bench/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'src'), os.path.join(ROOT, 'bench')]
+
+# Modules open their databases on import, keep them out of the tree
+os.environ.setdefault(
+    'NEWS_DB_PATH',
+    os.path.join(tempfile.mkdtemp(prefix='sixties-tests-'), 'news.db'))
@@ -0,0 +1,83 @@
+import sqlite3
+
+import pytest
+
+import database as db
+
+
+def baseline(path) -> sqlite3.Connection:
+    """Settings database as created before migrations existed."""
+    conn = db.create_connection(str(path))
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS settings ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "user_id INT, pagination_status TEXT)")
+    conn.executemany(
+        "INSERT INTO settings (user_id, pagination_status) VALUES (?, ?)",
+        [
+            (1, 'pagination_off'),
+            (2, 'pagination_on'),
+            (1, 'pagination_on'),
+            (3, 'digest'),
+            (1, 'digest'),
+            (2, 'pagination_off'),
+        ])
+    conn.commit()
+    return conn
+
+
+def settings(conn: sqlite3.Connection) -> dict:
+    return dict(conn.execute(
+        "SELECT user_id, pagination_status FROM settings").fetchall())
+
+
+def test_migration_keeps_newest_row_per_user(tmp_path):
+    conn = baseline(tmp_path / 'settings.db')
+    assert db.migrate(conn) == len(db.MIGRATIONS)
+    rows = conn.execute("SELECT user_id FROM settings").fetchall()
+    assert sorted(rows) == [(1,), (2,), (3,)]
+    assert settings(conn) == {1: 'digest', 2: 'pagination_off', 3: 'digest'}
+
+
+def test_migrated_database_has_one_row_per_user(tmp_path):
+    conn = baseline(tmp_path / 'settings.db')
+    db.migrate(conn)
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute(
+            "INSERT INTO settings (user_id, pagination_status) VALUES (1, 'x')")
+    conn.rollback()
+    cursor = db.create_cursor(conn)
+    db.insert_many(conn, cursor, 'settings', [(1, 'pagination_off'), (4, 'digest')])
+    assert settings(conn) == {
+        1: 'pagination_off', 2: 'pagination_off', 3: 'digest', 4: 'digest'}
+
+
+def test_migration_can_run_again(tmp_path):
+    path = tmp_path / 'settings.db'
+    conn = baseline(path)
+    db.migrate(conn)
+    assert db.migrate(conn) == len(db.MIGRATIONS)
+    conn.execute("INSERT INTO subscriptions VALUES ('today', 7)")
+    conn.commit()
+    # As if the version update had been lost after the statements ran
+    conn.execute("PRAGMA user_version = 0")
+    assert db.migrate(conn) == len(db.MIGRATIONS)
+    conn.close()
+    conn = db.create_connection(str(path))
+    assert db.migrate(conn) == len(db.MIGRATIONS)
+    assert settings(conn) == {1: 'digest', 2: 'pagination_off', 3: 'digest'}
+    assert conn.execute("SELECT * FROM subscriptions").fetchall() == [('today', 7)]
+
+
+def test_failed_migration_is_rolled_back(tmp_path):
+    conn = baseline(tmp_path / 'settings.db')
+    broken = db.MIGRATIONS + [[
+        "CREATE TABLE extra (id INTEGER)",
+        "INSERT INTO missing_table VALUES (1)",
+    ]]
+    with pytest.raises(sqlite3.Error):
+        db.migrate(conn, broken)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(db.MIGRATIONS)
+    tables = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert 'extra' not in tables
@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import Counter, defaultdict
+
+from executor import ChatExecutor
+
+
+CHATS = 6
+
+TASKS = 30
+
+
+class Recorder:
+    """Task that records which tasks of a chat ran and how many at once."""
+
+    def __init__(self) -> None:
+        self.running = Counter()
+        self.max_running = Counter()
+        self.done = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def __call__(self, chat_id, i) -> None:
+        with self._lock:
+            self.running[chat_id] += 1
+            self.max_running[chat_id] = max(
+                self.max_running[chat_id], self.running[chat_id])
+        time.sleep(0.001)
+        with self._lock:
+            self.running[chat_id] -= 1
+            self.done[chat_id].append(i)
+
+
+def test_tasks_of_a_chat_run_one_at_a_time_in_order():
+    executor = ChatExecutor(workers=8)
+    executor.start()
+    task = Recorder()
+    for i in range(TASKS):
+        for chat_id in range(CHATS):
+            executor.submit(chat_id, task, chat_id, i)
+    executor.stop()
+    assert set(task.max_running.values()) == {1}
+    assert dict(task.done) == {
+        chat_id: list(range(TASKS)) for chat_id in range(CHATS)}
+
+
+def test_chats_run_in_parallel():
+    executor = ChatExecutor(workers=2)
+    executor.start()
+    release = threading.Event()
+    executor.submit(1, release.wait, 5)
+    ran = threading.Event()
+    executor.submit(2, ran.set)
+    try:
+        assert ran.wait(5)
+    finally:
+        release.set()
+        executor.stop()
+
+
+def test_stop_drains_queued_tasks():
+    executor = ChatExecutor(workers=2)
+    executor.start()
+    release = threading.Event()
+    # Both workers are busy, so everything else is still queued at stop
+    executor.submit('a', release.wait, 5)
+    executor.submit('b', release.wait, 5)
+    task = Recorder()
+    for i in range(TASKS):
+        executor.submit(i % 3, task, i % 3, i)
+    stopper = threading.Thread(target=executor.stop)
+    stopper.start()
+    release.set()
+    stopper.join(5)
+    assert not stopper.is_alive()
+    assert sum(len(done) for done in task.done.values()) == TASKS
+    assert executor._threads == []
+
+
+def test_failing_task_does_not_stop_the_chat():
+    executor = ChatExecutor(workers=1)
+    executor.start()
+    done = []
+    executor.submit(1, lambda: {}['missing'])
+    executor.submit(1, done.append, 'next')
+    executor.stop()
+    assert done == ['next']
+
+
+def test_submit_blocks_when_too_many_tasks_wait():
+    executor = ChatExecutor(workers=1, max_pending=2)
+    executor.start()
+    release = threading.Event()
+    executor.submit(1, release.wait, 5)
+    submitted = threading.Event()
+
+    def submit_more():
+        for i in range(3):
+            executor.submit(2, lambda: None)
+        submitted.set()
+
+    thread = threading.Thread(target=submit_more)
+    thread.start()
+    # The third task waits for room while the worker is blocked
+    assert not submitted.wait(0.1)
+    release.set()
+    assert submitted.wait(5)
+    thread.join()
+    executor.stop()
@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+import feed
+from feed import FeedParser, NewsItem
+
+
+BODY = json.dumps({
+    'total': 1234567,
+    'source': {'name': 'Шестидесятники', 'tags': ['a', 'b'], 'score': -1.5e3},
+    'today': [
+        ['01.01.2024', 'Новости города 🏙️', 'https://example.com/1'],
+        ['01.01.2024', 'Quote \\" and \\u00e9scape', 'https://example.com/2'],
+        [None, 'Без даты', 'https://example.com/3'],
+    ],
+    'page': 7,
+}, ensure_ascii=False, indent=1).encode()
+
+
+def chunked(body: bytes, size: int):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+def parse(chunks, category='today') -> dict:
+    parser = FeedParser(category)
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.close()
+
+
+def expected(body: bytes, category='today') -> dict:
+    data = json.loads(body)
+    data[category] = [NewsItem(*item) for item in data[category]]
+    return data
+
+
+def test_parses_whole_body():
+    data = parse([BODY])
+    assert data == expected(BODY)
+    assert all(isinstance(item, NewsItem) for item in data['today'])
+
+
+@pytest.mark.parametrize('size', range(1, len(BODY) + 1))
+def test_same_result_for_every_chunk_size(size):
+    assert parse(chunked(BODY, size)) == expected(BODY)
+
+
+def test_multibyte_characters_split_at_every_byte():
+    body = json.dumps(
+        {'today': [['дата', '🏙️ ёж', 'ссылка']], 'note': 'é€𝄞'},
+        ensure_ascii=False).encode()
+    for split in range(len(body) + 1):
+        assert parse([body[:split], body[split:]]) == expected(body)
+
+
+@pytest.mark.parametrize('body', [
+    b'{"page": 12345}',
+    b'{"today": [], "page": 12345}',
+    b'{"page": -12.5e10 }',
+    b'{"a": 1, "b": 2}',
+])
+def test_numbers_split_at_chunk_ends(body):
+    for split in range(len(body) + 1):
+        assert parse([body[:split], body[split:]]) == json.loads(body)
+
+
+def test_dates_are_shared():
+    data = parse(chunked(BODY, 5))
+    assert data['today'][0].date is data['today'][1].date
+
+
+def test_other_categories_are_plain_json():
+    data = parse([BODY], category='news')
+    assert data['today'] == json.loads(BODY)['today']
+
+
+@pytest.mark.parametrize('body', [
+    b'{}',
+    b'  {  }  ',
+    b'{"today": []}',
+    b'{"today": "not a list"}',
+])
+def test_parses_edge_cases(body):
+    assert parse([body]) == json.loads(body)
+
+
+@pytest.mark.parametrize('body', [
+    b'',
+    b'[]',
+    b'"today"',
+    b'{',
+    b'{"today": [["a", "b", "c"]',
+    b'{"today": [["a", "b"]]}',
+    b'{"today": [["a", "b", "c", "d"]]}',
+    b'{"today": [[5, "b", "c"]]}',
+    b'{"today": [["a", null, "c"]]}',
+    b'{"today": ["a"]}',
+    b'{"today": [["a", "b", "c"],]}',
+    b'{"a" 1}',
+    b'{"a": 1,}',
+    b'{a: 1}',
+    b'{"a": 1} x',
+    b'{"a": tru}',
+    b'{"a": "\xff"}',
+])
+def test_rejects_malformed_body(body):
+    for size in (1, 3, len(body) or 1):
+        with pytest.raises(ValueError):
+            parse(chunked(body, size))
+
+
+def test_parse_feed_reads_chunks():
+    assert feed.parse_feed(iter(chunked(BODY, 100)), 'today') == expected(BODY)
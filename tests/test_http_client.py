@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+import async_services as asvc
+import services as svc
+from fakes import FakeNews
+from http_client import CircuitBreaker, NewsClient
+
+
+@pytest.fixture
+def news():
+    server = FakeNews(feed_size=30)
+    yield server
+    server.stop()
+
+
+def test_fetch_reuses_body_on_304(news):
+    client = NewsClient(news.base_url)
+    data, modified = client.fetch('pln', 'today')
+    assert modified
+    assert len(data['today']) == 30
+    again, modified = client.fetch('pln', 'today')
+    assert not modified
+    assert again == data
+    assert news.requests == 2
+    assert news.not_modified == 1
+
+
+def test_fetch_decodes_gzipped_body(news):
+    client = NewsClient(news.base_url)
+    data, _ = client.fetch('cdi', 'news')
+    assert news.gzipped == 1
+    assert data['news'][0].link == 'https://example.com/cdi/news/0'
+
+
+def test_released_trial_lets_the_next_call_try():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.release_trial()
+    assert breaker.allow()
+    assert breaker.failures == 1
+
+
+def test_cancelled_async_fetch_is_not_a_failure(monkeypatch):
+    news = FakeNews(latency=1.0)
+    monkeypatch.setattr(svc, 'client', NewsClient(news.base_url))
+    client = asvc.AsyncNewsClient(news.base_url, retries=0)
+    breaker = svc.client.breaker('pln')
+    breaker.failure_threshold = 1
+    breaker.reset_timeout = 0
+    breaker.record_failure()
+
+    async def main():
+        try:
+            task = asyncio.ensure_future(client.fetch('pln', 'today'))
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        finally:
+            await client.close()
+
+    try:
+        # The cancelled fetch is the half-open trial
+        asyncio.run(main())
+    finally:
+        news.stop()
+    assert breaker.failures == 1
+    assert breaker.allow()
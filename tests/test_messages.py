@@ -0,0 +1,122 @@
+import html.parser
+
+import pytest
+
+import messages as msgs
+from feed import NewsItem
+
+
+class TagChecker(html.parser.HTMLParser):
+    """Collects the tags left open in an HTML text."""
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=False)
+        self.open = []
+
+    def handle_starttag(self, tag, attrs) -> None:
+        self.open.append(tag)
+
+    def handle_endtag(self, tag) -> None:
+        assert self.open.pop() == tag
+
+
+def assert_valid_html(text: str) -> None:
+    checker = TagChecker()
+    checker.feed(text)
+    checker.close()
+    assert checker.open == []
+    # A cut entity would leave a bare '&' behind
+    assert html.unescape(text).count('&') == text.count('&amp;')
+
+
+def item(i: int, title: str = None, date: str = '01.01.2024') -> NewsItem:
+    return NewsItem(date, title or f'News & views {i}', f'https://e.com/{i}?a=1&b=2')
+
+
+def test_pack_texts_joins_parts_up_to_limit():
+    texts = msgs.pack_texts(['a' * 4, 'b' * 4, 'c' * 4], limit=10)
+    assert texts == ['aaaa\n\nbbbb', 'cccc']
+
+
+def test_pack_texts_repeats_header():
+    texts = msgs.pack_texts(['aaa', 'bbb'], header='H', limit=8)
+    assert texts == ['H\n\naaa', 'H\n\nbbb']
+
+
+def test_pack_texts_cuts_long_plain_part():
+    assert msgs.pack_texts(['x' * 20], header='H', limit=10) == ['H\n\n' + 'x' * 7]
+
+
+def test_pack_texts_keeps_order_and_all_parts():
+    parts = [str(i) * (i % 7 + 1) for i in range(100)]
+    texts = msgs.pack_texts(parts, limit=30)
+    assert all(len(text) <= 30 for text in texts)
+    assert '\n\n'.join(texts).split('\n\n') == parts
+
+
+def test_digest_escapes_fields():
+    [text] = msgs.get_digest_texts([item(1, title='<script> & "x"')])
+    assert '&lt;script&gt; &amp; &quot;x&quot;' in text
+    assert 'href="https://e.com/1?a=1&amp;b=2"' in text
+    assert_valid_html(text)
+
+
+def test_digest_accepts_missing_date():
+    [text] = msgs.get_digest_texts([NewsItem(None, 'Title', 'https://e.com')])
+    assert text.startswith('<b>Title</b>\n\n<a')
+
+
+def test_digest_packs_items_into_few_messages():
+    news = [item(i) for i in range(200)]
+    texts = msgs.get_digest_texts(news)
+    assert 1 < len(texts) < 200
+    assert all(len(text) <= msgs.MAX_MESSAGE_LENGTH for text in texts)
+    assert sum(text.count('<b>') for text in texts) == 200
+    for text in texts:
+        assert_valid_html(text)
+
+
+@pytest.mark.parametrize('title', [
+    'x' * 5000,
+    '&' * 5000,
+    'ab<' * 2000,
+    'я' * 4090,
+])
+def test_digest_cuts_long_title_outside_markup(title):
+    [text] = msgs.get_digest_texts([item(1, title=title)])
+    assert len(text) <= msgs.MAX_MESSAGE_LENGTH
+    assert text.startswith('<b>')
+    assert '…</b>' in text
+    assert text.endswith('</a>')
+    assert_valid_html(text)
+
+
+def test_digest_item_leaves_out_link_too_long():
+    text = msgs.get_digest_item(
+        '01.01.2024', 'Title', 'https://e.com/' + 'a' * 3000)
+    assert text == '<b>Title</b>\n01.01.2024'
+
+
+def test_page_text_is_unchanged_when_it_fits():
+    news = [item(i) for i in range(5)]
+    assert msgs.get_page_text(news) == '\n\n'.join(n.text for n in news)
+
+
+def test_page_text_cuts_titles_to_fit():
+    news = [item(i, title='t' * 150 + str(i)) for i in range(20)]
+    assert len('\n\n'.join(n.text for n in news)) > msgs.MAX_MESSAGE_LENGTH
+    text = msgs.get_page_text(news)
+    assert len(text) <= msgs.MAX_MESSAGE_LENGTH
+    parts = text.split('\n\n')
+    assert len(parts) == 20
+    for part, news_item in zip(parts, news):
+        assert part.endswith(f'Link: {news_item.link}')
+        assert f'Date: {news_item.date}' in part
+        assert '…' in part
+
+
+def test_page_text_keeps_short_titles_whole():
+    news = [item(0, title='x' * 8000), item(1)]
+    text = msgs.get_page_text(news)
+    assert len(text) <= msgs.MAX_MESSAGE_LENGTH
+    assert text.endswith(news[1].text)
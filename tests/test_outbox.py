@@ -0,0 +1,175 @@
+import threading
+import time
+
+import telebot as tb
+
+from outbox import OutboundQueue
+
+
+FAST = dict(global_rate=1000.0, chat_rate=1000.0, chat_burst=1000.0)
+
+
+class Recorder:
+    """API method stub that records its calls in the order they ran."""
+
+    def __init__(self) -> None:
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, chat_id, text):
+        with self._lock:
+            self.calls.append((chat_id, text))
+        return text
+
+    def texts(self, chat_id) -> list:
+        return [text for chat, text in self.calls if chat == chat_id]
+
+    def chats(self) -> list:
+        return [chat for chat, _ in self.calls]
+
+
+def too_many_requests(retry_after: float) -> tb.apihelper.ApiTelegramException:
+    return tb.apihelper.ApiTelegramException(
+        'sendMessage',
+        None,
+        {
+            'error_code': 429,
+            'description': 'Too Many Requests',
+            'parameters': {'retry_after': retry_after},
+        })
+
+
+def test_calls_of_a_chat_keep_their_order():
+    outbox = OutboundQueue(None, workers=4, **FAST)
+    method = Recorder()
+    outbox.start()
+    futures = [
+        outbox.submit(chat_id, method, chat_id, i)
+        for i in range(50)
+        for chat_id in range(3)
+    ]
+    outbox.stop()
+    assert [future.result() for future in futures] == [
+        i for i in range(50) for _ in range(3)]
+    for chat_id in range(3):
+        assert method.texts(chat_id) == list(range(50))
+
+
+def test_chats_are_served_round_robin():
+    outbox = OutboundQueue(None, workers=1, **FAST)
+    method = Recorder()
+    # A long list for one chat is queued before the others
+    for i in range(20):
+        outbox.submit('long', method, 'long', i)
+    for chat_id in ('a', 'b', 'c'):
+        outbox.submit(chat_id, method, chat_id, 0)
+    outbox.start()
+    outbox.stop()
+    chats = method.chats()
+    assert len(chats) == 23
+    assert set(chats[:4]) == {'long', 'a', 'b', 'c'}
+    assert method.texts('long') == list(range(20))
+
+
+def test_retry_after_pauses_the_chat_and_retries():
+    outbox = OutboundQueue(None, workers=2, **FAST)
+    attempts = []
+
+    def send(chat_id, text):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise too_many_requests(0.2)
+        return text
+
+    other = Recorder()
+    outbox.start()
+    future = outbox.submit(1, send, 1, 'first')
+    after = outbox.submit(1, other, 1, 'second')
+    assert future.result(5) == 'first'
+    assert after.result(5) == 'second'
+    outbox.stop()
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 0.2
+    # The paused call stays first in its chat
+    assert other.calls == [(1, 'second')]
+
+
+def test_retry_after_does_not_pause_other_chats():
+    outbox = OutboundQueue(None, workers=2, **FAST)
+    method = Recorder()
+
+    def send(chat_id, text):
+        raise too_many_requests(1)
+
+    outbox.start()
+    paused = outbox.submit(1, send, 1, 'paused')
+    time.sleep(0.05)
+    started = time.monotonic()
+    assert outbox.submit(2, method, 2, 'other').result(5) == 'other'
+    assert time.monotonic() - started < 0.5
+    assert not paused.done()
+    outbox.stop(timeout=0)
+
+
+def test_call_fails_after_max_retries():
+    outbox = OutboundQueue(None, workers=1, max_retries=2, **FAST)
+    attempts = []
+
+    def send(chat_id, text):
+        attempts.append(text)
+        raise too_many_requests(0.01)
+
+    outbox.start()
+    future = outbox.submit(1, send, 1, 'text')
+    error = future.exception(5)
+    outbox.stop()
+    assert isinstance(error, tb.apihelper.ApiTelegramException)
+    assert error.error_code == 429
+    assert len(attempts) == 3
+
+
+def test_other_errors_are_not_retried():
+    outbox = OutboundQueue(None, workers=1, **FAST)
+    method = Recorder()
+    attempts = []
+
+    def send(chat_id, text):
+        attempts.append(text)
+        raise ValueError('bad request')
+
+    outbox.start()
+    failed = outbox.submit(1, send, 1, 'text')
+    after = outbox.submit(1, method, 1, 'next')
+    assert isinstance(failed.exception(5), ValueError)
+    assert after.result(5) == 'next'
+    outbox.stop()
+    assert attempts == ['text']
+
+
+def test_broadcasts_wait_for_interactive_calls():
+    outbox = OutboundQueue(None, workers=1, **FAST)
+    method = Recorder()
+    for chat_id in range(5):
+        outbox.broadcast(f'subscriber-{chat_id}', method, 'broadcast', chat_id)
+    for chat_id in range(5):
+        outbox.submit(chat_id, method, 'reply', chat_id)
+    outbox.start()
+    outbox.stop()
+    assert method.chats() == ['reply'] * 5 + ['broadcast'] * 5
+
+
+def test_broadcast_rate_leaves_room_for_interactive_calls():
+    outbox = OutboundQueue(None, workers=2, broadcast_rate=2.0, **FAST)
+    method = Recorder()
+    for chat_id in range(5):
+        outbox.broadcast(chat_id, method, 'broadcast', chat_id)
+    outbox.start()
+    # The first broadcasts use up the lane, the rest are throttled
+    time.sleep(0.05)
+    reply = outbox.submit('user', method, 'reply', 0)
+    reply.result(5)
+    calls_before_reply = len(method.calls) - 1
+    outbox.stop()
+    # Only the burst of the broadcast lane went before the reply
+    assert calls_before_reply == 2
+    assert method.chats().count('broadcast') == 5
@@ -0,0 +1,52 @@
+import threading
+import time
+
+import metrics
+from cache import NewsCache
+from prefetch import PrefetchScheduler
+
+
+def test_refresh_time_is_exported_as_a_metric():
+    loaded = threading.Event()
+
+    def loader(source, category):
+        loaded.set()
+        return {category: []}
+
+    cache = NewsCache(maxsize=8, ttl=lambda key: 60)
+    prefetcher = PrefetchScheduler(
+        cache, {'pln': ['today']}, loader, interval=60, jitter=0.001)
+    started = time.time()
+    prefetcher.start()
+    try:
+        assert loaded.wait(5)
+        deadline = time.monotonic() + 5
+        while not prefetcher.last_refreshed() and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        prefetcher.stop()
+    refreshed = prefetcher.last_refreshed()[('pln', 'today')]
+    assert refreshed >= started
+    assert metrics.PREFETCH_LAST_REFRESH.labels('pln', 'today').value == refreshed
+    assert (
+        f'bot_prefetch_last_refresh_timestamp_seconds'
+        f'{{source="pln",category="today"}} {refreshed}') in metrics.render()
+
+
+def test_stop_waits_for_running_fetches():
+    running = threading.Event()
+    finished = threading.Event()
+
+    def loader(source, category):
+        running.set()
+        time.sleep(0.2)
+        finished.set()
+        return {category: []}
+
+    cache = NewsCache(maxsize=8, ttl=lambda key: 60)
+    prefetcher = PrefetchScheduler(
+        cache, {'cdi': ['news']}, loader, interval=60, jitter=0.001)
+    prefetcher.start()
+    assert running.wait(5)
+    prefetcher.stop()
+    assert finished.is_set()
@@ -0,0 +1,28 @@
+import pytest
+
+import messages as msgs
+import render
+import services as svc
+from cache import NewsCache
+from feed import NewsItem
+from news_store import NewsStore
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    store = NewsStore(str(tmp_path / 'news.db'))
+    monkeypatch.setattr(svc, 'news_store', store)
+    monkeypatch.setattr(
+        render, 'page_cache', NewsCache(maxsize=8, ttl=lambda key: 60))
+    return store
+
+
+def test_largest_page_fits_into_a_message(store):
+    store.ingest('pln', 'today', [
+        NewsItem('01.01.2024', f'{i} ' + 'long title ' * 14, f'https://e.com/{i}')
+        for i in range(60)
+    ])
+    page = render.render_news_page('pln', 'today', 2, render.MAX_PAGE_SIZE)
+    assert len(page.text) <= msgs.MAX_MESSAGE_LENGTH
+    assert page.text.count('Link: ') == render.MAX_PAGE_SIZE
+    assert 'https://e.com/20\n' in page.text
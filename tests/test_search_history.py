@@ -0,0 +1,40 @@
+from history import SearchHistory
+from router import CallbackRouter
+
+
+def test_each_query_keeps_its_id():
+    searches = SearchHistory()
+    first = searches.set(1, 'fire')
+    second = searches.set(1, 'theatre')
+    assert first != second
+    assert searches.get(1, first) == 'fire'
+    assert searches.get(1, second) == 'theatre'
+
+
+def test_queries_belong_to_their_chat():
+    searches = SearchHistory()
+    query_id = searches.set(1, 'fire')
+    assert searches.get(2, query_id) is None
+    assert searches.get(1, None) is None
+
+
+def test_old_queries_and_chats_are_forgotten():
+    searches = SearchHistory(per_chat=2, max_chats=2)
+    ids = [searches.set(1, f'query {i}') for i in range(3)]
+    assert searches.get(1, ids[0]) is None
+    assert searches.get(1, ids[2]) == 'query 2'
+    other = searches.set(2, 'a')
+    searches.set(3, 'b')
+    assert searches.get(1, ids[2]) is None
+    assert searches.get(2, other) == 'a'
+
+
+def test_router_parses_query_id():
+    router = CallbackRouter({})
+    router.add_prefix('search', ('page', 'query_id'), print)
+    _, data = router.resolve('search#3#1760000042')
+    assert (data.page, data.query_id) == (3, 1760000042)
+    # Buttons sent before query IDs existed
+    _, data = router.resolve('search#3')
+    assert (data.page, data.query_id) == (3, None)
+    assert len('search#999#1760000042'.encode()) <= 64
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+import async_services as asvc
+import services as svc
+from cache import NewsCache
+from fakes import FakeNews
+from feed import FeedError
+from http_client import NewsClient
+from news_store import NewsStore
+
+
+HTML = b'<html><body>502 Bad Gateway</body></html>'
+
+
+@pytest.fixture
+def news(monkeypatch, tmp_path):
+    server = FakeNews(feed_size=10)
+    monkeypatch.setattr(svc, 'client', NewsClient(server.base_url, retries=0))
+    monkeypatch.setattr(
+        asvc, 'client', asvc.AsyncNewsClient(server.base_url, retries=0))
+    monkeypatch.setattr(svc, 'news_store', NewsStore(str(tmp_path / 'news.db')))
+    monkeypatch.setattr(svc, 'feed_listeners', [])
+    yield server
+    server.stop()
+
+
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(
+        svc, 'news_cache', NewsCache(maxsize=8, ttl=lambda key: 60))
+
+
+def test_malformed_body_falls_back_to_store(news, monkeypatch):
+    empty_cache(monkeypatch)
+    stored = svc.get_news('pln', 'today')['today']
+    empty_cache(monkeypatch)
+    news.broken_body = HTML
+    assert svc.get_news('pln', 'today')['today'] == stored
+
+
+def test_malformed_body_without_stored_feed_raises(news, monkeypatch):
+    empty_cache(monkeypatch)
+    news.broken_body = HTML
+    with pytest.raises(FeedError):
+        svc.get_news('pln', 'today')
+
+
+def test_async_malformed_body_falls_back_to_store(news, monkeypatch):
+    empty_cache(monkeypatch)
+    stored = svc.get_news('cdi', 'news')['news']
+    empty_cache(monkeypatch)
+    news.broken_body = HTML
+
+    async def main():
+        try:
+            return await asvc.get_news('cdi', 'news')
+        finally:
+            await asvc.client.close()
+
+    assert asyncio.run(main())['news'] == stored
@@ -0,0 +1,167 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import metrics
+from singleflight import SingleFlight
+
+
+KEY = ('pln', 'today')
+
+WAITERS = 5
+
+
+@pytest.fixture
+def counter():
+    counter = metrics.Counter(
+        'test_singleflight_calls', 'Calls by role.',
+        ['source', 'category', 'role'])
+    yield counter
+    metrics.REGISTRY.remove(counter)
+
+
+def count(counter, role: str) -> int:
+    return counter.labels(*KEY, role).value
+
+
+def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.001)
+
+
+class Blocking:
+    """Call that runs until released and counts how often it ran."""
+
+    def __init__(self, result=None, error=None) -> None:
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        assert self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def run_threads(group, fn, n):
+    """Calls group.do in n threads, returns the threads and their outcomes."""
+    outcomes = [None] * n
+
+    def call(i):
+        try:
+            outcomes[i] = group.do(KEY, fn)
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def test_waiters_share_the_leaders_result(counter):
+    group = SingleFlight(counter)
+    fn = Blocking(result=object())
+    leader, outcomes = run_threads(group, fn, 1)
+    assert fn.started.wait(5)
+    waiters, waiter_outcomes = run_threads(group, fn, WAITERS)
+    wait_for(lambda: count(counter, 'coalesced') == WAITERS)
+    fn.release.set()
+    for thread in leader + waiters:
+        thread.join()
+    assert fn.calls == 1
+    assert all(outcome is fn.result for outcome in outcomes + waiter_outcomes)
+    assert count(counter, 'leader') == 1
+    assert group.in_flight() == 0
+
+
+def test_waiters_share_the_leaders_exception(counter):
+    error = ValueError('upstream is down')
+    group = SingleFlight(counter)
+    fn = Blocking(error=error)
+    leader, outcomes = run_threads(group, fn, 1)
+    assert fn.started.wait(5)
+    waiters, waiter_outcomes = run_threads(group, fn, WAITERS)
+    wait_for(lambda: count(counter, 'coalesced') == WAITERS)
+    fn.release.set()
+    for thread in leader + waiters:
+        thread.join()
+    assert fn.calls == 1
+    assert all(outcome is error for outcome in outcomes + waiter_outcomes)
+    assert group.in_flight() == 0
+
+
+def test_coroutine_waits_for_thread_leader(counter):
+    group = SingleFlight(counter)
+    fn = Blocking(result='feed')
+    leader, outcomes = run_threads(group, fn, 1)
+    assert fn.started.wait(5)
+
+    async def fetch():
+        raise AssertionError('the waiter must not fetch')
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        waiter = asyncio.ensure_future(group.ado(KEY, fetch))
+        # The loop keeps running while the coroutine waits
+        await loop.run_in_executor(
+            None, wait_for, lambda: count(counter, 'coalesced') == 1)
+        fn.release.set()
+        return await waiter
+
+    assert asyncio.run(main()) == 'feed'
+    leader[0].join()
+    assert outcomes == ['feed']
+    assert fn.calls == 1
+    assert count(counter, 'leader') == 1
+
+
+def test_coroutines_share_one_call(counter):
+    group = SingleFlight(counter)
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return 'feed'
+
+    async def main():
+        return await asyncio.gather(
+            *(group.ado(KEY, fetch) for _ in range(WAITERS + 1)))
+
+    assert asyncio.run(main()) == ['feed'] * (WAITERS + 1)
+    assert calls == 1
+    assert count(counter, 'leader') == 1
+    assert count(counter, 'coalesced') == WAITERS
+
+
+def test_later_calls_run_again(counter):
+    group = SingleFlight(counter)
+    assert group.do(KEY, lambda: 1) == 1
+    assert group.do(KEY, lambda: 2) == 2
+    with pytest.raises(KeyError):
+        group.do(KEY, lambda: {}['missing'])
+    assert group.do(KEY, lambda: 3) == 3
+    assert count(counter, 'leader') == 4
+    assert count(counter, 'coalesced') == 0
+
+
+def test_keys_do_not_share_calls():
+    group = SingleFlight()
+    fn = Blocking(result='today')
+    leader, outcomes = run_threads(group, fn, 1)
+    assert fn.started.wait(5)
+    assert group.do(('pln', 'news'), lambda: 'news') == 'news'
+    fn.release.set()
+    leader[0].join()
+    assert outcomes == ['today']
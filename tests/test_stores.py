@@ -0,0 +1,58 @@
+import threading
+
+import database as db
+from subscriptions import SubscriptionStore
+from user_settings import SettingsStore
+
+
+def test_stores_on_one_connection_share_its_lock(tmp_path):
+    conn = db.create_connection(str(tmp_path / 'settings.db'))
+    db.migrate(conn)
+    lock = threading.Lock()
+    settings = SettingsStore(conn, lock=lock)
+    subscriptions = SubscriptionStore(conn, lock=lock)
+    settings.set_pagination_status(1, 'digest')
+    done = threading.Event()
+
+    def subscribe():
+        subscriptions.subscribe(1, 'today')
+        done.set()
+
+    # Held as if the settings store were in the middle of a flush
+    with lock:
+        thread = threading.Thread(target=subscribe)
+        thread.start()
+        assert not done.wait(0.1)
+    thread.join()
+    settings.flush()
+    assert subscriptions.categories(1) == ['today']
+    assert db.select_pagination_status(db.create_cursor(conn), 1) == [('digest',)]
+
+
+def test_flush_and_subscribe_in_parallel_save_everything(tmp_path):
+    conn = db.create_connection(str(tmp_path / 'settings.db'))
+    db.migrate(conn)
+    lock = threading.Lock()
+    settings = SettingsStore(conn, lock=lock)
+    subscriptions = SubscriptionStore(conn, lock=lock)
+
+    def write_settings():
+        for user_id in range(300):
+            settings.set_pagination_status(user_id, 'pagination_on')
+            if user_id % 10 == 0:
+                settings.flush()
+
+    def subscribe():
+        for chat_id in range(300):
+            assert subscriptions.subscribe(chat_id, 'news')
+
+    threads = [threading.Thread(target=write_settings),
+               threading.Thread(target=subscribe)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    settings.flush()
+    cursor = db.create_cursor(conn)
+    assert cursor.execute('SELECT COUNT(*) FROM settings').fetchone()[0] == 300
+    assert sum(map(len, subscriptions.subscribers('news'))) == 300
@@ -0,0 +1,93 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+import webhook
+from webhook import SECRET_HEADER, WebhookServer
+
+
+UPDATE = {
+    'update_id': 1,
+    'message': {
+        'message_id': 1,
+        'date': 0,
+        'chat': {'id': 7, 'type': 'private'},
+        'text': 'hi',
+    },
+}
+
+
+class StubBot:
+    def __init__(self) -> None:
+        self.threaded = True
+        self.updates = []
+        self.received = threading.Event()
+
+    def process_new_updates(self, updates) -> None:
+        self.updates.extend(updates)
+        self.received.set()
+
+
+@pytest.fixture
+def server():
+    bot = StubBot()
+    server = WebhookServer(bot, port=0, secret_token='s3cret', workers=1)
+    server.start()
+    yield server
+    server.stop()
+
+
+def post(server, body: bytes, headers: dict) -> int:
+    connection = http.client.HTTPConnection('127.0.0.1', server.port, timeout=5)
+    connection.putrequest('POST', server.path)
+    for name, value in headers.items():
+        connection.putheader(name, value)
+    connection.endheaders(body)
+    status = connection.getresponse().status
+    connection.close()
+    return status
+
+
+def test_accepts_update_with_secret(server):
+    body = json.dumps(UPDATE).encode()
+    status = post(server, body, {
+        SECRET_HEADER: 's3cret', 'Content-Length': str(len(body))})
+    assert status == 200
+    assert server.bot.received.wait(5)
+    assert server.bot.updates[0].update_id == 1
+
+
+@pytest.mark.parametrize('secret', ['', 'wrong', 'sécret'])
+def test_rejects_wrong_secret(server, secret):
+    body = json.dumps(UPDATE).encode()
+    headers = {'Content-Length': str(len(body))}
+    if secret:
+        headers[SECRET_HEADER] = secret
+    assert post(server, body, headers) == 403
+    assert not server.bot.updates
+
+
+def test_rejects_huge_body_without_reading_it(server):
+    # Only the headers are sent, the server must answer anyway
+    status = post(server, b'', {
+        SECRET_HEADER: 's3cret',
+        'Content-Length': str(webhook.MAX_BODY_SIZE + 1)})
+    assert status == 413
+
+
+def test_rejects_unauthorized_body_without_reading_it(server):
+    status = post(server, b'', {'Content-Length': str(10 ** 12)})
+    assert status == 403
+
+
+@pytest.mark.parametrize('length', ['abc', '-5'])
+def test_rejects_invalid_content_length(server, length):
+    status = post(server, b'', {SECRET_HEADER: 's3cret', 'Content-Length': length})
+    assert status == 400
+
+
+def test_refuses_public_interface_without_secret():
+    with pytest.raises(ValueError):
+        WebhookServer(StubBot(), host='0.0.0.0', port=0)